@@ -0,0 +1,198 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+
+from common.logger import get_logger
+
+LOGGER = get_logger('webhook.delivery_log')
+
+STATE_PENDING = 0
+STATE_DEAD = 1
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS messages (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    url         TEXT    NOT NULL,
+    payload     TEXT    NOT NULL,
+    created     REAL    NOT NULL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    state       INTEGER NOT NULL DEFAULT 0,
+    owner       TEXT    NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS messages_url_state ON messages (url, state, id);
+'''
+OWNER_INDEX = '''
+CREATE INDEX IF NOT EXISTS messages_owner_state ON messages (owner, state, url, id);
+'''
+
+
+def get_default_owner():
+    return '{}:{}'.format(socket.gethostname(), os.getpid())
+
+
+def is_owner_alive(owner):
+    """ 메세지를 기록한 프로세스 (@owner) 가 실행 중인지 확인 합니다.
+        (다른 host 의 프로세스는 확인할 수 없으므로 실행 중으로 판단)
+    """
+    host, _, pid = owner.rpartition(':')
+    if host != socket.gethostname() or not pid.isdigit():
+        return host != ''
+
+    try:
+        os.kill(int(pid), 0)
+
+    except ProcessLookupError:
+        return False
+
+    except PermissionError:
+        pass
+
+    return True
+
+
+class DeliveryLog(object):
+    """ Slack 전송 전의 메세지를 저장하는 SQLite 기반 durable log 입니다.
+
+        - 메세지는 전송 queue 에 들어가기 전에 먼저 기록 (append) 되며,
+          전송 성공 시 ack 로 삭제 됩니다.
+        - 프로세스가 비정상 종료 되더라도 ack 되지 않은 메세지는 재시작 후
+          pending 으로 다시 읽어 전송 합니다.
+        - WAL + synchronous=FULL 설정으로 commit 시점에 디스크에 반영 (fsync) 됩니다.
+        - 여러 프로세스 (worker, 데몬) 가 같은 파일을 공유할 수 있도록, 메세지는
+          기록한 프로세스 (@owner) 만 다시 읽습니다. 종료된 프로세스의 메세지는
+          claim 으로 가져온 후 다시 전송 합니다.
+    """
+
+    def __init__(self, path, owner=None):
+        self.path = path
+        self.owner = owner or get_default_owner()
+
+        dir_path = os.path.dirname(path)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
+
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(path, check_same_thread=False)
+        self.__conn.execute('PRAGMA journal_mode=WAL')
+        self.__conn.execute('PRAGMA synchronous=FULL')
+        self.__conn.executescript(SCHEMA)
+
+        # owner 컬럼이 없는 이전 버전의 파일 (기존 메세지는 종료된 owner 로 처리)
+        columns = [
+            row[1] for row in self.__conn.execute('PRAGMA table_info(messages)')
+        ]
+        if 'owner' not in columns:
+            self.__conn.execute(
+                "ALTER TABLE messages ADD COLUMN owner TEXT NOT NULL DEFAULT ''"
+            )
+
+        self.__conn.executescript(OWNER_INDEX)
+        self.__conn.commit()
+
+    def append(self, url, data):
+        """ 메세지 (@data) 를 기록 하고, 메세지 id 를 반환 합니다. """
+        payload = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+        with self.__lock, self.__conn:
+            cur = self.__conn.execute(
+                'INSERT INTO messages (url, payload, created, owner) '
+                'VALUES (?, ?, ?, ?)',
+                (url, payload, time.time(), self.owner)
+            )
+
+        return cur.lastrowid
+
+    def ack(self, msg_ids):
+        """ 전송이 완료된 메세지 (@msg_ids) 를 삭제 합니다. """
+        if not msg_ids:
+            return
+
+        with self.__lock, self.__conn:
+            self.__conn.executemany(
+                'DELETE FROM messages WHERE id = ?',
+                [(msg_id,) for msg_id in msg_ids]
+            )
+
+    def fail(self, msg_ids, is_dead=False):
+        """ 전송에 실패한 메세지 (@msg_ids) 의 시도 횟수를 늘립니다.
+            재시도 할 수 없는 메세지 (@is_dead) 는 더 이상 pending 으로 읽지 않습니다.
+        """
+        if not msg_ids:
+            return
+
+        state = STATE_DEAD if is_dead else STATE_PENDING
+
+        with self.__lock, self.__conn:
+            self.__conn.executemany(
+                'UPDATE messages SET attempts = attempts + 1, state = ? '
+                'WHERE id = ?',
+                [(state, msg_id) for msg_id in msg_ids]
+            )
+
+    def claim(self):
+        """ 종료된 프로세스가 전송 하지 못한 메세지의 owner 를 현재 프로세스로
+            변경 하고, 가져온 메세지 수를 반환 합니다.
+        """
+        with self.__lock:
+            owners = [
+                row[0] for row in self.__conn.execute(
+                    'SELECT DISTINCT owner FROM messages WHERE state = ?',
+                    (STATE_PENDING,)
+                ).fetchall()
+            ]
+
+            n_claimed = 0
+            for owner in owners:
+                if owner == self.owner or is_owner_alive(owner):
+                    continue
+
+                # 다른 프로세스가 먼저 가져간 경우 owner 가 바뀌어 있으므로 제외 됨
+                with self.__conn:
+                    cur = self.__conn.execute(
+                        'UPDATE messages SET owner = ? '
+                        'WHERE owner = ? AND state = ?',
+                        (self.owner, owner, STATE_PENDING)
+                    )
+
+                n_claimed += cur.rowcount
+
+        return n_claimed
+
+    def pending(self, url):
+        """ 현재 프로세스가 @url 로 전송 하지 못한 메세지의 (id, data) 리스트를
+            기록 순서대로 반환 합니다.
+        """
+        with self.__lock:
+            rows = self.__conn.execute(
+                'SELECT id, payload FROM messages '
+                'WHERE owner = ? AND url = ? AND state = ? ORDER BY id',
+                (self.owner, url, STATE_PENDING)
+            ).fetchall()
+
+        return [(msg_id, json.loads(payload)) for msg_id, payload in rows]
+
+    def urls(self):
+        """ 현재 프로세스가 전송 하지 못한 메세지가 남아 있는 webhook URL 리스트를
+            반환 합니다.
+        """
+        with self.__lock:
+            rows = self.__conn.execute(
+                'SELECT DISTINCT url FROM messages WHERE owner = ? AND state = ?',
+                (self.owner, STATE_PENDING)
+            ).fetchall()
+
+        return [row[0] for row in rows]
+
+    def count(self, state=STATE_PENDING):
+        with self.__lock:
+            return self.__conn.execute(
+                'SELECT COUNT(*) FROM messages WHERE owner = ? AND state = ?',
+                (self.owner, state)
+            ).fetchone()[0]
+
+    def close(self):
+        with self.__lock:
+            self.__conn.close()
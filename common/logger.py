@@ -1,42 +1,192 @@
+import os
+import queue
+import atexit
 import logging
+import threading
+
+from logging.handlers import (
+    QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+)
 
 DEAFULT_LOG_FMT = '%(asctime)s [%(levelname)s] %(name)s: %(message)s'
 DEAFULT_LOG_PATH = '/var/log/slackerr.log'
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+
+
+class DropCountingQueueHandler(QueueHandler):
+    """ queue 가 가득 찬 경우 (burst) 로그를 버리고, 버린 개수를 기록 합니다.
+        (로그 때문에 호출한 thread 가 block 되지 않도록)
+    """
+
+    def __init__(self, log_queue):
+        super(DropCountingQueueHandler, self).__init__(log_queue)
+
+        self.dropped = 0
+        self.__reported = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+
+        except queue.Full:
+            self.dropped += 1
+            return
+
+        # 버려진 로그가 있었다면, 다음 로그와 함께 버려진 개수를 남김
+        if self.__reported != self.dropped:
+            dropped = self.dropped - self.__reported
+            self.__reported = self.dropped
+
+            try:
+                self.queue.put_nowait(logging.makeLogRecord({
+                    'name': 'logger',
+                    'levelno': logging.WARNING,
+                    'levelname': 'WARNING',
+                    'msg': 'Dropped {} log records'.format(dropped),
+                }))
+
+            except queue.Full:
+                pass
 
 
 class Logger2(object):
+    """ 모든 logger 가 하나의 QueueHandler 를 공유 하고, 파일 쓰기는 별도의
+        QueueListener thread 에서 수행 합니다.
+
+        - handler 는 logger 이름 당 한번만 추가 됩니다.
+        - @rotate_when 이 주어진 경우 시간 기준 (TimedRotatingFileHandler),
+          아닌 경우 크기 기준 (@max_bytes, RotatingFileHandler) 으로 파일을 교체 합니다.
+        - fork 된 자식 프로세스 에서는 queue 및 listener thread 를 다시 생성 합니다.
+        - 여러 프로세스 가 같은 파일을 교체 (rotate) 하지 않도록, worker 프로세스 는
+          set_process_name() 으로 프로세스 별 파일 ('<이름>.<process name>.log') 을
+          사용 해야 합니다.
+    """
+
     def __init__(self,
                  log_level=logging.INFO,
                  log_fmt=DEAFULT_LOG_FMT,
-                 log_path=DEAFULT_LOG_PATH):
+                 log_path=DEAFULT_LOG_PATH,
+                 max_bytes=DEFAULT_MAX_BYTES,
+                 backup_count=DEFAULT_BACKUP_COUNT,
+                 rotate_when=None,
+                 queue_size=DEFAULT_QUEUE_SIZE):
 
         self.log_level = log_level
         self.log_fmt = log_fmt
         self.log_path = log_path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.rotate_when = rotate_when
+        self.queue_size = queue_size
+
+        self.__q_handler = None
+        self.__listener = None
+        self.__lock = threading.Lock()
 
     def __get_log_formatter(self):
         return logging.Formatter(self.log_fmt)
 
     def __get_log_f_handler(self, log_formatter):
-        f_handler = logging.FileHandler(self.log_path)
+        # 로그를 처음 쓸 때 파일을 생성 (delay)
+        if self.rotate_when:
+            f_handler = TimedRotatingFileHandler(
+                self.log_path,
+                when=self.rotate_when,
+                backupCount=self.backup_count,
+                delay=True
+            )
+
+        else:
+            f_handler = RotatingFileHandler(
+                self.log_path,
+                maxBytes=self.max_bytes,
+                backupCount=self.backup_count,
+                delay=True
+            )
+
         f_handler.setFormatter(log_formatter)
         return f_handler
 
+    def __start_listener(self, f_handler):
+        log_queue = queue.Queue(self.queue_size)
+
+        self.__q_handler.queue = log_queue
+        self.__listener = QueueListener(
+            log_queue, f_handler, respect_handler_level=True
+        )
+        self.__listener.start()
+
+    def __after_fork(self):
+        # 부모 프로세스의 listener thread 는 자식 프로세스 에 없으므로 다시 시작
+        self.__lock = threading.Lock()
+        if self.__listener is not None:
+            self.__start_listener(self.__listener.handlers[0])
+
+    def __get_queue_handler(self):
+        with self.__lock:
+            if self.__q_handler is not None:
+                return self.__q_handler
+
+            f_handler = self.__get_log_f_handler(self.__get_log_formatter())
+
+            self.__q_handler = DropCountingQueueHandler(None)
+            self.__start_listener(f_handler)
+
+            atexit.register(self.stop)
+            os.register_at_fork(after_in_child=self.__after_fork)
+
+        return self.__q_handler
+
     def get_logger(self, log_name):
         logger = logging.getLogger(log_name)
         logger.setLevel(self.log_level)
 
-        log_formatter = self.__get_log_formatter()
-        f_handler = self.__get_log_f_handler(log_formatter)
-
-        logger.addHandler(f_handler)
+        q_handler = self.__get_queue_handler()
+        if q_handler not in logger.handlers:
+            logger.addHandler(q_handler)
 
         return logger
 
+    def set_process_name(self, process_name):
+        """ 현재 프로세스 의 로그를 @process_name 으로 구분 되는 별도 파일 에
+            쓰도록 변경 합니다. (fork 된 worker 프로세스 에서 호출)
+        """
+        root, ext = os.path.splitext(self.log_path)
+        self.log_path = '{}.{}{}'.format(root, process_name, ext or '.log')
+
+        with self.__lock:
+            if self.__listener is None:
+                return
+
+            # 부모 프로세스 에서 연 파일은 닫고 (부모 에는 영향 없음) 새 파일로 교체
+            self.__listener.stop()
+            self.__listener.handlers[0].close()
+
+            self.__start_listener(
+                self.__get_log_f_handler(self.__get_log_formatter())
+            )
+
+    def get_dropped_count(self):
+        if self.__q_handler is None:
+            return 0
+
+        return self.__q_handler.dropped
+
+    def stop(self):
+        """ 남은 로그를 모두 파일에 쓰고 listener thread 를 종료 합니다. """
+        with self.__lock:
+            if self.__listener is None:
+                return
+
+            self.__listener.stop()
+            self.__listener = None
+
 
 LOGGER2 = Logger2()
 
 
 def get_logger(name):
     logger = LOGGER2.get_logger(name)
-    return logger
\ No newline at end of file
+    return logger
@@ -0,0 +1,325 @@
+import time
+import threading
+
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from common.logger import LOGGER2, get_logger
+
+LOGGER = get_logger('metrics')
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60
+)
+PROM_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def escape_label_value(value):
+    return (
+        str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+    )
+
+
+def format_labels(label_names, label_values, extra=None):
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.append(extra)
+
+    if not pairs:
+        return ''
+
+    return '{{{}}}'.format(','.join(
+        '{}="{}"'.format(name, escape_label_value(value))
+        for name, value in pairs
+    ))
+
+
+class Metric(object):
+    """ @func 가 주어진 경우, 수집 시점에 {label values tuple: 값} 을 반환 하도록 호출 합니다. """
+    metric_type = None
+
+    def __init__(self, name, help_text, label_names=(), func=None):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.func = func
+
+        self._values = {}  # label values: value
+        self._lock = threading.Lock()
+
+    def _get_key(self, labels):
+        return tuple(labels.get(name, '') for name in self.label_names)
+
+    def render(self):
+        lines = [
+            '# HELP {} {}'.format(self.name, self.help_text),
+            '# TYPE {} {}'.format(self.name, self.metric_type),
+        ]
+        lines.extend(self._render_samples())
+
+        return lines
+
+    def _collect(self):
+        try:
+            values = self.func()
+
+        except Exception as e:
+            LOGGER.error('Collect {} failed ({}) [msg: {}]'.format(
+                self.metric_type, self.name, e
+            ))
+            values = {}
+
+        with self._lock:
+            self._values = dict(values)
+
+    def _render_samples(self):
+        if self.func is not None:
+            self._collect()
+
+        with self._lock:
+            items = sorted(self._values.items())
+
+        return [
+            '{}{} {}'.format(
+                self.name, format_labels(self.label_names, key), value
+            )
+            for key, value in items
+        ]
+
+
+class Counter(Metric):
+    metric_type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._get_key(labels)
+
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    metric_type = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._get_key(labels)
+
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    metric_type = 'histogram'
+
+    def __init__(self, name, help_text, label_names=(),
+                 buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, help_text, label_names)
+
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._get_key(labels)
+
+        with self._lock:
+            hist = self._values.get(key)
+            if hist is None:
+                # [bucket 별 count..., +Inf count, sum]
+                hist = [0] * (len(self.buckets) + 2)
+                self._values[key] = hist
+
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    hist[idx] += 1
+
+            hist[-2] += 1
+            hist[-1] += value
+
+    def get_stats(self):
+        """ label 별 (count, sum) 을 반환 합니다. """
+        with self._lock:
+            return {
+                key: (hist[-2], hist[-1]) for key, hist in self._values.items()
+            }
+
+    def _render_samples(self):
+        with self._lock:
+            items = sorted(
+                (key, list(hist)) for key, hist in self._values.items()
+            )
+
+        lines = []
+        for key, hist in items:
+            for idx, bound in enumerate(self.buckets):
+                lines.append('{}_bucket{} {}'.format(
+                    self.name,
+                    format_labels(self.label_names, key, ('le', bound)),
+                    hist[idx]
+                ))
+
+            lines.append('{}_bucket{} {}'.format(
+                self.name,
+                format_labels(self.label_names, key, ('le', '+Inf')),
+                hist[-2]
+            ))
+            labels = format_labels(self.label_names, key)
+            lines.append('{}_count{} {}'.format(self.name, labels, hist[-2]))
+            lines.append('{}_sum{} {}'.format(self.name, labels, hist[-1]))
+
+        return lines
+
+
+class MetricRegistry(object):
+    def __init__(self):
+        self.__metrics = {}  # name: Metric
+        self.__lock = threading.Lock()
+
+    def __register(self, metric):
+        with self.__lock:
+            registered = self.__metrics.get(metric.name)
+            if registered is not None:
+                return registered
+
+            self.__metrics[metric.name] = metric
+
+        return metric
+
+    def counter(self, name, help_text, label_names=(), func=None):
+        return self.__register(Counter(name, help_text, label_names, func))
+
+    def gauge(self, name, help_text, label_names=(), func=None):
+        return self.__register(Gauge(name, help_text, label_names, func))
+
+    def histogram(self, name, help_text, label_names=(),
+                  buckets=DEFAULT_BUCKETS):
+        return self.__register(
+            Histogram(name, help_text, label_names, buckets)
+        )
+
+    def render(self):
+        """ Prometheus text 포맷 으로 모든 metric 을 반환 합니다. """
+        with self.__lock:
+            metrics = [self.__metrics[name] for name in sorted(self.__metrics)]
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricRegistry()
+
+STAGE_LATENCY = REGISTRY.histogram(
+    'slackbot_stage_seconds', 'Latency of each pipeline stage', ('stage',)
+)
+STAGE_ERRORS = REGISTRY.counter(
+    'slackbot_stage_errors_total', 'Failed pipeline stage runs', ('stage',)
+)
+REGISTRY.counter(
+    'slackbot_log_dropped_total', 'Log records dropped by full log queue',
+    func=lambda: {(): LOGGER2.get_dropped_count()}
+)
+
+
+@contextmanager
+def measure_stage(stage):
+    """ with 블럭의 실행 시간을 @stage 의 latency 로 기록 합니다.
+        (예외 발생 시 error counter 증가)
+    """
+    start_time = time.monotonic()
+    try:
+        yield
+
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+
+    finally:
+        STAGE_LATENCY.observe(time.monotonic() - start_time, stage=stage)
+
+
+def get_stage_summary():
+    """ stage 별 'stage=count/avg(ms)' 형태의 한 줄 요약을 반환 합니다. """
+    summary = []
+    for (stage,), (count, total) in sorted(STAGE_LATENCY.get_stats().items()):
+        avg_ms = (total / count * 1000) if count else 0
+        summary.append('{}={}/{:.1f}ms'.format(stage, count, avg_ms))
+
+    return ', '.join(summary)
+
+
+class MetricsServer(object):
+    """ 'GET /metrics' 요청에 @registry 의 metric 을 Prometheus text 포맷 으로
+        응답 하고, @summary_interval 초 마다 stage 요약을 로그로 남깁니다.
+    """
+
+    def __init__(self, url, registry=REGISTRY, summary_interval=60):
+        self.url = url
+        self.registry = registry
+        self.summary_interval = summary_interval
+
+        self.__server = None
+        self.__stop = threading.Event()
+
+    def __make_request_handler(self):
+        # metric 수집만 하는 경우 (run once 등) 에는 http.server 를 import 하지 않음
+        from http.server import BaseHTTPRequestHandler
+
+        registry = self.registry
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                body = registry.render().encode('utf-8')
+
+                self.send_response(200)
+                self.send_header('Content-Type', PROM_CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, fmt, *args):
+                LOGGER.debug(fmt % args)
+
+        return RequestHandler
+
+    def __run_summary(self):
+        while not self.__stop.wait(self.summary_interval):
+            LOGGER.info('Stage summary: {}'.format(get_stage_summary()))
+
+    def start(self):
+        if self.url:
+            from http.server import ThreadingHTTPServer
+
+            url_info = urlsplit(self.url)
+
+            self.__server = ThreadingHTTPServer(
+                (url_info.hostname, url_info.port),
+                self.__make_request_handler()
+            )
+            self.__server.daemon_threads = True
+
+            threading.Thread(
+                target=self.__server.serve_forever,
+                name='metrics-server',
+                daemon=True
+            ).start()
+
+            LOGGER.info('Start metrics server ({})'.format(self.url))
+
+        if self.summary_interval:
+            threading.Thread(
+                target=self.__run_summary, name='metrics-summary', daemon=True
+            ).start()
+
+    def stop(self):
+        self.__stop.set()
+
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__server = None
@@ -0,0 +1,512 @@
+import time
+import threading
+
+from collections import deque
+
+from common.logger import get_logger
+from common.metrics import REGISTRY, measure_stage
+from common.webhook_api import (
+    InCommingWebHooks, get_dedup, get_url_label, is_connect_error
+)
+from common.delivery_log import DeliveryLog
+
+LOGGER = get_logger('webhook.queue')
+
+# Slack incoming webhook 제한
+# - https://api.slack.com/docs/rate-limits#rate-limits__limits-when-posting-messages
+# - https://api.slack.com/reference/block-kit/blocks
+SLACK_MAX_BLOCKS = 50
+SLACK_MAX_TEXT_LEN = 40000
+
+DEFAULT_RATE = 1.0  # 초당 전송 가능 메세지 수
+DEFAULT_BURST = 1
+DEFAULT_MAX_RETRY = 3
+DEFAULT_RETRY_AFTER = 1.0
+DEFAULT_REQUEUE_DELAY = 30.0
+
+# 한번 전송 (__post) 결과
+POST_SENT = 0
+POST_RATE_LIMITED = 1  # 429, Retry-After 후 재전송
+POST_FAILED = 2  # 5xx, 연결 실패 (전송 계층 에서 이미 재시도 함)
+POST_REJECTED = 3  # 4xx, 재전송 해도 실패
+POST_UNKNOWN = 4  # 요청 전송 후 응답을 받지 못함 (Slack 에서 받았을 수 있음)
+
+QUEUE_DEFAULTS = {
+    'rate': DEFAULT_RATE,
+    'burst': DEFAULT_BURST,
+    'coalesce': True,
+    'max_retry': DEFAULT_MAX_RETRY,
+}
+
+
+class TokenBucket(object):
+    """ 초당 @rate 개의 토큰이 채워지며, 최대 @capacity 개 까지 쌓이는 token bucket.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+
+        self.__tokens = float(capacity)
+        self.__last = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def __refill(self):
+        now = time.monotonic()
+        self.__tokens = min(
+            self.capacity, self.__tokens + (now - self.__last) * self.rate
+        )
+        self.__last = now
+
+    def consume(self, tokens=1):
+        """ 토큰 사용을 시도 합니다.
+            성공 시 0 을, 토큰이 부족한 경우 필요한 대기 시간 (초) 을 반환 합니다.
+        """
+        with self.__lock:
+            self.__refill()
+
+            if self.__tokens >= tokens:
+                self.__tokens -= tokens
+                return 0
+
+            return (tokens - self.__tokens) / self.rate
+
+    def acquire(self, tokens=1):
+        """ 토큰을 사용할 수 있을 때 까지 대기 합니다. """
+        while True:
+            wait_time = self.consume(tokens)
+            if not wait_time:
+                return
+
+            time.sleep(wait_time)
+
+    def drain(self):
+        """ 남은 토큰을 모두 소진 합니다. (429 응답 등으로 전송을 멈춰야 하는 경우) """
+        with self.__lock:
+            self.__refill()
+            self.__tokens = 0
+
+
+class OutboundQueue(object):
+    """ 하나의 webhook URL 에 대한 Slack 전송 queue 입니다.
+
+        - 별도의 sender thread 가 token bucket (@rate, @burst) 에 맞춰 전송
+        - 429 응답 시 'Retry-After' 헤더 만큼 대기 후 같은 메세지를 재전송
+          (5xx / 연결 실패는 전송 계층 에서 재시도 하며, 요청 전송 후 응답을 받지
+           못한 메세지는 Slack 이 받았을 수 있으므로 다시 전송 하지 않음)
+        - @coalesce 설정 시, 대기 중인 같은 형태의 메세지 (text / blocks) 를
+          Slack 제한 (50 blocks, text 길이) 내에서 하나의 메세지로 합쳐서 전송
+        - @delivery_log (DeliveryLog) 가 주어진 경우, 메세지를 먼저 기록 후 전송 하며
+          전송 성공 시 ack 합니다. 재시도를 모두 실패한 메세지도 버리지 않고
+          @DEFAULT_REQUEUE_DELAY 후 다시 전송 하며, 재시작 시 기록된 메세지를 복구 합니다.
+          (재전송 대기 중 에도 다른 메세지는 계속 전송 되며, 종료 시 재전송 대기 중인
+           메세지는 delivery log 에 남겨 두고 재시작 후 전송 합니다.)
+        - @dedup (PayloadDedup) 기간 내에 같은 메세지가 추가된 경우 queue 에 넣지 않습니다.
+    """
+
+    def __init__(self, url, rate=DEFAULT_RATE, burst=DEFAULT_BURST,
+                 coalesce=True, max_retry=DEFAULT_MAX_RETRY,
+                 delivery_log=None, dedup=None):
+
+        self.url = url
+        self.webhook = InCommingWebHooks(url)
+        self.bucket = TokenBucket(rate, burst)
+        self.coalesce = coalesce
+        self.max_retry = max_retry
+        self.delivery_log = delivery_log
+        self.dedup = dedup or get_dedup()
+
+        self.__pending = deque()  # (메세지 id 리스트, 메세지, 전송 가능 시간)
+        self.__cond = threading.Condition()
+        self.__sender = None
+        self.__sending = False
+        self.__closed = False
+
+        self.sent_count = 0
+        self.drop_count = 0
+        self.coalesced_count = 0
+
+        self.__recover()
+
+    def __recover(self):
+        """ delivery log 에 남아 있는 (전송 되지 않은) 메세지를 queue 에 복구 합니다. """
+        if self.delivery_log is None:
+            return
+
+        pending = self.delivery_log.pending(self.url)
+        if not pending:
+            return
+
+        with self.__cond:
+            for msg_id, data in pending:
+                self.__pending.append(([msg_id], data, 0))
+
+            self.__start_sender()
+            self.__cond.notify()
+
+        LOGGER.info('Recover {} slack messages from delivery log'.format(
+            len(pending)
+        ))
+
+    def __start_sender(self):
+        if self.__sender is not None and self.__sender.is_alive():
+            return
+
+        self.__sender = threading.Thread(
+            target=self.__run_sender, name='slack-sender', daemon=True
+        )
+        self.__sender.start()
+
+    def put(self, text=None, blocks=None):
+        """ 전송할 메세지를 queue 에 추가 합니다.
+            (중복된 메세지로 추가 하지 않은 경우 False 반환)
+        """
+        if not text and not blocks:
+            raise Exception('Text or block objects must exist.')
+
+        data = {}
+
+        if text:
+            data['text'] = text
+
+        if blocks:
+            data['blocks'] = list(blocks)
+
+        with self.__cond:
+            if self.__closed:
+                raise Exception('Outbound queue is closed ({})'.format(self.url))
+
+            if self.dedup.check(self.url, data):
+                LOGGER.info('Skip duplicated slack message')
+                return False
+
+            msg_ids = []
+            if self.delivery_log is not None:
+                try:
+                    msg_ids.append(self.delivery_log.append(self.url, data))
+
+                except Exception:
+                    self.dedup.discard(self.url, data)
+                    raise
+
+            self.__pending.append((msg_ids, data, 0))
+            self.__start_sender()
+            self.__cond.notify()
+
+        return True
+
+    def qsize(self):
+        with self.__cond:
+            return len(self.__pending)
+
+    def __can_merge(self, merged, data):
+        if ('blocks' in merged) != ('blocks' in data):
+            return False
+
+        if 'blocks' in data:
+            n_blocks = len(merged['blocks']) + len(data['blocks'])
+            if n_blocks > SLACK_MAX_BLOCKS:
+                return False
+
+        text_len = len(merged.get('text', '')) + len(data.get('text', ''))
+        if text_len + 1 > SLACK_MAX_TEXT_LEN:
+            return False
+
+        return True
+
+    def __find_ready(self):
+        """ 전송 가능 시간이 된 첫 메세지의 (index, None) 을 반환 합니다.
+            없는 경우 (None, 가장 빠른 전송 가능 시간 까지 남은 시간) 을 반환 합니다.
+        """
+        now = time.monotonic()
+        wait_time = None
+        for idx, (_, _, not_before) in enumerate(self.__pending):
+            if not_before <= now:
+                return idx, None
+
+            if wait_time is None or not_before - now < wait_time:
+                wait_time = not_before - now
+
+        return None, wait_time
+
+    def __pop_batch(self, idx):
+        """ queue 의 @idx 번째 메세지를 꺼내고, @coalesce 설정 시 뒤에 이어지는
+            합칠 수 있는 (전송 가능한) 메세지 들을 함께 꺼내 하나의 메세지로 반환 합니다.
+            (합치기 전 (메세지 id 리스트, 메세지) 리스트, 전송할 메세지)
+        """
+        msg_ids, data, _ = self.__pending[idx]
+        del self.__pending[idx]
+
+        items = [(msg_ids, data)]
+        if not self.coalesce:
+            return items, data
+
+        now = time.monotonic()
+        merged = {k: (list(v) if k == 'blocks' else v) for k, v in data.items()}
+        while idx < len(self.__pending):
+            _msg_ids, _data, not_before = self.__pending[idx]
+            if not_before > now or not self.__can_merge(merged, _data):
+                break
+
+            del self.__pending[idx]
+            items.append((_msg_ids, _data))
+
+            if 'blocks' in _data:
+                merged['blocks'].extend(_data['blocks'])
+
+            if 'text' in _data:
+                merged['text'] = '\n'.join(
+                    filter(None, [merged.get('text'), _data['text']])
+                )
+
+            self.coalesced_count += 1
+
+        return items, merged
+
+    def __post(self, data):
+        """ 메세지를 한번 전송 하고, (POST_* 결과, 재시도 전 대기 시간) 을 반환 합니다.
+            (5xx 응답 및 연결 실패는 전송 계층 (HTTPTransport) 에서 이미 재시도 하므로,
+             여기서는 429 응답만 Retry-After 후 재시도 합니다.)
+        """
+        try:
+            with measure_stage('slack_send'):
+                res = self.webhook.post(json=data)
+
+        except Exception as e:
+            if is_connect_error(e):
+                LOGGER.error('Failed send to slack [msg: {}]'.format(e))
+                return POST_FAILED, None
+
+            LOGGER.warning(
+                'Unknown slack send result, not resending [msg: {}]'.format(e)
+            )
+            return POST_UNKNOWN, None
+
+        if res.status_code == 429:
+            try:
+                retry_after = float(res.headers.get('Retry-After'))
+
+            except (TypeError, ValueError):
+                retry_after = DEFAULT_RETRY_AFTER
+
+            LOGGER.warning(
+                'Rate limited by slack [retry after: {}s]'.format(retry_after)
+            )
+            return POST_RATE_LIMITED, retry_after
+
+        if res.status_code >= 500:
+            LOGGER.error(
+                'Failed send to slack [response code: {}]'.format(
+                    res.status_code
+                )
+            )
+            return POST_FAILED, None
+
+        if not res.ok:
+            LOGGER.error(
+                'Rejected by slack [response code: {}, msg: {}]'.format(
+                    res.status_code, res.text
+                )
+            )
+            return POST_REJECTED, None
+
+        return POST_SENT, None
+
+    def __run_sender(self):
+        while True:
+            with self.__cond:
+                while True:
+                    idx, wait_time = self.__find_ready()
+                    if idx is not None:
+                        break
+
+                    # 재전송 대기 중인 메세지는 delivery log 에서 재시작 후 복구
+                    if self.__closed:
+                        return
+
+                    self.__cond.wait(wait_time)
+
+                items, data = self.__pop_batch(idx)
+                self.__sending = True
+
+            try:
+                self.__send(items, data)
+
+            finally:
+                with self.__cond:
+                    self.__sending = False
+                    self.__cond.notify_all()
+
+    def __send(self, items, data):
+        msg_ids = [msg_id for _msg_ids, _ in items for msg_id in _msg_ids]
+
+        for n_try in range(self.max_retry + 1):
+            self.bucket.acquire()
+
+            result, retry_after = self.__post(data)
+            if result == POST_SENT:
+                self.sent_count += 1
+                self.__ack(msg_ids)
+                LOGGER.info(
+                    'Success send to slack [blocks: {}]'.format(
+                        len(data.get('blocks', []))
+                    )
+                )
+                return
+
+            if result == POST_UNKNOWN:
+                # 중복 전송 되지 않도록, 전송 된 것으로 보고 다시 전송 하지 않음
+                self.__ack(msg_ids)
+                return
+
+            if result != POST_RATE_LIMITED or n_try == self.max_retry:
+                break
+
+            # Retry-After 동안은 다른 메세지도 전송하지 않도록 bucket 을 비움
+            self.bucket.drain()
+            time.sleep(retry_after)
+
+        is_dead = result == POST_REJECTED
+        if self.delivery_log is not None and not is_dead:
+            # durable 모드: 버리지 않고 잠시 후 다시 전송
+            self.delivery_log.fail(msg_ids)
+            LOGGER.error(
+                'Requeue slack message after {} tries'.format(n_try + 1)
+            )
+
+            # sender 를 멈추지 않도록, 합치기 전 메세지 들을 전송 가능 시간과 함께 추가
+            not_before = time.monotonic() + DEFAULT_REQUEUE_DELAY
+            with self.__cond:
+                for _msg_ids, _data in items:
+                    self.__pending.append((_msg_ids, _data, not_before))
+            return
+
+        if self.delivery_log is not None:
+            self.delivery_log.fail(msg_ids, is_dead=True)
+
+        # 전송 하지 못한 메세지는 다시 추가 (trigger) 되면 전송 되도록 중복 기록 삭제
+        for _, _data in items:
+            self.dedup.discard(self.url, _data)
+
+        self.drop_count += 1
+        LOGGER.error('Drop slack message after {} tries'.format(n_try + 1))
+
+    def __ack(self, msg_ids):
+        if self.delivery_log is None:
+            return
+
+        try:
+            self.delivery_log.ack(msg_ids)
+
+        except Exception as e:
+            # ack 실패 시 재시작 후 중복 전송 될 수 있음
+            LOGGER.error('Ack delivery log failed [msg: {}]'.format(e))
+
+    def flush(self, timeout=None):
+        """ 대기 중인 메세지가 모두 전송 될 때 까지 기다립니다.
+            @timeout 내에 완료 된 경우 True 를 반환 합니다.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self.__cond:
+            while self.__pending or self.__sending:
+                remain = None
+                if deadline is not None:
+                    remain = deadline - time.monotonic()
+                    if remain <= 0:
+                        return False
+
+                self.__cond.wait(remain)
+
+        return True
+
+    def close(self, timeout=None):
+        is_flushed = self.flush(timeout)
+
+        with self.__cond:
+            self.__closed = True
+            self.__cond.notify_all()
+
+        return is_flushed
+
+
+_QUEUES = {}  # url: OutboundQueue
+_QUEUES_LOCK = threading.Lock()
+_DELIVERY_LOG = None
+
+
+def configure_outbound_queue(delivery_log=None, **kwargs):
+    """ 이 후 생성되는 OutboundQueue 의 기본 설정 (@QUEUE_DEFAULTS) 을 변경 합니다.
+        @delivery_log (파일 경로) 가 주어진 경우 durable 모드로 동작 합니다.
+    """
+    global _DELIVERY_LOG
+
+    QUEUE_DEFAULTS.update(kwargs)
+
+    if delivery_log:
+        _DELIVERY_LOG = DeliveryLog(delivery_log)
+
+
+def get_outbound_queue(url):
+    """ webhook URL 별로 하나의 OutboundQueue 를 공유 하도록 반환 합니다. """
+    with _QUEUES_LOCK:
+        queue = _QUEUES.get(url)
+        if queue is None:
+            queue = OutboundQueue(
+                url, delivery_log=_DELIVERY_LOG, **QUEUE_DEFAULTS
+            )
+            _QUEUES[url] = queue
+
+    return queue
+
+
+def collect_queue_depth():
+    return {
+        (get_url_label(queue.url),): queue.qsize()
+        for queue in get_outbound_queues()
+    }
+
+
+def collect_delivery_log_depth():
+    if _DELIVERY_LOG is None:
+        return {}
+
+    return {(): _DELIVERY_LOG.count()}
+
+
+REGISTRY.gauge(
+    'slackbot_outbound_queue_depth', 'Pending slack messages per webhook',
+    ('webhook',), func=collect_queue_depth
+)
+REGISTRY.gauge(
+    'slackbot_delivery_log_depth', 'Unacked slack messages in delivery log',
+    func=collect_delivery_log_depth
+)
+
+
+def recover_outbound_queues():
+    """ delivery log 에서 종료된 프로세스 (이전 실행, 재시작 된 worker) 가 전송
+        하지 못한 메세지를 가져와, 남은 메세지가 있는 모든 URL 의 queue 를 생성 하여
+        다시 전송 하도록 합니다. (실행 중인 다른 worker / 데몬의 메세지는 제외)
+    """
+    if _DELIVERY_LOG is None:
+        return
+
+    n_claimed = _DELIVERY_LOG.claim()
+    if n_claimed:
+        LOGGER.info('Claim {} slack messages from stopped processes'.format(
+            n_claimed
+        ))
+
+    for url in _DELIVERY_LOG.urls():
+        get_outbound_queue(url)
+
+
+def get_outbound_queues():
+    with _QUEUES_LOCK:
+        return list(_QUEUES.values())
+
+
+def close_outbound_queues(timeout=None):
+    for queue in get_outbound_queues():
+        queue.close(timeout)
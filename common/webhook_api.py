@@ -1,30 +1,267 @@
+import hmac
+import json
+import time
+import hashlib
+import threading
+
+from collections import OrderedDict
+from urllib.parse import urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 import requests
 
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError
+from urllib3.util.retry import Retry
+
 from common.logger import get_logger
+from common.metrics import REGISTRY
 
 SEND_SUCCESS = 1
 SEND_FAIL = 0
 NO_MSGS = -1
+SEND_DUPLICATED = 2
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 10
+DEFAULT_RETRY_TOTAL = 3
+DEFAULT_RETRY_BACKOFF = 0.5
+RETRY_STATUS_LIST = (500, 502, 503, 504)
+
+DEFAULT_MAX_SKEW = 300
+DEFAULT_MAX_BODY_SIZE = 64 * 1024
+
+DEFAULT_DEDUP_TTL = 300
+DEFAULT_DEDUP_SIZE = 1024
 
 LOGGER = get_logger('webhook')
 
+DEDUP_SUPPRESSED = REGISTRY.counter(
+    'slackbot_dedup_suppressed_total',
+    'Slack sends skipped as duplicated payload', ('webhook',)
+)
+
+
+def get_url_label(url):
+    """ webhook URL 은 외부에 노출 되면 안되므로, metric label 에는 hash 값을 사용 합니다. """
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()[:8]
+
+
+def is_connect_error(e):
+    """ 요청 오류 (@e) 가 요청을 전송 하기 전 (연결 단계) 에 발생 했는지 확인 합니다.
+        (그 외의 오류는 상대방이 요청을 이미 받았을 수 있음)
+    """
+    if isinstance(e, requests.exceptions.ConnectTimeout):
+        return True
+
+    if isinstance(e, requests.exceptions.ConnectionError) and e.args:
+        return isinstance(
+            getattr(e.args[0], 'reason', None), ConnectTimeoutError
+        )
+
+    return False
+
+
+class HTTPTransport(object):
+    """ host 별로 keep-alive 되는 requests.Session 을 관리하는 공용 전송 계층 입니다.
+
+        - 같은 host 로의 요청은 하나의 Session (connection pool) 을 재사용하여
+          매 요청마다 TCP/TLS handshake 가 발생하지 않도록 합니다.
+        - connect timeout 및 5xx, connection error 에 대한 backoff retry 적용
+          (요청 전송 후의 read error 는 Slack 이 이미 메세지를 받았을 수 있으므로
+           중복 전송 되지 않도록 retry 하지 않음)
+    """
+
+    def __init__(self,
+                 pool_size=DEFAULT_POOL_SIZE,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT,
+                 retry_total=DEFAULT_RETRY_TOTAL,
+                 retry_backoff=DEFAULT_RETRY_BACKOFF):
+
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.retry_total = retry_total
+        self.retry_backoff = retry_backoff
+
+        self.__sessions = {}  # host: requests.Session
+        self.__lock = threading.Lock()
+
+    def __make_session(self):
+        retry = Retry(
+            total=self.retry_total,
+            connect=self.retry_total,
+            read=0,  # 전송된 POST 가 다시 전송 되지 않도록 read error 는 retry 안함
+            status=self.retry_total,
+            backoff_factor=self.retry_backoff,
+            status_forcelist=RETRY_STATUS_LIST,
+            allowed_methods=None,  # POST 요청도 retry 대상에 포함
+            raise_on_status=False,
+        )
+
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.pool_size,
+            max_retries=retry
+        )
+
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        return session
+
+    def get_session(self, url):
+        """ @url 의 host (scheme + netloc) 에 해당하는 Session 을 반환 합니다.
+            없는 경우 새로 생성하여 저장 합니다.
+        """
+        url_info = urlsplit(url)
+        host = '{}://{}'.format(url_info.scheme, url_info.netloc)
+
+        with self.__lock:
+            session = self.__sessions.get(host)
+            if session is None:
+                session = self.__make_session()
+                self.__sessions[host] = session
+
+        return session
+
+    def post(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+
+        return self.get_session(url).post(url, **kwargs)
+
+    def close(self):
+        with self.__lock:
+            sessions = list(self.__sessions.values())
+            self.__sessions = {}
+
+        for session in sessions:
+            session.close()
+
+
+TRANSPORT = HTTPTransport()
+
+
+def get_transport():
+    return TRANSPORT
+
+
+def configure_transport(**kwargs):
+    """ 공용 전송 계층 (@TRANSPORT) 을 새로운 설정으로 교체 합니다.
+        (이 후 생성되는 WebHooksAPI 인스턴스 부터 적용)
+    """
+    global TRANSPORT
+
+    old_transport = TRANSPORT
+    TRANSPORT = HTTPTransport(**kwargs)
+    old_transport.close()
+
+    return TRANSPORT
+
+
+class PayloadDedup(object):
+    """ webhook URL (채널) 별 최근 전송한 payload 의 hash 를 기억 하여,
+        @ttl 초 이내에 같은 URL 로 같은 payload 를 다시 전송 하지 않도록 합니다.
+
+        - (URL, payload hash) 는 최대 @max_size 개 까지 LRU 로 유지 합니다.
+        - 만료 시간은 실제 전송한 시점 기준 이며, 중복으로 건너뛴 경우 연장 하지 않습니다.
+        - @ttl 이 0 인 경우 중복 확인을 하지 않습니다.
+    """
+
+    def __init__(self, ttl=DEFAULT_DEDUP_TTL, max_size=DEFAULT_DEDUP_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+
+        self.__recent = OrderedDict()  # (url, payload hash): 만료 시간 (monotonic)
+        self.__lock = threading.Lock()
+
+        self.suppressed_count = 0
+
+    @staticmethod
+    def get_digest(payload):
+        data = json.dumps(
+            payload, sort_keys=True, ensure_ascii=False, separators=(',', ':')
+        )
+
+        return hashlib.sha256(data.encode('utf-8')).digest()
+
+    def check(self, url, payload):
+        """ @ttl 초 이내에 같은 @url 로 같은 @payload 를 전송한 경우 True 를,
+            아닌 경우 전송 기록을 남기고 False 를 반환 합니다.
+        """
+        if not self.ttl:
+            return False
+
+        key = (url, self.get_digest(payload))
+        now = time.monotonic()
+
+        with self.__lock:
+            expire = self.__recent.get(key)
+            is_duplicated = expire is not None and expire > now
+
+            if is_duplicated:
+                self.suppressed_count += 1
+
+            else:
+                self.__recent[key] = now + self.ttl
+
+            self.__recent.move_to_end(key)
+            while len(self.__recent) > self.max_size:
+                self.__recent.popitem(last=False)
+
+        if is_duplicated:
+            DEDUP_SUPPRESSED.inc(webhook=get_url_label(url))
+
+        return is_duplicated
+
+    def discard(self, url, payload):
+        """ 전송에 실패한 @payload 의 기록을 삭제하여, 다시 전송 할 수 있도록 합니다. """
+        with self.__lock:
+            self.__recent.pop((url, self.get_digest(payload)), None)
+
+
+DEDUP = PayloadDedup()
+
+
+def get_dedup():
+    return DEDUP
+
+
+def configure_dedup(**kwargs):
+    """ 공용 중복 전송 방지 설정 (@DEDUP) 을 새로운 설정으로 교체 합니다.
+        (이 후 생성되는 InCommingWebHooks, OutboundQueue 인스턴스 부터 적용)
+    """
+    global DEDUP
+
+    DEDUP = PayloadDedup(**kwargs)
+
+    return DEDUP
+
 
 class WebHooksAPI(object):
-    def __init__(self, url):
+    def __init__(self, url, transport=None):
         if not url:
             raise Exception('URL Required Options')
 
         self.url = url
+        self.transport = transport or get_transport()
 
     def post(self, **kwargs):
-        res = requests.post(self.url, **kwargs)
+        res = self.transport.post(self.url, **kwargs)
         return res
 
 
 class InCommingWebHooks(WebHooksAPI):
-    def __init__(self, url):
-        super(InCommingWebHooks, self).__init__(url)
+    """ Slack incoming webhook 으로 메세지를 전송 합니다.
+        (@dedup 기간 내에 같은 메세지를 전송한 경우 건너뜀)
+    """
+
+    def __init__(self, url, transport=None, dedup=None):
+        super(InCommingWebHooks, self).__init__(url, transport)
 
+        self.dedup = dedup or get_dedup()
         self.json_data = {}
 
     def send_msg(self, **kwargs):
@@ -33,12 +270,25 @@ class InCommingWebHooks(WebHooksAPI):
 
         self.json_data.update(kwargs)
 
+        if self.dedup.check(self.url, self.json_data):
+            LOGGER.info('Skip duplicated slack message')
+            self.json_data = {}
+            return SEND_DUPLICATED
+
         try:
             res = self.post(json=self.json_data)
+            if not res.ok:
+                raise Exception(
+                    'response code: {}, msg: {}'.format(
+                        res.status_code, res.text
+                    )
+                )
+
             LOGGER.info('Success send to slack [response code: {}]'.format(res))
 
         except Exception as e:
             LOGGER.error('Failed send to slack [msg: {}]'.format(e))
+            self.dedup.discard(self.url, self.json_data)
             return SEND_FAIL
 
         finally:
@@ -48,4 +298,119 @@ class InCommingWebHooks(WebHooksAPI):
 
 
 class OutgoingWebHooks(WebHooksAPI):
-    pass
+    """ 외부 (Slack outgoing webhook, Notion automation 등) 에서 호출하는
+        webhook callback 을 받는 local HTTP receiver 입니다.
+
+        - @url ('http://host:port') 에서 대기 하며, 'POST /<name>' 요청을
+          검증 후 @handler(name, body) 를 호출 합니다.
+        - 요청 검증은 Slack signing secret 방식을 사용 합니다.
+            - X-Slack-Request-Timestamp: 요청 시간 (@max_skew 초 이내)
+            - X-Slack-Signature: 'v0=' + HMAC-SHA256(@secret, 'v0:{timestamp}:{body}')
+          (참고: https://api.slack.com/authentication/verifying-requests-from-slack)
+    """
+
+    def __init__(self, url, secret, handler, max_skew=DEFAULT_MAX_SKEW,
+                 max_body_size=DEFAULT_MAX_BODY_SIZE):
+        super(OutgoingWebHooks, self).__init__(url)
+
+        if not secret:
+            raise Exception('Secret Required Options')
+
+        self.secret = secret.encode('utf-8')
+        self.handler = handler
+        self.max_skew = max_skew
+        self.max_body_size = max_body_size
+
+        self.__server = None
+        self.__thread = None
+
+    def verify(self, timestamp, signature, body):
+        try:
+            if abs(time.time() - int(timestamp)) > self.max_skew:
+                return False
+
+        except (TypeError, ValueError):
+            return False
+
+        base = b'v0:' + timestamp.encode('utf-8') + b':' + body
+        expected = 'v0=' + hmac.new(self.secret, base, hashlib.sha256).hexdigest()
+
+        return hmac.compare_digest(expected, signature or '')
+
+    def __make_request_handler(self):
+        receiver = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            def __reply(self, code):
+                self.send_response(code)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def do_POST(self):
+                try:
+                    length = int(self.headers.get('Content-Length', 0))
+
+                except ValueError:
+                    return self.__reply(400)
+
+                if length < 0:
+                    return self.__reply(400)
+
+                if length > receiver.max_body_size:
+                    return self.__reply(413)
+
+                body = self.rfile.read(length)
+
+                is_valid = receiver.verify(
+                    self.headers.get('X-Slack-Request-Timestamp'),
+                    self.headers.get('X-Slack-Signature'),
+                    body
+                )
+                if not is_valid:
+                    LOGGER.warning('Invalid webhook signature ({})'.format(
+                        self.client_address[0]
+                    ))
+                    return self.__reply(401)
+
+                name = self.path.split('?', 1)[0].strip('/')
+
+                try:
+                    is_handled = receiver.handler(name, body)
+
+                except Exception as e:
+                    LOGGER.error('Webhook handler failed [msg: {}]'.format(e))
+                    return self.__reply(500)
+
+                self.__reply(202 if is_handled else 404)
+
+            def log_message(self, fmt, *args):
+                LOGGER.debug(fmt % args)
+
+        return RequestHandler
+
+    def start(self):
+        """ receiver 를 별도의 thread 에서 시작 합니다. """
+        url_info = urlsplit(self.url)
+
+        self.__server = ThreadingHTTPServer(
+            (url_info.hostname, url_info.port),
+            self.__make_request_handler()
+        )
+        self.__server.daemon_threads = True
+
+        self.__thread = threading.Thread(
+            target=self.__server.serve_forever,
+            name='webhook-receiver',
+            daemon=True
+        )
+        self.__thread.start()
+
+        LOGGER.info('Start webhook receiver ({})'.format(self.url))
+
+    def stop(self):
+        if self.__server is None:
+            return
+
+        self.__server.shutdown()
+        self.__server.server_close()
+        self.__server = None
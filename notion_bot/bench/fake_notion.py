@@ -0,0 +1,426 @@
+""" 벤치마크 용 fake Notion 서버 (HTTP 요청 단위)
+
+    - FakeNotionBackend : 하나의 Coll 페이지 (page / collection / view record 및
+                          Row @n_rows 개) 를 흉내 내며, 초당 @trigger_rate 개의 Row 에
+                          trigger 를 체크 합니다.
+    - FakeNotionServer  : notion-py 가 사용하는 API (loadUserContent, loadPageChunk,
+                          getRecordValues, queryCollection, submitTransaction) 를
+                          backend 의 record 로 응답 하며, @rate_limit_ratio 비율의
+                          요청에 429 (Retry-After: @retry_after) 로 응답 합니다.
+    - FakeNotionAdapter : requests transport adapter 로, session 의 요청을 실제
+                          전송 없이 FakeNotionServer 로 전달 합니다.
+
+    HTTP 요청만 대체 하므로 NotionAPI (handle 캐시, projection, transaction,
+    request governor, client 공유) 및 notion-py 코드는 그대로 실행 됩니다.
+"""
+import json
+import time
+import uuid
+import random
+import threading
+
+from urllib.parse import urlsplit
+
+import requests
+
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+
+TITLE_PROP = '제목'
+DATE_PROP = '공지일'
+TARGET_PROP = '대상'
+WRITER_PROP = '작성자'
+
+TRIGGER_PID = 'trig'
+DATE_PID = 'date'
+TARGET_PID = 'targ'
+WRITER_PID = 'writ'
+
+
+def new_id():
+    return str(uuid.uuid4())
+
+
+def get_now_ms():
+    return int(time.time() * 1000)
+
+
+class FakeRow(object):
+    __slots__ = ('id', 'title', 'record')
+
+    def __init__(self, row_id, title, collection_id):
+        self.id = row_id
+        self.title = title
+        self.record = {
+            'id': row_id,
+            'version': 1,
+            'type': 'page',
+            'alive': True,
+            'parent_id': collection_id,
+            'parent_table': 'collection',
+            'properties': {
+                'title': [[title]],
+                TRIGGER_PID: [['No']],
+                DATE_PID: [['‣', [['d', {
+                    'type': 'date', 'start_date': '2021-10-01'
+                }]]]],
+                TARGET_PID: [['all']],
+                WRITER_PID: [['bench']],
+            },
+            'last_edited_time': get_now_ms(),
+        }
+
+
+class FakeNotionBackend(object):
+    def __init__(self, name, n_rows, trigger_name, trigger_rate=1.0,
+                 latency=0.0):
+
+        self.name = name
+        self.trigger_name = trigger_name
+        self.trigger_rate = trigger_rate
+        self.latency = latency
+
+        self.page_id = new_id()
+        self.collection_id = new_id()
+        self.view_id = new_id()
+
+        self.rows = [
+            FakeRow(new_id(), '{}-{}'.format(name, idx), self.collection_id)
+            for idx in range(n_rows)
+        ]
+        self.records = {
+            'block': {row.id: row.record for row in self.rows},
+            'collection': {
+                self.collection_id: {
+                    'id': self.collection_id,
+                    'version': 1,
+                    'name': [[name]],
+                    'parent_id': self.page_id,
+                    'parent_table': 'block',
+                    'alive': True,
+                    'schema': {
+                        'title': {'name': TITLE_PROP, 'type': 'title'},
+                        TRIGGER_PID: {'name': trigger_name, 'type': 'checkbox'},
+                        DATE_PID: {'name': DATE_PROP, 'type': 'date'},
+                        TARGET_PID: {'name': TARGET_PROP, 'type': 'text'},
+                        WRITER_PID: {'name': WRITER_PROP, 'type': 'text'},
+                    },
+                },
+            },
+            'collection_view': {
+                self.view_id: {
+                    'id': self.view_id,
+                    'version': 1,
+                    'type': 'table',
+                    'name': 'Default view',
+                    'parent_id': self.page_id,
+                    'parent_table': 'block',
+                    'alive': True,
+                    'format': {},
+                },
+            },
+        }
+        self.records['block'][self.page_id] = {
+            'id': self.page_id,
+            'version': 1,
+            'type': 'collection_view_page',
+            'alive': True,
+            'collection_id': self.collection_id,
+            'view_ids': [self.view_id],
+            'parent_table': 'space',
+        }
+
+        self.trigger_times = {}  # Row 제목: trigger 체크 시간 (monotonic) 리스트
+
+        self.n_requests = 0
+        self.n_triggered = 0
+        self.n_rows_returned = 0
+
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+
+    @property
+    def url(self):
+        return 'https://www.notion.so/{}'.format(self.page_id.replace('-', ''))
+
+    def get_record_ids(self):
+        for table, records in self.records.items():
+            for record_id in records:
+                yield record_id
+
+    def request(self):
+        """ Notion API 한번의 요청 지연을 흉내 냅니다. """
+        with self.__lock:
+            self.n_requests += 1
+
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get_record(self, table, record_id):
+        with self.__lock:
+            record = self.records.get(table, {}).get(record_id)
+            return json.loads(json.dumps(record)) if record else None
+
+    def get_page_recordmap(self):
+        """ loadPageChunk 응답 과 같이 page 및 collection / view record 를 반환 합니다. """
+        return {
+            'block': {
+                self.page_id: {
+                    'value': self.get_record('block', self.page_id)
+                },
+            },
+            'collection': {
+                self.collection_id: {
+                    'value': self.get_record('collection', self.collection_id)
+                },
+            },
+            'collection_view': {
+                self.view_id: {
+                    'value': self.get_record('collection_view', self.view_id)
+                },
+            },
+        }
+
+    def query(self, query_filter):
+        """ checkbox_is filter 에 맞는 Row 의 (id 리스트, recordMap) 을 반환 합니다. """
+        conditions = []
+        for _filter in (query_filter or {}).get('filters', []):
+            value = _filter['filter']['value']['value']
+            conditions.append((_filter['property'], 'Yes' if value else 'No'))
+
+        with self.__lock:
+            rows = [
+                row for row in self.rows
+                    if all(
+                        row.record['properties'][pid] == [[value]]
+                        for pid, value in conditions
+                    )
+            ]
+            self.n_rows_returned += len(rows)
+
+            block_ids = [row.id for row in rows]
+            recordmap = {
+                'block': {
+                    row.id: {'value': json.loads(json.dumps(row.record))}
+                    for row in rows
+                },
+            }
+
+        return block_ids, recordmap
+
+    def apply_operation(self, operation):
+        """ submitTransaction 의 operation (set / update) 을 record 에 반영 합니다. """
+        with self.__lock:
+            record = self.records.get(operation['table'], {}).get(
+                operation['id']
+            )
+            if record is None:
+                return
+
+            path = list(operation['path'])
+            command = operation['command']
+
+            ref = record
+            while len(path) > 1 or (path and command != 'set'):
+                ref = ref.setdefault(path.pop(0), {})
+
+            if command == 'set':
+                ref[path[0]] = operation['args']
+
+            elif command == 'update':
+                ref.update(operation['args'])
+
+            record['version'] += 1
+            record['last_edited_time'] = get_now_ms()
+
+    def trigger_random_row(self):
+        row = random.choice(self.rows)
+
+        with self.__lock:
+            props = row.record['properties']
+            if props[TRIGGER_PID] == [['Yes']]:
+                return
+
+            props[TRIGGER_PID] = [['Yes']]
+            row.record['version'] += 1
+            row.record['last_edited_time'] = get_now_ms()
+
+            self.trigger_times.setdefault(row.title, []).append(time.monotonic())
+            self.n_triggered += 1
+
+    def count_triggered(self):
+        """ 현재 trigger 가 체크된 (아직 노티 되지 않은) Row 수를 반환 합니다. """
+        with self.__lock:
+            return sum(
+                1 for row in self.rows
+                    if row.record['properties'][TRIGGER_PID] == [['Yes']]
+            )
+
+    def __run_trigger(self):
+        while not self.__stop.wait(1.0 / self.trigger_rate):
+            self.trigger_random_row()
+
+    def start(self):
+        if not self.trigger_rate:
+            return
+
+        threading.Thread(
+            target=self.__run_trigger, name='fake-trigger', daemon=True
+        ).start()
+
+    def stop(self):
+        self.__stop.set()
+
+
+class FakeNotionServer(object):
+    def __init__(self, backends, rate_limit_ratio=0.0, retry_after=1):
+        self.backends = list(backends)
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+
+        self.user_id = new_id()
+        self.space_id = new_id()
+
+        self.n_requests = 0
+        self.n_rate_limited = 0
+
+        self.__owners = {}  # record id: FakeNotionBackend
+        for backend in self.backends:
+            for record_id in backend.get_record_ids():
+                self.__owners[record_id] = backend
+
+        self.__lock = threading.Lock()
+
+    def __load_user_content(self, data):
+        return {
+            'recordMap': {
+                'notion_user': {
+                    self.user_id: {
+                        'role': 'editor',
+                        'value': {'id': self.user_id, 'given_name': 'bench'},
+                    },
+                },
+                'space': {
+                    self.space_id: {
+                        'role': 'editor',
+                        'value': {'id': self.space_id, 'name': 'bench'},
+                    },
+                },
+            },
+        }
+
+    def __load_page_chunk(self, data):
+        backend = self.__owners[data['pageId']]
+        backend.request()
+
+        return {'recordMap': backend.get_page_recordmap(), 'cursor': {}}
+
+    def __get_record_values(self, data):
+        requests_ = data['requests']
+        if requests_:
+            self.__owners[requests_[0]['id']].request()
+
+        results = []
+        for request in requests_:
+            backend = self.__owners.get(request['id'])
+            record = (
+                backend.get_record(request['table'], request['id'])
+                if backend else None
+            )
+            results.append({'role': 'editor', 'value': record} if record else {})
+
+        return {'results': results}
+
+    def __query_collection(self, data):
+        backend = self.__owners[data['collectionId']]
+        backend.request()
+
+        block_ids, recordmap = backend.query(data['query'].get('filter'))
+
+        return {
+            'result': {
+                'type': 'table',
+                'blockIds': block_ids,
+                'aggregationResults': [],
+                'total': len(block_ids),
+            },
+            'recordMap': recordmap,
+        }
+
+    def __submit_transaction(self, data):
+        operations = data['operations']
+        if operations:
+            self.__owners[operations[0]['id']].request()
+
+        for operation in operations:
+            backend = self.__owners.get(operation['id'])
+            if backend is not None:
+                backend.apply_operation(operation)
+
+        return {}
+
+    def handle_request(self, endpoint, data):
+        """ 요청을 처리 하고, (응답 코드, 응답 body, 응답 header) 를 반환 합니다. """
+        handlers = {
+            'loadUserContent': self.__load_user_content,
+            'loadPageChunk': self.__load_page_chunk,
+            'getRecordValues': self.__get_record_values,
+            'queryCollection': self.__query_collection,
+            'submitTransaction': self.__submit_transaction,
+        }
+
+        with self.__lock:
+            self.n_requests += 1
+
+            if endpoint != 'loadUserContent' and \
+                    random.random() < self.rate_limit_ratio:
+                self.n_rate_limited += 1
+                return 429, {}, {'Retry-After': str(self.retry_after)}
+
+        handler = handlers.get(endpoint)
+        if handler is None:
+            return 404, {}, {}
+
+        try:
+            return 200, handler(data), {}
+
+        except KeyError as e:
+            return 400, {'message': 'Unknown record ({})'.format(e)}, {}
+
+
+class FakeNotionAdapter(BaseAdapter):
+    """ session 의 요청을 FakeNotionServer (@server) 에서 처리 합니다. """
+
+    def __init__(self, server):
+        super(FakeNotionAdapter, self).__init__()
+
+        self.server = server
+        self.max_retries = Retry(0, read=False)
+
+    def send(self, request, **kwargs):
+        endpoint = urlsplit(request.url).path.rsplit('/', 1)[-1]
+        data = json.loads(request.body or b'{}')
+
+        status, body, headers = self.server.handle_request(endpoint, data)
+
+        res = requests.Response()
+        res.status_code = status
+        res._content = json.dumps(body).encode('utf-8')
+        res.headers = CaseInsensitiveDict(headers)
+        res.encoding = 'utf-8'
+        res.url = request.url
+        res.request = request
+
+        return res
+
+    def close(self):
+        pass
+
+
+def make_fake_session(server):
+    """ Notion 요청을 @server 로 전달 하는 requests Session 을 생성 합니다. """
+    session = requests.Session()
+    session.mount('https://', FakeNotionAdapter(server))
+
+    return session
@@ -0,0 +1,109 @@
+""" 벤치마크 용 local Slack incoming webhook 서버
+
+    - @rate_limit_ratio 비율의 요청에 429 (Retry-After: @retry_after) 로 응답
+    - 모든 요청에 @latency 초 의 응답 지연 적용
+    - 수신한 메세지의 block 에서 Row 제목 (Row id) 을 찾아 수신 시간을 기록
+"""
+import re
+import json
+import time
+import random
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TITLE_PATTERN = re.compile(r':loudspeaker: \*([^*]+)\*')
+
+
+class FakeSlackServer(object):
+    def __init__(self, latency=0.0, rate_limit_ratio=0.0, retry_after=1):
+        self.latency = latency
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+
+        self.received = []  # (row id, 수신 시간 (monotonic))
+        self.n_requests = 0
+        self.n_rate_limited = 0
+
+        self.__lock = threading.Lock()
+        self.__server = None
+
+    @property
+    def url(self):
+        host, port = self.__server.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def handle_request(self, body):
+        """ 요청을 처리 하고, 응답 코드를 반환 합니다. """
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self.__lock:
+            self.n_requests += 1
+
+            if random.random() < self.rate_limit_ratio:
+                self.n_rate_limited += 1
+                return 429
+
+        try:
+            data = json.loads(body)
+
+        except ValueError:
+            return 400
+
+        recv_time = time.monotonic()
+        row_ids = TITLE_PATTERN.findall(json.dumps(data, ensure_ascii=False))
+
+        with self.__lock:
+            self.received.extend((row_id, recv_time) for row_id in row_ids)
+
+        return 200
+
+    def __make_request_handler(self):
+        server = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                code = server.handle_request(
+                    self.rfile.read(length)
+                )
+
+                body = b'ok' if code == 200 else b'error'
+                self.send_response(code)
+                if code == 429:
+                    self.send_header('Retry-After', str(server.retry_after))
+
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, fmt, *args):
+                pass
+
+        return RequestHandler
+
+    def start(self):
+        self.__server = ThreadingHTTPServer(
+            ('127.0.0.1', 0), self.__make_request_handler()
+        )
+        self.__server.daemon_threads = True
+
+        threading.Thread(
+            target=self.__server.serve_forever,
+            name='fake-slack',
+            daemon=True
+        ).start()
+
+    def stop(self):
+        self.__server.shutdown()
+        self.__server.server_close()
+
+    def pop_received(self):
+        with self.__lock:
+            received = self.received
+            self.received = []
+
+        return received
@@ -0,0 +1,355 @@
+""" notion bot end-to-end 벤치마크
+
+    fake Notion 서버 (HTTP 요청 단위) 와 local fake Slack webhook 서버를 사용 하여
+    Manager / CollectionPageNotiBot / NotionAPI 전체 파이프라인을 실행 하고, 타겟
+    개수 (기본값 1/10/100) 별 결과를 json 파일로 저장 합니다.
+
+    각 시나리오는 별도 프로세스 에서 실행 되므로, 메모리 사용량 및 공용 상태
+    (metrics, governor, 공유 client) 가 다음 시나리오 에 이어지지 않습니다.
+
+    - rows_scanned_per_sec      : trigger 스캔 에서 확인한 Row 수 / 초
+    - notifications_per_sec     : Slack 서버가 수신한 노티 수 / 초
+    - latency_p50/p99           : Notion 에서 trigger 체크 후 Slack 수신 까지 걸린 시간 (초)
+    - undelivered               : trigger 가 체크 되었지만 Slack 에 수신 되지 않은 노티 수
+                                  (trigger 중지 후 남은 trigger 가 모두 스캔 될 때 까지
+                                   최대 --drain-timeout 초 동안 기다린 후에도 남은 수)
+    - base_rss_kb               : 시나리오 시작 시 메모리 사용량 (VmRSS)
+    - peak_rss_kb               : 시나리오 프로세스 최대 메모리 사용량 (VmHWM)
+
+    로그는 임시 디렉토리의 'slackbot_bench.log' 에 저장 됩니다.
+
+    사용법:
+        ./bench/run --targets 1 10 100 --duration 30 --output bench_result.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import multiprocessing
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+NOTION_BOT_DIR = os.path.dirname(BENCH_DIR)
+
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.join(NOTION_BOT_DIR, 'src'))
+sys.path.insert(0, NOTION_BOT_DIR)
+sys.path.insert(0, os.path.dirname(NOTION_BOT_DIR))
+
+from common.logger import LOGGER2  # noqa: E402
+
+# 로그 파일 생성 전 (다른 모듈 import 전) 에 데몬 로그 대신 임시 경로 사용
+LOG_PATH = os.path.join(tempfile.gettempdir(), 'slackbot_bench.log')
+LOGGER2.log_path = LOG_PATH
+
+import notion.client  # noqa: E402
+
+import main as notion_main  # noqa: E402
+
+from common.metrics import REGISTRY  # noqa: E402
+from common.slack_queue import close_outbound_queues  # noqa: E402
+
+from fake_notion import (  # noqa: E402
+    FakeNotionBackend, FakeNotionServer, make_fake_session
+)
+from fake_slack import FakeSlackServer  # noqa: E402
+
+TRIGGER_NAME = '공지 하기'
+
+
+def get_status_kb(field):
+    """ /proc/self/status 의 @field (VmRSS, VmHWM ...) 값을 반환 합니다. """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+
+    except OSError:
+        pass
+
+    return None
+
+
+def get_percentile(values, ratio):
+    if not values:
+        return None
+
+    values = sorted(values)
+    idx = min(len(values) - 1, int(round(ratio * (len(values) - 1))))
+
+    return values[idx]
+
+
+def get_metric_value(prefix):
+    """ @prefix 로 시작 하는 metric 값을 반환 합니다. """
+    for line in REGISTRY.render().splitlines():
+        if line.startswith(prefix + ' '):
+            return float(line.split()[-1])
+
+    return 0.0
+
+
+def make_config_list(scenario, backends, slack_url, min_interval):
+    config_list = []
+    for idx, backend in enumerate(backends):
+        config_list.append({
+            'webhook': {
+                'incoming_url': '{}/{}/{}'.format(slack_url, scenario, idx),
+            },
+            'notion': {
+                'token': 'bench-{}'.format(scenario),
+                'page_type': 'collection',
+                'page_url': backend.url,
+                'trigger': TRIGGER_NAME,
+            },
+            'slack': {
+                'send_type': 'block',
+                'block_format': {
+                    'file': 'block_fmt_1.json',
+                    'variable_block': {
+                        'date': '공지일',
+                        'target': '대상',
+                        'writer': '작성자',
+                        'title': '제목'
+                    }
+                }
+            },
+            'schedule': {
+                'min_interval': min_interval,
+                'max_interval': min_interval * 4,
+            },
+        })
+
+    return config_list
+
+
+def run_scenario(args, scenario, n_targets, state_dir):
+    base_rss_kb = get_status_kb('VmRSS')
+
+    slack = FakeSlackServer(
+        latency=args.slack_latency,
+        rate_limit_ratio=args.slack_429_ratio,
+        retry_after=args.slack_retry_after
+    )
+    slack.start()
+
+    backends = [
+        FakeNotionBackend(
+            '{}-{}'.format(scenario, idx), args.rows, TRIGGER_NAME,
+            trigger_rate=args.trigger_rate,
+            latency=args.notion_latency
+        )
+        for idx in range(n_targets)
+    ]
+    server = FakeNotionServer(
+        backends,
+        rate_limit_ratio=args.notion_429_ratio,
+        retry_after=args.notion_retry_after
+    )
+
+    # NotionClient 의 HTTP session 만 교체 하여, NotionAPI 이하 코드는 그대로 실행
+    notion.client.create_session = (
+        lambda client_specified_retry=None: make_fake_session(server)
+    )
+
+    notion_main.MANAGER_CONFIG.update({
+        'state_dir': os.path.join(state_dir, scenario),
+        'lease': {},
+        'metrics': {},
+    })
+    notion_main.SLACK_QUEUE_CONFIG.update({
+        'rate': args.slack_rate,
+        'delivery_log': os.path.join(state_dir, scenario, 'delivery.db'),
+    })
+    notion_main.PUSH_CONFIG['enable'] = False
+    # 같은 Row 가 다시 trigger 되어도 모두 전송 되도록 중복 방지는 사용 안함
+    notion_main.DEDUP_CONFIG['ttl'] = 0
+    if args.notion_rate:
+        notion_main.NOTION_RATE_CONFIG['rate'] = args.notion_rate
+
+    manager = notion_main.Manager(
+        config_list=make_config_list(
+            scenario, backends, slack.url, args.min_interval
+        )
+    )
+    manager.init()
+
+    stop = threading.Event()
+    n_submitted = [0]
+
+    def run_manager():
+        while not stop.is_set():
+            stats = manager.check()
+            if stats:
+                n_submitted[0] += stats['submitted']
+
+            manager.wait_next()
+
+    def wait_checks(timeout):
+        deadline = time.monotonic() + timeout
+        while manager.get_check_stats()['done'] < n_submitted[0]:
+            if time.monotonic() > deadline:
+                break
+
+            time.sleep(0.05)
+
+    def wait_triggers_drained(timeout):
+        """ 남은 trigger 가 모두 스캔 (해제) 될 때 까지 최대 @timeout 초 대기 합니다. """
+        deadline = time.monotonic() + timeout
+        while any(backend.count_triggered() for backend in backends):
+            if time.monotonic() > deadline:
+                break
+
+            time.sleep(0.1)
+
+    for backend in backends:
+        backend.start()
+
+    start_time = time.monotonic()
+    manager_thread = threading.Thread(target=run_manager, daemon=True)
+    manager_thread.start()
+
+    stop.wait(args.duration)
+    for backend in backends:
+        backend.stop()
+
+    # 남은 trigger 를 모두 스캔 한 후 스캔을 멈추고, Slack 까지 전송 될 때 까지 대기
+    wait_triggers_drained(args.drain_timeout)
+    stop.set()
+    manager_thread.join(args.min_interval * 4)
+    wait_checks(args.drain_timeout)
+    close_outbound_queues(timeout=args.drain_timeout)
+
+    elapsed = time.monotonic() - start_time
+    slack.stop()
+
+    # 같은 Row 가 여러번 trigger 된 경우 순서 대로 수신 시간과 매칭
+    trigger_times = {}
+    for backend in backends:
+        for title, times in backend.trigger_times.items():
+            trigger_times[title] = list(times)
+
+    latencies = []
+    received = sorted(slack.pop_received(), key=lambda x: x[1])
+    for title, recv_time in received:
+        times = trigger_times.get(title)
+        if times:
+            latencies.append(recv_time - times.pop(0))
+
+    n_undelivered = sum(len(times) for times in trigger_times.values())
+
+    n_triggered = sum(backend.n_triggered for backend in backends)
+
+    return {
+        'targets': n_targets,
+        'rows_per_target': args.rows,
+        'elapsed': elapsed,
+        'triggered': n_triggered,
+        'notified': len(received),
+        'undelivered': n_undelivered,
+        'slack_requests': slack.n_requests,
+        'slack_rate_limited': slack.n_rate_limited,
+        'notion_requests': server.n_requests,
+        'notion_rate_limited': server.n_rate_limited,
+        'rows_scanned_per_sec': (
+            get_metric_value('slackbot_rows_total{kind="scanned"}') / elapsed
+        ),
+        'notifications_per_sec': len(received) / elapsed,
+        'latency_p50': get_percentile(latencies, 0.5),
+        'latency_p99': get_percentile(latencies, 0.99),
+        'base_rss_kb': base_rss_kb,
+        'peak_rss_kb': get_status_kb('VmHWM'),
+    }
+
+
+def run_scenario_process(args, scenario, n_targets, state_dir):
+    """ 시나리오 를 새 프로세스 에서 실행 하고, 결과를 반환 합니다. """
+    ctx = multiprocessing.get_context('fork')
+    recv_conn, send_conn = ctx.Pipe(duplex=False)
+
+    def target():
+        try:
+            send_conn.send(run_scenario(args, scenario, n_targets, state_dir))
+
+        except Exception as e:
+            send_conn.send(e)
+
+    process = ctx.Process(target=target, name='bench-{}'.format(scenario))
+    process.start()
+    send_conn.close()
+
+    try:
+        result = recv_conn.recv()
+
+    except EOFError:
+        result = None
+
+    process.join()
+
+    if result is None:
+        result = Exception(
+            'Exited without result [code: {}]'.format(process.exitcode)
+        )
+
+    if isinstance(result, Exception):
+        raise Exception('Scenario {} failed ({})'.format(scenario, result))
+
+    return result
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--targets', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--trigger-rate', type=float, default=0.5)
+    parser.add_argument('--notion-latency', type=float, default=0.05)
+    parser.add_argument('--notion-429-ratio', type=float, default=0.0)
+    parser.add_argument('--notion-retry-after', type=float, default=1)
+    parser.add_argument('--notion-rate', type=float, default=None)
+    parser.add_argument('--slack-latency', type=float, default=0.02)
+    parser.add_argument('--slack-429-ratio', type=float, default=0.0)
+    parser.add_argument('--slack-retry-after', type=float, default=1)
+    parser.add_argument('--slack-rate', type=float, default=1.0)
+    parser.add_argument('--min-interval', type=float, default=1.0)
+    parser.add_argument('--drain-timeout', type=float, default=60)
+    parser.add_argument('--output', default='bench_result.json')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    state_dir = tempfile.mkdtemp(prefix='slackbot_bench_')
+
+    results = []
+    try:
+        for idx, n_targets in enumerate(args.targets):
+            result = run_scenario_process(
+                args, 's{}'.format(idx), n_targets, state_dir
+            )
+            results.append(result)
+
+            print(json.dumps(result))
+
+    finally:
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'args': vars(args),
+        'results': results,
+    }
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print('Saved benchmark result ({}, log: {})'.format(args.output, LOG_PATH))
+
+
+if __name__ == '__main__':
+    main()
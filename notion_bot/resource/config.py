@@ -4,6 +4,9 @@
 
         "incoming_url"        : 노티할 타겟 채널에 추가된 Incoming Webhook Url 링크
 
+        "outgoing_name"       : (선택) push 모드 (PUSH_CONFIG) 에서 이 타겟을 바로 체크 하도록 호출할 이름
+                                  - 'POST <listen_url>/<outgoing_name>' 형태로 호출
+
 
     "notion"                  : 노션 관련 설정을 정의
 
@@ -34,8 +37,186 @@
 
             "variable_block"  : json 파일에 ${var_name} 같은 형태로 변수를 추가할 수 있습니다.
                                 이후 데몬이 동작할 때, ${var_name} 에 매칭되는 노션 페이지 블럭을 가져와, 해당 값으로 대치 해줍니다.
+
+
+    "schedule"                : (선택) 타겟 별 polling 주기 설정을 정의
+                                  - 노티할 항목이 없으면 주기를 "backoff" 배 씩 늘리고, 노티할 항목이 생기면 최소 주기로 복귀
+
+        "min_interval"        : 최소 체크 주기 (초, 기본값 5)
+
+        "max_interval"        : 최대 체크 주기 (초, 기본값 60, "min_interval" 이 더 큰 경우 "min_interval")
+
+        "backoff"             : 노티할 항목이 없을 때 주기를 늘리는 배수 (1 이상, 기본값 2.0)
+
+        "jitter"              : 여러 타겟의 체크 시점이 겹치지 않도록 주기에 더하는 랜덤 비율 (0 이상 1 미만, 기본값 0.1, ±10%)
+
+
+    MANAGER_CONFIG            : 데몬 (Manager) 동작 관련 설정을 정의
+
+        "max_workers"         : 동시에 체크할 수 있는 최대 타겟 개수 (worker thread 개수)
+
+        "cycle_timeout"       : 타겟 한번 체크에 걸리는 시간이 이 값 (초) 을 넘으면 경고 로그를 남깁니다.
+                                  - 체크 완료를 기다리지 않으므로 느린 타겟이 다른 타겟의 체크를 늦추지 않으며,
+                                    끝나지 않은 타겟은 완료 전까지 다음 주기에서 제외 됩니다.
+
+        "config_watch"        : config 파일 (CONFIG_LIST) 이 바뀌면 자동으로 다시 읽을지 여부
+                                  - 사용 하지 않는 경우에도 '--reload' (SIGHUP) 로 다시 읽을 수 있습니다.
+                                  - 추가/삭제/변경된 타겟만 반영 되며, CONFIG_LIST 외의 설정은 재시작 시 적용 됩니다.
+
+        "state_dir"           : 재시작 후에도 유지 되어야 하는 타겟 별 상태 (Row 스냅샷 등) 를 저장할 디렉토리
+                                  - 빈 값인 경우 상태를 파일로 저장하지 않습니다.
+
+        "handle_ttl"          : 타겟 페이지 URL 로 조회한 page / collection / view 정보를 재사용 하는 시간 (초)
+                                  - 시간 내 에는 페이지 조회 없이 바로 Row 를 조회 하며, 조회 오류 시 바로 다시 조회 합니다.
+                                  - "state_dir" 에 저장 되어 재시작 후 에도 사용 됩니다.
+
+        "lease"               : 여러 데몬 (node) 이 타겟을 나눠서 관리 하기 위한 lease 설정
+                                  - 각 타겟은 lease 를 가진 하나의 node 에서만 체크 되며,
+                                    죽은 node 의 타겟은 lease 만료 ("ttl") 후 다른 node 가 가져 갑니다.
+
+            "path"            : 모든 node 가 공유하는 lease 저장소 (SQLite 파일) 경로 (빈 값인 경우 사용 안함)
+
+            "ttl"             : lease 유지 시간 (초), 타겟 한번 체크에 걸리는 시간 보다 충분히 커야 합니다.
+
+            "node_id"         : node 이름 (빈 값인 경우 'hostname:pid')
+                                  - multi worker 모드 에서는 worker 마다 하나의 node 로 동작 하며,
+                                    ('<node_id>/<worker id>') 같은 타겟을 할당 받은 다른 데몬의
+                                    worker 끼리 타겟을 나눕니다. 따라서 lease 저장소를 공유하는
+                                    데몬은 같은 worker 수 (--workers) 로 실행 해야 고르게 나눠 집니다.
+
+        "metrics"             : 파이프라인 stage 별 metric 설정
+
+            "listen_url"      : Prometheus text 포맷 metric 을 제공할 주소 ('http://host:port', 빈 값인 경우 사용 안함)
+                                  - GET <listen_url>/metrics
+                                  - multi worker 모드 에서는 worker 별로 port + 1 + worker id 를 사용
+                                  - 같은 host 에서 여러 데몬 (--pid-file) 을 실행 하는 경우, 데몬 마다 다른
+                                    '--port-offset' (worker 수 + 1 이상 간격) 을 주어 port 가 겹치지 않도록 합니다.
+
+            "summary_interval": stage 별 요약 로그를 남기는 주기 (초, 0 인 경우 사용 안함)
+
+
+    HTTP_CONFIG               : Slack webhook 전송 계층 (common.webhook_api.HTTPTransport) 설정을 정의
+
+        "pool_size"           : host 별 keep-alive connection pool 크기
+
+        "connect_timeout"     : 연결 timeout (초)
+
+        "read_timeout"        : 응답 대기 timeout (초)
+
+        "retry_total"         : 5xx 응답 또는 연결 실패 시 최대 재시도 횟수
+                                  - 요청 전송 후 응답을 받지 못한 경우 (read timeout 등) 는 중복 전송 되지 않도록
+                                    재시도 하지 않습니다.
+
+        "retry_backoff"       : 재시도 간 backoff 계수 (초, 재시도 마다 2배씩 증가)
+
+
+    SLACK_QUEUE_CONFIG        : webhook URL 별 Slack 전송 queue (common.slack_queue.OutboundQueue) 설정을 정의
+
+        "rate"                : 초당 전송 가능한 메세지 수 (Slack 제한: 채널 당 약 1개)
+
+        "burst"               : 순간적으로 연속 전송 가능한 최대 메세지 수
+
+        "coalesce"            : 대기 중인 메세지를 Slack 제한 (50 blocks, text 길이) 내에서 하나로 합쳐 전송할지 여부
+
+        "max_retry"           : 429 응답 시 Retry-After 후 최대 재전송 횟수
+                                  - 5xx / 연결 실패는 HTTP_CONFIG "retry_total" 로 재시도 하며, 그래도 실패한 메세지는
+                                    "delivery_log" 사용 시 잠시 후 다시 전송, 아닌 경우 버립니다.
+                                  - 요청 전송 후 응답을 받지 못한 메세지는 Slack 이 받았을 수 있으므로 다시 전송 하지 않습니다.
+
+        "delivery_log"        : 전송 전 메세지를 기록할 SQLite 파일 경로 (빈 값인 경우 메모리 에서만 관리)
+                                  - 전송에 성공한 메세지만 삭제 되며, 재시작 시 남은 메세지를 다시 전송 합니다.
+                                  - 여러 worker / 데몬이 같은 파일을 사용할 수 있으며, 각 프로세스는 자신이 기록한
+                                    메세지와 종료된 프로세스가 남긴 메세지만 전송 합니다. (같은 host 에서만 공유)
+
+
+    DEDUP_CONFIG              : webhook URL (채널) 별 중복 메세지 전송 방지 (common.webhook_api.PayloadDedup) 설정을 정의
+                                  - 같은 Row 의 trigger 를 빠르게 여러번 체크한 경우 등, 같은 메세지를 한번만 전송 합니다.
+
+        "ttl"                 : 같은 메세지를 다시 전송 하지 않을 기간 (초, 0 인 경우 사용 안함)
+
+        "max_size"            : 기억할 최대 메세지 개수 (모든 URL 합계, LRU)
+
+
+    NOTION_RATE_CONFIG        : Notion 요청 속도 제한 (request_governor.RequestGovernor) 설정을 정의
+                                  - 같은 token 을 사용하는 타겟 끼리 공유 하며, worker 프로세스 별로 적용 됩니다.
+                                  - 대기 중인 요청은 trigger scan > trigger reset > 메세지 생성 (render) 순서로 전송 됩니다.
+
+        "rate"                : token 당 초당 최대 요청 수
+
+        "burst"               : 한번에 보낼 수 있는 최대 요청 수
+
+        "min_rate"            : 429 응답 으로 줄어들 수 있는 최소 초당 요청 수
+                                  - 429 응답 시 Retry-After 동안 요청을 멈추고 속도를 절반 으로 줄인 후, 성공 응답 마다 조금씩 회복 합니다.
+
+        "max_retry"           : 429 응답 시 같은 요청의 최대 재시도 횟수
+
+
+    PUSH_CONFIG               : push 모드 receiver (common.webhook_api.OutgoingWebHooks) 설정을 정의
+                                  - 외부 webhook / automation 이 호출 하면 해당 타겟을 바로 체크 합니다.
+
+        "enable"              : push 모드 사용 여부
+
+        "listen_url"          : receiver 가 대기할 주소 ('http://host:port')
+                                  - '--port-offset' 이 주어진 경우 port 에 offset 을 더해서 사용 합니다.
+
+        "secret"              : 요청 검증에 사용할 signing secret (Slack signing secret 방식)
+
+        "fallback_interval"   : push 모드 에서 'schedule/max_interval' 이 없는 타겟의 최대 polling 주기 (초)
 """
 
+MANAGER_CONFIG = {
+    "max_workers": 8,
+    "cycle_timeout": 60,
+    "config_watch": False,
+    "state_dir": "/var/lib/slackbot_daemon",
+    "handle_ttl": 600,
+    "lease": {
+        "path": "",
+        "ttl": 30,
+        "node_id": "",
+    },
+    "metrics": {
+        "listen_url": "",
+        "summary_interval": 60,
+    },
+}
+
+HTTP_CONFIG = {
+    "pool_size": 10,
+    "connect_timeout": 3.05,
+    "read_timeout": 10,
+    "retry_total": 3,
+    "retry_backoff": 0.5,
+}
+
+SLACK_QUEUE_CONFIG = {
+    "rate": 1.0,
+    "burst": 1,
+    "coalesce": True,
+    "max_retry": 3,
+    "delivery_log": "/var/lib/slackbot_daemon/delivery.db",
+}
+
+DEDUP_CONFIG = {
+    "ttl": 300,
+    "max_size": 1024,
+}
+
+NOTION_RATE_CONFIG = {
+    "rate": 3.0,
+    "burst": 3,
+    "min_rate": 0.5,
+    "max_retry": 3,
+}
+
+
+PUSH_CONFIG = {
+    "enable": False,
+    "listen_url": "http://127.0.0.1:8089",
+    "secret": "",
+    "fallback_interval": 300,
+}
+
 CONFIG_LIST = [
     {
         "webhook": {
@@ -60,6 +241,13 @@ CONFIG_LIST = [
                     "title": "제목"
                 }
             }
+        },
+
+        "schedule": {
+            "min_interval": 5,
+            "max_interval": 60,
+            "backoff": 2.0,
+            "jitter": 0.1,
         }
     },
 
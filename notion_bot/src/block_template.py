@@ -0,0 +1,109 @@
+import os
+import re
+import json
+import threading
+
+VAR_PATTERN = re.compile(r'\$\{(\w+)\}')
+
+
+class BlockTemplate(object):
+    """ Slack block 포맷 json 파일 (@path) 을 한번만 파싱하여,
+        ${var} 형태의 변수가 위치한 경로 (slot) 를 미리 찾아 둔 템플릿 입니다.
+
+        - render 시 slot 이 포함된 경로의 container 만 복사하여 값을 채우므로,
+          비용은 파일 크기가 아닌 slot 개수에 비례 합니다.
+        - 값은 json 문자열이 아닌 파싱된 트리에 그대로 들어가므로,
+          따옴표나 개행이 포함된 값도 전송 시점에 올바르게 escape 됩니다.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        with open(path) as f:
+            self.mtime = os.fstat(f.fileno()).st_mtime_ns
+            self.tree = json.load(f)
+
+        self.variables = set()
+        self.slots = self.__compile(self.tree)
+
+    def __compile(self, node):
+        """ @node 하위에 slot 이 없으면 None 을 반환 합니다.
+
+            - str       : [literal, var, literal, var, ..., literal] 형태의 tuple
+            - dict/list : {key/index: 하위 slot 정보} 형태의 dict
+        """
+        if isinstance(node, str):
+            parts = VAR_PATTERN.split(node)
+            if len(parts) == 1:
+                return None
+
+            self.variables.update(parts[1::2])
+            return tuple(parts)
+
+        if isinstance(node, dict):
+            items = node.items()
+
+        elif isinstance(node, list):
+            items = enumerate(node)
+
+        else:
+            return None
+
+        slots = {}
+        for key, child in items:
+            child_slots = self.__compile(child)
+            if child_slots is not None:
+                slots[key] = child_slots
+
+        return slots or None
+
+    def __render(self, node, slots, values):
+        if isinstance(slots, tuple):
+            rendered = []
+            for idx, part in enumerate(slots):
+                if idx % 2 == 0:
+                    rendered.append(part)
+
+                else:
+                    value = values.get(part)
+                    rendered.append(
+                        '${{{}}}'.format(part) if value is None else str(value)
+                    )
+
+            return ''.join(rendered)
+
+        new_node = node.copy()
+        for key, child_slots in slots.items():
+            new_node[key] = self.__render(node[key], child_slots, values)
+
+        return new_node
+
+    def render(self, values):
+        """ 변수 이름 (@values 의 key) 에 해당하는 값을 채운 block 트리를 반환 합니다.
+            (@values 에 없는 변수는 ${var} 형태 그대로 유지)
+
+            - slot 이 없는 하위 트리는 템플릿과 공유되므로 반환값을 수정하지 않아야 합니다.
+        """
+        if self.slots is None:
+            return self.tree
+
+        return self.__render(self.tree, self.slots, values)
+
+
+_TEMPLATES = {}  # path: BlockTemplate
+_TEMPLATES_LOCK = threading.Lock()
+
+
+def get_block_template(path):
+    """ @path 에 해당하는 BlockTemplate 을 반환 합니다.
+        파일의 mtime 이 변경된 경우 다시 파싱하여 캐시를 갱신 합니다.
+    """
+    mtime = os.stat(path).st_mtime_ns
+
+    with _TEMPLATES_LOCK:
+        template = _TEMPLATES.get(path)
+        if template is None or template.mtime != mtime:
+            template = BlockTemplate(path)
+            _TEMPLATES[path] = template
+
+    return template
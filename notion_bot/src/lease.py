@@ -0,0 +1,282 @@
+import os
+import math
+import time
+import socket
+import hashlib
+import sqlite3
+import threading
+
+from common.logger import get_logger
+
+LOGGER = get_logger('notion.lease')
+
+DEFAULT_LEASE_TTL = 30
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS leases (
+    target_key  TEXT PRIMARY KEY,
+    owner       TEXT NOT NULL,
+    expires     REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS nodes (
+    node_id     TEXT PRIMARY KEY,
+    heartbeat   REAL NOT NULL,
+    key_group   TEXT NOT NULL DEFAULT ''
+);
+'''
+
+
+def get_default_node_id():
+    return '{}:{}'.format(socket.gethostname(), os.getpid())
+
+
+def get_key_group(target_keys):
+    """ 타겟 key 목록 (@target_keys) 을 구분하는 값을 반환 합니다.
+        (같은 타겟 목록 에 대해 경쟁 하는 node 끼리 같은 값)
+    """
+    digest = hashlib.sha1('\n'.join(sorted(target_keys)).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+class SQLiteLeaseStore(object):
+    """ 여러 데몬 (node) 이 공유하는 SQLite 파일 기반 lease 저장소 입니다.
+
+        - 타겟 별 lease 는 (owner, expires) 로 저장 되며, 만료 전 까지는
+          owner 만 갱신 (renew) 할 수 있습니다.
+        - 만료 시간은 각 node 의 wall clock (time.time) 기준 이므로,
+          node 간 시간 오차는 lease TTL 보다 충분히 작아야 합니다.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(
+            path, timeout=10, isolation_level=None, check_same_thread=False
+        )
+        self.__conn.executescript(SCHEMA)
+
+        # key_group 컬럼이 없는 이전 버전의 저장소 파일
+        columns = [
+            row[1] for row in self.__conn.execute('PRAGMA table_info(nodes)')
+        ]
+        if 'key_group' not in columns:
+            self.__conn.execute(
+                "ALTER TABLE nodes ADD COLUMN key_group TEXT NOT NULL DEFAULT ''"
+            )
+
+    def __execute(self, *args):
+        with self.__lock:
+            return self.__conn.execute(*args)
+
+    def acquire(self, target_key, owner, ttl):
+        """ 타겟 (@target_key) 의 lease 를 획득 또는 갱신 합니다.
+            (비어 있거나, 만료 되었거나, 이미 @owner 인 경우에만 성공)
+        """
+        now = time.time()
+
+        with self.__lock:
+            self.__conn.execute('BEGIN IMMEDIATE')
+            try:
+                self.__conn.execute(
+                    'INSERT OR IGNORE INTO leases (target_key, owner, expires) '
+                    'VALUES (?, ?, ?)',
+                    (target_key, owner, now + ttl)
+                )
+                cur = self.__conn.execute(
+                    'UPDATE leases SET owner = ?, expires = ? '
+                    'WHERE target_key = ? AND (owner = ? OR expires < ?)',
+                    (owner, now + ttl, target_key, owner, now)
+                )
+                self.__conn.execute('COMMIT')
+
+            except Exception:
+                self.__conn.execute('ROLLBACK')
+                raise
+
+        return cur.rowcount > 0
+
+    def release(self, target_key, owner):
+        self.__execute(
+            'DELETE FROM leases WHERE target_key = ? AND owner = ?',
+            (target_key, owner)
+        )
+
+    def heartbeat(self, node_id, key_group=''):
+        self.__execute(
+            'INSERT OR REPLACE INTO nodes (node_id, heartbeat, key_group) '
+            'VALUES (?, ?, ?)',
+            (node_id, time.time(), key_group)
+        )
+
+    def remove_node(self, node_id):
+        self.__execute('DELETE FROM nodes WHERE node_id = ?', (node_id,))
+
+    def count_alive_nodes(self, ttl, key_group=''):
+        """ @ttl 내에 heartbeat 가 있는, 같은 @key_group 의 node 수를 반환 합니다. """
+        return self.__execute(
+            'SELECT COUNT(*) FROM nodes WHERE heartbeat >= ? AND key_group = ?',
+            (time.time() - ttl, key_group)
+        ).fetchone()[0]
+
+
+class LeaseKeeper(object):
+    """ 타겟 별 lease 를 주기적으로 (@ttl / 3) 갱신 및 획득 하는 thread 입니다.
+
+        - 같은 타겟 목록 (@target_keys) 을 관리 하는 살아있는 node 개수 기준으로
+          공평하게 나눈 개수 (fair share) 까지만 새로운 타겟을 획득 하여, 여러 데몬이
+          타겟을 나눠서 관리 합니다. (multi worker 모드 에서는 worker 별 할당된
+          타겟 목록이 다르므로, 같은 타겟을 할당 받은 다른 데몬의 worker 끼리만 나눔)
+        - 죽은 node 의 lease 는 만료 (최대 @ttl) 후 다른 node 가 획득 합니다.
+        - 획득한 타겟은 @on_acquire(target_key) 로 알립니다.
+        - fair share 를 넘는 lease 는 체크 중이 아닌 타겟만 반납 합니다.
+          (@get_target_lock(target_key) 이 반환한 lock 을 잡은 상태로 반납)
+    """
+
+    def __init__(self, store, target_keys, ttl=DEFAULT_LEASE_TTL,
+                 node_id=None, on_acquire=None, get_target_lock=None):
+
+        self.store = store
+        self.target_keys = list(target_keys)
+        self.key_group = get_key_group(self.target_keys)
+        self.ttl = ttl
+        self.node_id = node_id or get_default_node_id()
+        self.on_acquire = on_acquire
+        self.get_target_lock = get_target_lock
+
+        # 만료 직전의 lease 로 체크 하지 않도록, 로컬 만료 시간은 여유를 둠
+        self.__margin = ttl / 3.0
+        self.__held = {}  # target key: local (monotonic) expiry
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def is_held(self, target_key):
+        """ 현재 node 가 타겟 (@target_key) 의 유효한 lease 를 가지고 있는지 확인 합니다. """
+        with self.__lock:
+            expiry = self.__held.get(target_key)
+
+        return expiry is not None and expiry > time.monotonic()
+
+    def set_target_keys(self, target_keys):
+        """ 관리할 타겟 목록을 변경 하고, 제외된 타겟의 lease 는 반납 합니다. """
+        target_keys = list(target_keys)
+
+        with self.__lock:
+            self.target_keys = target_keys
+            self.key_group = get_key_group(target_keys)
+            removed_keys = [
+                key for key in self.__held if key not in target_keys
+            ]
+            for key in removed_keys:
+                del self.__held[key]
+
+        for key in removed_keys:
+            self.store.release(key, self.node_id)
+
+    def __set_held(self, target_key, is_held, start_time):
+        with self.__lock:
+            if is_held:
+                self.__held[target_key] = start_time + self.ttl - self.__margin
+
+            else:
+                self.__held.pop(target_key, None)
+
+    def renew(self):
+        """ 가지고 있는 lease 를 갱신 하고, fair share 까지 새로운 lease 를 획득 합니다. """
+        target_keys = self.target_keys
+        key_group = self.key_group
+        self.store.heartbeat(self.node_id, key_group)
+
+        n_nodes = max(1, self.store.count_alive_nodes(self.ttl, key_group))
+        fair_share = int(math.ceil(len(target_keys) / float(n_nodes)))
+
+        held_keys = [key for key in target_keys if self.is_held(key)]
+        free_keys = [key for key in target_keys if key not in held_keys]
+
+        n_owned = 0
+        for key in held_keys:
+            start_time = time.monotonic()
+            is_held = self.store.acquire(key, self.node_id, self.ttl)
+            self.__set_held(key, is_held, start_time)
+
+            if is_held:
+                n_owned += 1
+
+            else:
+                LOGGER.warning('Lost lease ({})'.format(key))
+
+        for key in free_keys:
+            if n_owned >= fair_share:
+                break
+
+            start_time = time.monotonic()
+            if not self.store.acquire(key, self.node_id, self.ttl):
+                continue
+
+            self.__set_held(key, True, start_time)
+            n_owned += 1
+
+            LOGGER.info('Acquire lease ({})'.format(key))
+            if self.on_acquire:
+                self.on_acquire(key)
+
+        # fair share 를 넘는 lease 는 반납 하여, 새로운 node 가 가져갈 수 있도록 함
+        # (체크 중인 타겟은 반납 즉시 다른 node 가 체크 하여 중복 전송 될 수 있으므로,
+        #  다음 renew 주기 로 미룸)
+        owned_keys = [key for key in target_keys if self.is_held(key)]
+        n_release = len(owned_keys) - fair_share
+        for key in reversed(owned_keys):
+            if n_release <= 0:
+                break
+
+            if self.__release_idle(key):
+                n_release -= 1
+
+    def __release_idle(self, target_key):
+        """ 체크 중이 아닌 타겟 (@target_key) 의 lease 를 반납 합니다.
+            (체크 중인 경우 False)
+        """
+        lock = self.get_target_lock(target_key) if self.get_target_lock else None
+        if lock is not None and not lock.acquire(blocking=False):
+            return False
+
+        try:
+            # lock 을 잡은 동안 로컬 lease 를 먼저 해제 하여, 이 후 체크 되지 않도록 함
+            self.__set_held(target_key, False, None)
+            self.store.release(target_key, self.node_id)
+
+        finally:
+            if lock is not None:
+                lock.release()
+
+        LOGGER.info('Release lease ({})'.format(target_key))
+        return True
+
+    def __run(self):
+        while not self.__stop.is_set():
+            try:
+                self.renew()
+
+            except Exception as e:
+                LOGGER.error('Renew lease failed [msg: {}]'.format(e))
+
+            self.__stop.wait(self.ttl / 3.0)
+
+    def start(self):
+        self.__thread = threading.Thread(
+            target=self.__run, name='lease-keeper', daemon=True
+        )
+        self.__thread.start()
+
+    def stop(self):
+        self.__stop.set()
+
+        with self.__lock:
+            held_keys = list(self.__held)
+            self.__held = {}
+
+        for key in held_keys:
+            self.store.release(key, self.node_id)
+
+        self.store.remove_node(self.node_id)
@@ -1,27 +1,129 @@
 import os
 import sys
 import time
+import signal
+import hashlib
 import argparse
+import importlib
+import threading
+
+from urllib.parse import urlsplit
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 
 from common.utils import print_execution_func
 from common.logger import get_logger
 from common.error import InitError, ConfParseError, SpawnError
+from common.metrics import REGISTRY, MetricsServer, measure_stage
 
-from resource.config import CONFIG_LIST
-from notion_slack_bot import CONF_DIR, CollectionPageNotiBot
+from resource.config import (
+    MANAGER_CONFIG, HTTP_CONFIG, SLACK_QUEUE_CONFIG, DEDUP_CONFIG, PUSH_CONFIG,
+    NOTION_RATE_CONFIG
+)
+from scheduler import TargetSchedule, TargetScheduler
+from supervisor import Supervisor
+from lease import SQLiteLeaseStore, LeaseKeeper
 
 LOGGER = get_logger('notion.manager')
 
+TARGET_CYCLE = REGISTRY.histogram(
+    'slackbot_target_cycle_seconds', 'Check time of each target', ('target',)
+)
+TARGET_ITEMS = REGISTRY.counter(
+    'slackbot_target_items_total', 'Notified items of each target', ('target',)
+)
+
 DAEMON_PID_PATH = '/var/run/slackbot_daemon.pid'
+DAEMON_WORKERS_SUFFIX = '.workers'
+
+ONCE_FLUSH_TIMEOUT = 30
+CONFIG_CHECK_INTERVAL = 5
+CONFIG_MODULE = 'resource.config'
+
+SCHEDULE_CONF_KEYS = ['min_interval', 'max_interval', 'backoff', 'jitter']
+
+
+def load_config_list(reload=False):
+    """ 'resource/config.py' 의 CONFIG_LIST 를 반환 합니다.
+        (@reload 인 경우 파일을 다시 읽어서 반환)
+    """
+    config_module = importlib.import_module(CONFIG_MODULE)
+    if reload:
+        config_module = importlib.reload(config_module)
+
+    return config_module.CONFIG_LIST
+
+
+def get_config_mtime():
+    return os.stat(importlib.import_module(CONFIG_MODULE).__file__).st_mtime
+
+
+def shift_listen_url(listen_url, offset):
+    """ listen 주소 (@listen_url, 'http://host:port') 의 port 에 @offset 을 더한
+        주소를 반환 합니다. (빈 값인 경우 그대로 반환)
+    """
+    if not listen_url or not offset:
+        return listen_url
+
+    url_info = urlsplit(listen_url)
+    return '{}://{}:{}'.format(
+        url_info.scheme, url_info.hostname, url_info.port + offset
+    )
+
+
+def get_target_key(notion_conf):
+    """ 타겟 (@notion_conf 의 page_url, trigger) 을 구분하는 key 를 반환 합니다. """
+    target_key = '{}|{}'.format(
+        notion_conf['page_url'], notion_conf['trigger']
+    )
+
+    return hashlib.sha1(target_key.encode('utf-8')).hexdigest()[:16]
 
 
 class Manager(object):
     """ 패키지의 'resource/notion_conf' 디렉토리에 위치한 각각의 conf.json 값을
         파싱 및 @nobjs 리스트에 저장하여 관리 합니다.
+
+        - slack 전송 (requests) 및 notion 모듈 (notion-py) 은 import 비용이 크므로,
+          데몬 제어 명령 (--stop 등) 이 빠르게 실행 되도록 init 시점에 import 합니다.
+        - @once 인 경우 한번의 체크 (run_once) 만 수행 하므로, metrics server,
+          push receiver 및 lease 갱신 thread 를 시작하지 않습니다.
+        - reload() 시 CONFIG_LIST 를 다시 읽어, 추가/삭제/변경된 타겟만 반영 합니다.
+          (@config_list 가 주어진 경우 에는 reload 하지 않음)
     """
 
-    def __init__(self):
-        self.__nobjs = []  # notion object list
+    def __init__(self, target_keys=None, worker_id=None, config_list=None,
+                 once=False):
+        self.__use_config_module = config_list is None
+        self.__config_list = (
+            load_config_list() if config_list is None else config_list
+        )
+        self.__config_mtime = (
+            get_config_mtime() if self.__use_config_module else None
+        )
+        self.__reload_retry = False
+        self.__nobjs = {}  # target key: notion object
+        self.__target_keys = target_keys  # None 인 경우 모든 타겟을 관리
+        self.__worker_id = worker_id
+        self.__once = once
+
+        self.__scheduler = TargetScheduler()
+        self.__executor = None
+        self.__max_workers = MANAGER_CONFIG.get('max_workers', 8)
+        self.__cycle_timeout = MANAGER_CONFIG.get('cycle_timeout', 60)
+        self.__check_stats = {'done': 0, 'failed': 0}
+        self.__check_stats_lock = threading.Lock()
+        self.__state_dir = MANAGER_CONFIG.get('state_dir')
+        self.__handle_ttl = MANAGER_CONFIG.get('handle_ttl', 600)
+
+        self.__receiver = None
+        self.__push_names = {}  # push name: target key
+
+        self.__lease_conf = MANAGER_CONFIG.get('lease') or {}
+        self.__lease_keeper = None
+
+        self.__metrics_conf = MANAGER_CONFIG.get('metrics') or {}
+        self.__metrics_server = None
 
     def __validation_conf(self, conf_dict):
         """ CONFIG_LIST에 정의된 각각의 설정값에 대한 유효성 검증을 수행 합니다.
@@ -41,9 +143,8 @@ class Manager(object):
                 raise ConfParseError(mandatory_errmsg_fmt.format(path))
 
         def validate_notion_conf(notion_conf):
-            LOGGER.error(notion_conf)
             if not notion_conf:
-                raise ConfParseError(mandatory_errmsg_fmt('notion'))
+                raise ConfParseError(mandatory_errmsg_fmt.format('notion'))
 
             required_conf_value = ['token', 'page_type', 'page_url', 'trigger']
             for _value in required_conf_value:
@@ -55,7 +156,7 @@ class Manager(object):
 
         def validate_slack_conf(slack_conf):
             if not slack_conf:
-                raise ConfParseError(mandatory_errmsg_fmt('slack'))
+                raise ConfParseError(mandatory_errmsg_fmt.format('slack'))
 
             required_conf_value = ['send_type']
             for _value in required_conf_value:
@@ -71,12 +172,43 @@ class Manager(object):
                     path = 'slack/block_format'
                     raise ConfParseError(mandatory_errmsg_fmt.format(path))
 
+        def validate_schedule_conf(schedule_conf):
+            if not schedule_conf:
+                return
+
+            for _value in schedule_conf:
+                if _value in SCHEDULE_CONF_KEYS:
+                    continue
+
+                raise ConfParseError(
+                    'Invalid schedule element (schedule/{})'.format(_value)
+                )
+
+            # scheduler 와 같은 기본값 및 조건 으로 검증
+            try:
+                TargetSchedule(**schedule_conf)
+
+            except Exception as e:
+                raise ConfParseError(str(e))
+
         validate_webhook_conf(conf_dict.get('webhook'))
         validate_notion_conf(conf_dict.get('notion'))
         validate_slack_conf(conf_dict.get('slack'))
+        validate_schedule_conf(conf_dict.get('schedule'))
 
         LOGGER.info('- Config valid check OK')
 
+    def __get_state_path(self, prefix, target_key):
+        """ 타겟 (@target_key) 별로 구분되는 상태 저장 파일 경로를 반환 합니다.
+            ('state_dir' 설정이 없는 경우 None)
+        """
+        if not self.__state_dir:
+            return None
+
+        return os.path.join(
+            self.__state_dir, '{}_{}.json'.format(prefix, target_key)
+        )
+
     def __spawn_nmod(self, nobj):
         """ CONFIG_LIST에 정의된 값의 'page_type' 에 맞은 Notion Bot Module
             인스턴스를 생성 후, @nobj에 저장합니다. (이 후 @self.nobjs 리스트에 관리 )
@@ -90,8 +222,15 @@ class Manager(object):
 
         webhook_url = webhook_conf['incoming_url']
 
+        from notion_slack_bot import CollectionPageNotiBot
+
         if notion_page_type == 'collection':
-            mod = CollectionPageNotiBot(webhook_url, notion_token, notion_url)
+            mod = CollectionPageNotiBot(
+                webhook_url, notion_token, notion_url,
+                snapshot_path=self.__get_state_path('snapshot', nobj['key']),
+                handle_path=self.__get_state_path('handle', nobj['key']),
+                handle_ttl=self.__handle_ttl
+            )
 
         else:
             raise SpawnError(
@@ -109,20 +248,92 @@ class Manager(object):
         if slack_send_type == 'block':
             nobj['mod'].set_schema_table(slack_conf['block_format'])
 
+    def __parse_config_list(self, config_list, is_all=False):
+        """ @config_list 의 유효성 검증 후, {target key: conf_dict} 를 반환 합니다.
+            (multi worker 모드 에서는 @is_all 이 아닌 경우 할당 받은 타겟만 반환)
+        """
+        if not config_list or not isinstance(config_list, list):
+            raise ConfParseError('Missing config list')
+
+        conf_dicts = {}
+        for __conf_dict in config_list:
+            self.__validation_conf(__conf_dict)
+
+            key = get_target_key(__conf_dict['notion'])
+            if key in conf_dicts:
+                raise ConfParseError(
+                    'Duplicated target ({})'.format(
+                        __conf_dict['notion']['page_url']
+                    )
+                )
+
+            if (not is_all and self.__target_keys is not None
+                    and key not in self.__target_keys):
+                continue
+
+            conf_dicts[key] = __conf_dict
+
+        return conf_dicts
+
+    def __reload_config_list(self):
+        if self.__use_config_module:
+            self.__config_mtime = get_config_mtime()
+            self.__config_list = load_config_list(reload=True)
+
+        return self.__config_list
+
+    def load_target_keys(self, reload=False):
+        """ CONFIG_LIST 의 유효성 검증 후, 각 타겟의 key 리스트를 반환 합니다.
+            (multi worker 모드 에서 supervisor 가 타겟을 나누기 위해 사용)
+        """
+        try:
+            config_list = self.__config_list
+            if reload:
+                config_list = self.__reload_config_list()
+
+            target_keys = list(
+                self.__parse_config_list(config_list, is_all=True)
+            )
+
+        except ConfParseError as e:
+            raise InitError('Conf parse failed ({})'.format(e))
+
+        return target_keys
+
+    def __add_target(self, key, conf_dict):
+        nobj = {}
+        nobj['conf_dict'] = conf_dict
+        nobj['key'] = key
+        nobj['lock'] = threading.Lock()  # in-flight guard
+        nobj['rerun'] = False
+
+        self.__spawn_nmod(nobj)
+        self.__init_nmod(nobj)
+        self.__nobjs[key] = nobj
+
+        self.__scheduler.add(key, **self.__get_schedule_conf(nobj))
+
     def init(self):
         try:
-            if not CONFIG_LIST or not isinstance(CONFIG_LIST, list):
-                raise ConfParseError('Missing config list')
+            conf_dicts = self.__parse_config_list(self.__config_list)
 
-            for __conf_dict in CONFIG_LIST:
-                self.__validation_conf(__conf_dict)
+            from common.webhook_api import configure_transport, configure_dedup
+            from common.slack_queue import configure_outbound_queue
+            from request_governor import configure_governor
 
-                nobj = {}
-                nobj['conf_dict'] = __conf_dict
+            # 모든 bot 인스턴스가 공유하는 webhook 전송 계층 설정
+            configure_transport(**HTTP_CONFIG)
+            configure_dedup(**DEDUP_CONFIG)
+            configure_outbound_queue(**SLACK_QUEUE_CONFIG)
 
-                self.__spawn_nmod(nobj)
-                self.__init_nmod(nobj)
-                self.__nobjs.append(nobj)
+            # 모든 Notion client 가 공유하는 요청 속도 제한 설정
+            configure_governor(**NOTION_RATE_CONFIG)
+
+            for key, conf_dict in conf_dicts.items():
+                self.__add_target(key, conf_dict)
+
+            if self.__lease_conf.get('path'):
+                self.__start_lease_keeper()
 
         except ConfParseError as e:
             raise InitError('Conf parse failed ({})'.format(e))
@@ -133,11 +344,302 @@ class Manager(object):
         except Exception as e:
             raise InitError('Init failed: {}'.format(e))
 
+        # fork 이후 생성되어야 하므로, 데몬 프로세스의 init 시점에 생성
+        self.__executor = ThreadPoolExecutor(
+            max_workers=self.__max_workers,
+            thread_name_prefix='notion-check'
+        )
+
+        from common.slack_queue import recover_outbound_queues
+
+        # 이전 실행 에서 전송 하지 못한 메세지 재전송
+        recover_outbound_queues()
+
+        if self.__once:
+            LOGGER.info('- Init OK (once)')
+            return
+
+        self.__start_metrics_server()
+
+        if PUSH_CONFIG.get('enable'):
+            if self.__target_keys is None:
+                self.__start_receiver()
+
+            else:
+                LOGGER.warning('Push receiver is not supported in worker mode')
+
         LOGGER.info('- Init OK')
         LOGGER.info('- Check target count: {}'.format(len(self.__nobjs)))
 
-    def check(self):
-        for nobj in self.__nobjs:
+    def __get_schedule_conf(self, nobj):
+        """ 타겟의 'schedule' 설정을 반환 합니다.
+            push 모드 에서는 'max_interval' 이 없는 경우 polling 을 느린 fallback
+            (PUSH_CONFIG 'fallback_interval') 으로만 사용 합니다.
+        """
+        schedule_conf = dict(nobj['conf_dict'].get('schedule', {}))
+
+        if PUSH_CONFIG.get('enable') and 'max_interval' not in schedule_conf:
+            schedule_conf['max_interval'] = max(
+                PUSH_CONFIG.get('fallback_interval', 300),
+                schedule_conf.get('min_interval', 0)
+            )
+
+        return schedule_conf
+
+    def __start_metrics_server(self):
+        """ stage 별 metric 을 제공하는 Prometheus text endpoint 및 주기적인
+            요약 로그를 시작 합니다. (multi worker 모드 에서는 worker id 만큼
+            port 를 더해서 사용)
+        """
+        listen_url = self.__metrics_conf.get('listen_url')
+        if self.__worker_id is not None:
+            listen_url = shift_listen_url(listen_url, 1 + self.__worker_id)
+
+        summary_interval = self.__metrics_conf.get('summary_interval')
+        if not listen_url and not summary_interval:
+            return
+
+        self.__metrics_server = MetricsServer(
+            listen_url, summary_interval=summary_interval
+        )
+        self.__metrics_server.start()
+
+    def __start_lease_keeper(self):
+        """ 여러 데몬이 공유하는 lease 저장소 에서 타겟 별 lease 를 획득 하여,
+            lease 를 가진 타겟만 체크 하도록 합니다.
+            (multi worker 모드 에서는 worker 마다 하나의 node 로 동작 하며, 할당된
+             타겟 을 같은 타겟을 할당 받은 다른 데몬의 worker 와 나눠서 관리)
+        """
+        node_id = self.__lease_conf.get('node_id')
+        if node_id and self.__worker_id is not None:
+            node_id = '{}/{}'.format(node_id, self.__worker_id)
+
+        self.__lease_keeper = LeaseKeeper(
+            SQLiteLeaseStore(self.__lease_conf['path']),
+            list(self.__nobjs),
+            ttl=self.__lease_conf.get('ttl', 30),
+            node_id=node_id,
+            on_acquire=self.__scheduler.wake,
+            get_target_lock=self.__get_target_lock
+        )
+        self.__lease_keeper.renew()
+        if not self.__once:
+            self.__lease_keeper.start()
+
+        LOGGER.info(
+            '- Start lease keeper (node: {})'.format(
+                self.__lease_keeper.node_id
+            )
+        )
+
+    def __get_target_lock(self, key):
+        nobj = self.__nobjs.get(key)
+        return nobj['lock'] if nobj is not None else None
+
+    def __is_owned(self, key):
+        if self.__lease_keeper is None:
+            return True
+
+        return self.__lease_keeper.is_held(key)
+
+    def __start_receiver(self):
+        """ 외부 webhook callback 을 받아, 해당 타겟을 바로 체크 하도록 하는
+            receiver 를 시작 합니다. ('POST /<target key 또는 outgoing_name>')
+        """
+        self.__update_push_names()
+
+        from common.webhook_api import OutgoingWebHooks
+
+        self.__receiver = OutgoingWebHooks(
+            PUSH_CONFIG['listen_url'],
+            PUSH_CONFIG['secret'],
+            self.wake
+        )
+        self.__receiver.start()
+
+    def __update_push_names(self):
+        push_names = {}
+        for key, nobj in self.__nobjs.items():
+            push_names[key] = key
+
+            push_name = nobj['conf_dict']['webhook'].get('outgoing_name')
+            if push_name:
+                push_names[push_name] = key
+
+        self.__push_names = push_names
+
+    def is_config_changed(self):
+        """ 'config_watch' 설정 시, config 파일이 바뀌었거나 이전 reload 에서
+            반영하지 못한 타겟이 있는지 확인 합니다.
+        """
+        if self.__reload_retry:
+            return True
+
+        if not MANAGER_CONFIG.get('config_watch') or not self.__use_config_module:
+            return False
+
+        try:
+            return get_config_mtime() != self.__config_mtime
+
+        except OSError:
+            return False
+
+    def __update_target(self, nobj, conf_dict):
+        """ 실행 중인 타겟 (@nobj) 에 변경된 설정 (@conf_dict) 을 반영 합니다.
+            (체크 중인 타겟은 반영 하지 않고 False 를 반환 하며, 다음 reload 에서 반영)
+
+            - notion 설정 (token, page_type) 이 바뀐 경우 에만 bot 모듈을 다시 만들고,
+              그 외에는 기존 모듈 (notion client, 페이지 캐시 등) 을 그대로 사용 합니다.
+        """
+        if not nobj['lock'].acquire(blocking=False):
+            return False
+
+        try:
+            old_conf_dict = nobj['conf_dict']
+            nobj['conf_dict'] = conf_dict
+
+            try:
+                if old_conf_dict['notion'] != conf_dict['notion']:
+                    old_mod = nobj['mod']
+                    self.__spawn_nmod(nobj)
+                    old_mod.close()
+
+                else:
+                    webhook_url = conf_dict['webhook']['incoming_url']
+                    if old_conf_dict['webhook']['incoming_url'] != webhook_url:
+                        nobj['mod'].set_webhook_url(webhook_url)
+
+                self.__init_nmod(nobj)
+
+            except Exception:
+                nobj['conf_dict'] = old_conf_dict
+                raise
+
+            if old_conf_dict.get('schedule') != conf_dict.get('schedule'):
+                self.__scheduler.add(
+                    nobj['key'], **self.__get_schedule_conf(nobj)
+                )
+
+        finally:
+            nobj['lock'].release()
+            self.__close_retired(nobj)
+
+        return True
+
+    def __close_retired(self, nobj):
+        """ 삭제된 타겟 (@nobj) 의 bot 모듈을 한번만 정리 합니다.
+
+            - lock 을 가진 쪽은 lock 해제 후 항상 호출 하므로, 다른 쪽이 lock 을
+              가진 동안 삭제 된 경우 에도 해제한 쪽에서 정리 됩니다.
+        """
+        if not nobj.get('retired') or not nobj['lock'].acquire(blocking=False):
+            return
+
+        try:
+            if not nobj.get('closed'):
+                nobj['closed'] = True
+                nobj['mod'].close()
+
+        finally:
+            nobj['lock'].release()
+
+    def __retire_nobj(self, nobj):
+        """ 삭제된 타겟의 bot 모듈을 정리 합니다.
+            (체크 중인 경우 lock 을 가진 쪽이 lock 해제 후 정리)
+        """
+        nobj['retired'] = True
+        self.__close_retired(nobj)
+
+    def reload(self):
+        """ CONFIG_LIST 를 다시 읽고, 실행 중인 타겟 (@self.__nobjs) 과 비교 하여
+            추가된 타겟만 생성, 삭제된 타겟만 제외, 변경된 타겟은 그대로 갱신 합니다.
+            (유효하지 않은 설정인 경우 기존 타겟을 그대로 유지)
+
+            - CONFIG_LIST 외의 설정 (MANAGER_CONFIG 등) 은 재시작 시 적용 됩니다.
+        """
+        self.__reload_retry = False
+
+        try:
+            conf_dicts = self.__parse_config_list(self.__reload_config_list())
+
+        except Exception as e:
+            LOGGER.error('Reload config failed ({})'.format(e))
+            return None
+
+        added = [key for key in conf_dicts if key not in self.__nobjs]
+        removed = [key for key in self.__nobjs if key not in conf_dicts]
+        changed = [
+            key for key in conf_dicts
+            if key in self.__nobjs
+            and self.__nobjs[key]['conf_dict'] != conf_dicts[key]
+        ]
+
+        for key in removed:
+            self.__scheduler.remove(key)
+            self.__retire_nobj(self.__nobjs.pop(key))
+
+        failed = 0
+        for key in added:
+            try:
+                self.__add_target(key, conf_dicts[key])
+
+            except Exception as e:
+                failed += 1
+                LOGGER.error('Add target failed ({}) [msg: {}]'.format(key, e))
+
+        for key in changed:
+            try:
+                if not self.__update_target(self.__nobjs[key], conf_dicts[key]):
+                    self.__reload_retry = True
+                    LOGGER.warning('Update busy target later ({})'.format(key))
+
+            except Exception as e:
+                failed += 1
+                LOGGER.error(
+                    'Update target failed ({}) [msg: {}]'.format(key, e)
+                )
+
+        if self.__lease_keeper is not None:
+            self.__lease_keeper.set_target_keys(list(self.__nobjs))
+
+        self.__update_push_names()
+
+        stats = {
+            'added': len(added),
+            'removed': len(removed),
+            'changed': len(changed),
+            'failed': failed,
+        }
+
+        LOGGER.info(
+            'Reload config [added: {added}, removed: {removed}, '
+            'changed: {changed}, failed: {failed}]'.format(**stats)
+        )
+
+        return stats
+
+    def wake(self, name, body=None):
+        """ push 이벤트 (@name: target key 또는 outgoing_name) 에 해당하는 타겟을
+            바로 체크 하도록 합니다. 해당하는 타겟이 없으면 False 를 반환 합니다.
+        """
+        key = self.__push_names.get(name)
+        if key is None:
+            return False
+
+        LOGGER.info('Wake target by push event ({})'.format(name))
+
+        return self.__scheduler.wake(key)
+
+    def __check_nobj(self, nobj):
+        """ 하나의 타겟 (@nobj) 에 대해 페이지 조회, 트리거 확인, 메세지 생성 및
+            전송을 수행 합니다. (worker thread 에서 동작)
+
+            - 호출 전 @nobj['lock'] 을 획득한 상태여야 하며, 종료 시 해제 합니다.
+            - 종료 시 노티한 항목 유무에 따라 다음 체크 시간을 등록 합니다.
+        """
+        n_items = 0
+        start_time = time.monotonic()
+        try:
             notion_conf = nobj['conf_dict']['notion']
             slack_conf = nobj['conf_dict']['slack']
 
@@ -147,21 +649,203 @@ class Manager(object):
             mod = nobj.get('mod')
             mod.set_block_item()
 
-            for item in mod.get_target_block_item(notion_trigger):
-                if slack_send_type == 'text':
-                    msg = mod.make_text_msg(item)
-                    mod.send_msg_to_slack(text=msg)
+            # trigger 해제 및 전송 직전 lease 를 다시 확인 (다른 node 와 중복 전송 방지)
+            if not self.__is_owned(nobj['key']):
+                return n_items
+
+            # 메세지를 전송 queue 에 추가 (delivery log 에 기록) 한 Row 의 trigger 만
+            # 해제 하여, 메세지 생성 또는 추가에 실패한 Row 는 다음 주기에 다시 노티
+            queued_items = []
+            failures = []
+            try:
+                for item in mod.get_target_block_item(notion_trigger):
+                    try:
+                        self.__send_item(mod, slack_send_type, item)
+
+                    except Exception as e:
+                        failures.append(e)
+                        continue
+
+                    queued_items.append(item)
+
+            finally:
+                if queued_items:
+                    n_items = len(queued_items)
+                    mod.reset_target_block_item(notion_trigger, queued_items)
+
+            if failures:
+                raise Exception(
+                    'Send {} items failed (first error: {})'.format(
+                        len(failures), failures[0]
+                    )
+                )
+
+        finally:
+            TARGET_CYCLE.observe(
+                time.monotonic() - start_time, target=nobj['key']
+            )
+            TARGET_ITEMS.inc(n_items, target=nobj['key'])
+
+            is_active = n_items > 0 or nobj['rerun']
+            nobj['rerun'] = False
+
+            nobj['lock'].release()
+            self.__close_retired(nobj)
+
+            self.__scheduler.reschedule(nobj['key'], is_active)
+
+        return n_items
+
+    def __send_item(self, mod, slack_send_type, item):
+        """ 항목 (@item) 의 메세지를 생성 하여 전송 queue 에 추가 합니다. """
+        if slack_send_type == 'text':
+            with measure_stage('render'):
+                msg = mod.make_text_msg(item)
+
+            mod.send_msg_to_slack(text=msg)
+
+        elif slack_send_type == 'block':
+            with measure_stage('render'):
+                msg = mod.make_block_msg(item)
+
+            mod.send_msg_to_slack(blocks=msg)
+
+    def __on_check_done(self, nobj, submit_time, future):
+        """ 타겟 (@nobj) 체크 완료 시 (worker thread 에서) 결과 통계 및 오류를
+            기록 합니다.
+        """
+        elapsed = time.monotonic() - submit_time
+        e = None if future.cancelled() else future.exception()
+
+        with self.__check_stats_lock:
+            self.__check_stats['done'] += 1
+            if e is not None:
+                self.__check_stats['failed'] += 1
+
+        notion_url = nobj['conf_dict']['notion']['page_url']
+        if e is not None:
+            LOGGER.error(
+                'Check target failed ({}) [msg: {}]'.format(notion_url, e)
+            )
+
+        if elapsed > self.__cycle_timeout:
+            LOGGER.warning('Slow target check ({}) [elapsed: {:.3f}s]'.format(
+                notion_url, elapsed
+            ))
+
+    def get_check_stats(self):
+        """ 시작 이후 완료된 타겟 체크 수 및 실패 수를 반환 합니다. """
+        with self.__check_stats_lock:
+            return dict(self.__check_stats)
+
+    def check(self):
+        """ 체크 시간이 된 (due) 타겟을 worker pool 에 제출하여 동시에 체크 합니다.
+
+            - 체크가 아직 진행 중인 타겟은 이번 주기에서 제외 (skip) 하고,
+              진행 중인 체크가 끝나면 바로 다시 체크 되도록 합니다.
+            - 제출한 체크의 완료를 기다리지 않으므로, 느린 타겟이 있어도 다른
+              타겟 및 push 요청은 바로 체크 됩니다. (결과는 __on_check_done 에서 기록)
+        """
+        submitted = 0
+        skipped = 0
+        for key in self.__scheduler.pop_due():
+            nobj = self.__nobjs.get(key)
+            if nobj is None:
+                continue
+
+            # 다른 node 가 lease 를 가진 타겟 (lease 획득 시 바로 체크 됨)
+            if not self.__is_owned(key):
+                self.__scheduler.reschedule(key, False)
+                continue
+
+            if not nobj['lock'].acquire(blocking=False):
+                nobj['rerun'] = True
+                skipped += 1
+                continue
+
+            try:
+                future = self.__executor.submit(self.__check_nobj, nobj)
+
+            except Exception:
+                nobj['lock'].release()
+                self.__close_retired(nobj)
+                self.__scheduler.reschedule(key, False)
+                raise
+
+            future.add_done_callback(
+                partial(self.__on_check_done, nobj, time.monotonic())
+            )
+            submitted += 1
+
+        if not submitted and not skipped:
+            return None
+
+        stats = {'submitted': submitted, 'skipped': skipped}
+
+        LOGGER.info(
+            'Check targets submitted [submitted: {submitted}, '
+            'skipped: {skipped}]'.format(**stats)
+        )
+
+        return stats
 
-                elif slack_send_type == 'block':
-                    msg = mod.make_block_msg(item)
-                    mod.send_msg_to_slack(blocks=msg)
+    def wait_next(self, max_wait=None):
+        """ 다음 타겟의 체크 시간 까지 (최대 @max_wait 초) 대기 합니다. """
+        self.__scheduler.wait(max_wait)
+
+    def run_once(self, flush_timeout=ONCE_FLUSH_TIMEOUT):
+        """ 모든 타겟을 한번 체크 하고, 전송 대기 중인 slack 메세지를 최대
+            @flush_timeout 초 동안 전송 후 종료 합니다. (cron, container job 용)
+
+            - 데몬과 같은 'state_dir' 의 상태 파일 (Row snapshot, delivery log) 을
+              사용 하므로, 이전 실행 에서 본 Row 는 다시 조회 하지 않고
+              전송 하지 못한 메세지는 이번 실행 에서 재전송 합니다.
+        """
+        from common.slack_queue import close_outbound_queues
+
+        try:
+            stats = self.check()
+
+        finally:
+            # 제출한 체크가 모두 끝날 때 까지 대기
+            self.__executor.shutdown(wait=True)
+            close_outbound_queues(flush_timeout)
+
+            if self.__lease_keeper is not None:
+                self.__lease_keeper.stop()
+
+        if stats is not None:
+            stats.update(self.get_check_stats())
+
+        return stats
 
 
 class Daemon(object):
-    def __init__(self):
+    def __init__(self, n_workers=1, pid_path=DAEMON_PID_PATH):
+        self.n_workers = n_workers
+        self.pid_path = pid_path
+        self.workers_path = pid_path + DAEMON_WORKERS_SUFFIX
         self.manager = Manager()
 
+        self.__reload_requested = False
+
+    def read_n_workers(self):
+        with open(self.workers_path, 'r') as f:
+            return int(f.read())
+
+    def write_n_workers(self, n_workers):
+        with open(self.workers_path, 'w') as f:
+            f.write(str(n_workers))
+
+    def __request_reload(self, *args):
+        self.__reload_requested = True
+
     def __run_manager(self):
+        """ 체크 주기 마다 타겟을 체크 하고, SIGHUP 또는 config 파일 변경 시
+            (최대 @CONFIG_CHECK_INTERVAL 초 이내) 설정을 다시 읽습니다.
+        """
+        signal.signal(signal.SIGHUP, self.__request_reload)
+
         while True:
             try:
                 self.manager.check()
@@ -171,11 +855,26 @@ class Daemon(object):
                     'Manager check failed ({})'.format(e)
                 )
 
-            time.sleep(5)
+            if self.__reload_requested or self.manager.is_config_changed():
+                self.__reload_requested = False
+                self.manager.reload()
+
+            self.manager.wait_next(CONFIG_CHECK_INTERVAL)
+
+    def __run_worker(self, worker_id, target_keys):
+        """ multi worker 모드 에서 worker 프로세스가 할당 받은 타겟 (@target_keys)
+            만 관리하는 Manager 를 실행 합니다.
+        """
+        self.manager = Manager(target_keys=target_keys, worker_id=worker_id)
+        self.manager.init()
+
+        LOGGER.info('Start worker {} (pid:{})'.format(worker_id, os.getpid()))
+
+        self.__run_manager()
 
     def run(self):
         # running check
-        if os.path.isfile(DAEMON_PID_PATH):
+        if os.path.isfile(self.pid_path):
             print('Already running daemon')
             return
 
@@ -198,32 +897,113 @@ class Daemon(object):
                 os.dup2(so.fileno(), sys.stdout.fileno())
                 os.dup2(se.fileno(), sys.stderr.fileno())
 
-                self.manager.init()
+                # worker 프로세스를 함께 종료할 수 있도록 새로운 process group 생성
+                os.setsid()
+
+                supervisor = None
+                if self.n_workers > 1:
+                    supervisor = Supervisor(
+                        self.manager.load_target_keys(),
+                        self.n_workers,
+                        self.__run_worker,
+                        get_n_workers=self.read_n_workers,
+                        get_target_keys=lambda: self.manager.load_target_keys(
+                            reload=True
+                        ),
+                        is_config_changed=self.manager.is_config_changed
+                    )
+                    self.write_n_workers(self.n_workers)
+
+                else:
+                    self.manager.init()
 
                 __daemon_pid = str(os.getpid())
-                with open(DAEMON_PID_PATH, 'w') as f:
+                with open(self.pid_path, 'w') as f:
                     f.write(__daemon_pid)
 
-                LOGGER.info('Start daemon (pid:{})'.format(__daemon_pid))
+                LOGGER.info('Start daemon (pid:{}, workers: {})'.format(
+                    __daemon_pid, self.n_workers
+                ))
 
         except Exception as e:
             raise Exception('Start daemon failed ({})'.format(e))
 
-        self.__run_manager()
+        if supervisor is not None:
+            supervisor.run()
+
+        else:
+            self.__run_manager()
+
+    def resize(self, n_workers):
+        """ 실행 중인 multi worker 모드 데몬의 worker 개수를 변경 합니다. """
+        if not os.path.isfile(self.pid_path):
+            print('Not running daemon')
+            return
+
+        if not os.path.isfile(self.workers_path):
+            raise Exception('Daemon is not running in worker mode')
+
+        try:
+            with open(self.pid_path, 'r') as f:
+                __daemon_pid = int(f.read())
+
+            self.write_n_workers(n_workers)
+            os.kill(__daemon_pid, signal.SIGUSR1)
+
+        except Exception as e:
+            raise Exception('Resize daemon failed ({})'.format(e))
+
+        LOGGER.info('Resize daemon workers: {}'.format(n_workers))
+
+    def reload(self):
+        """ 실행 중인 데몬이 config (CONFIG_LIST) 를 다시 읽도록 합니다. """
+        if not os.path.isfile(self.pid_path):
+            print('Not running daemon')
+            return
+
+        try:
+            with open(self.pid_path, 'r') as f:
+                __daemon_pid = int(f.read())
+
+            os.kill(__daemon_pid, signal.SIGHUP)
+
+        except Exception as e:
+            raise Exception('Reload daemon failed ({})'.format(e))
+
+        LOGGER.info('Reload daemon config')
+
+    def run_once(self):
+        """ 데몬 없이 한번의 체크 만 수행 합니다. """
+        # 실행 중인 데몬과 같은 상태 파일 및 타겟을 동시에 사용하지 않도록 함
+        if os.path.isfile(self.pid_path):
+            print('Already running daemon')
+            return None
+
+        self.manager = Manager(once=True)
+        self.manager.init()
+
+        stats = self.manager.run_once()
+        LOGGER.info('Run once done ({})'.format(stats))
+
+        return stats
 
     def stop(self):
         # running check
-        if not os.path.isfile(DAEMON_PID_PATH):
+        if not os.path.isfile(self.pid_path):
             print('Not running daemon')
             return
 
         # stop daemon
         try:
-            with open(DAEMON_PID_PATH, 'r') as f:
-                __daemon_pid = f.read()
+            with open(self.pid_path, 'r') as f:
+                __daemon_pid = int(f.read())
 
-            os.remove(DAEMON_PID_PATH)
-            os.system('kill -9 {}'.format(__daemon_pid))
+            os.remove(self.pid_path)
+            if os.path.isfile(self.workers_path):
+                os.remove(self.workers_path)
+
+            # 데몬 및 worker 프로세스 (같은 process group) 를 함께 종료
+            os.killpg(__daemon_pid, signal.SIGKILL)
 
         except Exception as e:
             raise Exception('Stop daemon failed ({})'.format(e))
@@ -235,6 +1015,11 @@ def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('--start', action='store_true')
     parser.add_argument('--stop', action='store_true')
+    parser.add_argument('--once', action='store_true')
+    parser.add_argument('--reload', action='store_true')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--pid-file', default=DAEMON_PID_PATH)
+    parser.add_argument('--port-offset', type=int, default=0)
 
     return parser.parse_args()
 
@@ -242,8 +1027,19 @@ def parse_args():
 def main():
     args = parse_args()
 
+    # 같은 host 에서 여러 데몬 (--pid-file) 을 실행 하는 경우 listen port 가
+    # 겹치지 않도록 데몬 별로 다른 offset 을 사용
+    if args.port_offset:
+        metrics_conf = MANAGER_CONFIG.setdefault('metrics', {})
+        metrics_conf['listen_url'] = shift_listen_url(
+            metrics_conf.get('listen_url'), args.port_offset
+        )
+        PUSH_CONFIG['listen_url'] = shift_listen_url(
+            PUSH_CONFIG.get('listen_url'), args.port_offset
+        )
+
     try:
-        daemon = Daemon()
+        daemon = Daemon(n_workers=args.workers or 1, pid_path=args.pid_file)
 
         if args.start:
             daemon.run()
@@ -251,6 +1047,17 @@ def main():
         elif args.stop:
             daemon.stop()
 
+        elif args.reload:
+            daemon.reload()
+
+        elif args.once:
+            stats = daemon.run_once()
+            if stats and stats['failed']:
+                sys.exit(1)
+
+        elif args.workers:
+            daemon.resize(args.workers)
+
         else:
             raise Exception('Invalid arguments')
 
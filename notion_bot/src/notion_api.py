@@ -1,30 +1,249 @@
-from typing import Collection
+import time
+import threading
+
+from requests.exceptions import HTTPError
 from notion.client import NotionClient
-from notion.block import *
-from notion.collection import *
-from notion.user import *
+from notion.block import (
+    TextBlock, PageBlock, TodoBlock, BulletedListBlock, NumberedListBlock,
+    ToggleBlock, QuoteBlock, DividerBlock, CalloutBlock, ImageBlock,
+    BookmarkBlock, VideoBlock, AudioBlock, CodeBlock, FileBlock
+)
+# NotionDate, User 는 notion_slack_bot 에서 값 변환 시 사용
+from notion.collection import NotionDate
+from notion.user import User
+
+from request_governor import get_governor
+
+WRITE_CHUNK_SIZE = 50
+DEFAULT_HANDLE_TTL = 600
+
+_END = object()
+
+
+class CollectionRowView(object):
+    """ 한 주기 동안 사용할 Row 항목의 칼럼 값 (@values: 칼럼 이름: 값) 을
+        미리 읽어 둔 view 입니다. (trigger 확인 및 메세지 생성 시 메모리 조회만 수행)
+    """
+    __slots__ = ('item', 'id', 'edited_time', 'values')
+
+    def __init__(self, item, edited_time, values):
+        self.item = item
+        self.id = item.id
+        self.edited_time = edited_time
+        self.values = values
+
+    def get(self, prop_name):
+        return self.values.get(prop_name)
+
+
+def iter_child_blocks(page, max_depth=1):
+    """ @page 의 하위 블럭을 문서 순서 대로 (depth, block) 으로 반환 하는
+        generator 입니다.
+
+        - depth 1 은 직속 child 이며, @max_depth 까지 (None 인 경우 제한 없음)
+          내려 갑니다.
+        - 하위 블럭 record 는 해당 블럭 까지 순회한 경우 에만 조회 (lazy) 합니다.
+    """
+    stack = [(1, iter(page.children))]
+    while stack:
+        depth, children = stack[-1]
+
+        child = next(children, _END)
+        if child is _END:
+            stack.pop()
+            continue
+
+        if child is None:
+            continue
+
+        yield depth, child
+
+        if (max_depth is None or depth < max_depth) and child.get('content'):
+            stack.append((depth + 1, iter(child.children)))
+
+
+class BlockIndex(object):
+    """ 페이지 (@page) 하위 블럭 (@max_depth 까지) 의 type / (type, title) 별
+        index 입니다.
+
+        - 한번의 순회로 만들며, isinstance 와 같이 상위 type 으로도 조회 됩니다.
+        - 페이지 (및 순회한 하위 블럭) 의 version 이 바뀐 경우 stale 로 판단 합니다.
+    """
+
+    def __init__(self, page, max_depth=1):
+        self.page_id = page.id
+        self.max_depth = max_depth
+
+        self.__by_type = {}  # block type: [block, ...]
+        self.__by_title = {}  # (block type, title): [block, ...]
+        self.__versions = [(page, page.get('version'))]
+
+        for depth, block in iter_child_blocks(page, max_depth):
+            title = getattr(block, 'title', None)
+
+            for block_type in type(block).__mro__:
+                self.__by_type.setdefault(block_type, []).append(block)
+                if title:
+                    self.__by_title.setdefault(
+                        (block_type, title), []
+                    ).append(block)
+
+            if (max_depth is None or depth < max_depth) and block.get('content'):
+                self.__versions.append((block, block.get('version')))
+
+    def is_stale(self):
+        return any(
+            block.get('version') != version
+            for block, version in self.__versions
+        )
+
+    def find(self, block_type, match_title=''):
+        if match_title:
+            blocks = self.__by_title.get((block_type, match_title), ())
+
+        else:
+            blocks = self.__by_type.get(block_type, ())
+
+        return list(blocks)
+
+
+class CollectionHandle(object):
+    """ 타겟 페이지 URL (@url) 에서 조회한 page / collection / view 의 id 및
+        오브젝트 입니다.
+
+        - 재시작 시 id 만 복구한 handle 은 페이지 조회 없이 id 로 collection /
+          view 오브젝트를 엽니다. (@page 는 None)
+        - schema 로 만든 query filter (@query_filters: 칼럼 이름: filter) 를 함께
+          캐시 합니다.
+    """
+    __slots__ = (
+        'url', 'page_id', 'collection_id', 'view_id', 'resolved_time',
+        'page', 'collection', 'view', 'query_filters'
+    )
+
+    def __init__(self, url, page_id, collection_id, view_id, resolved_time,
+                 page=None, collection=None, view=None):
+        self.url = url
+        self.page_id = page_id
+        self.collection_id = collection_id
+        self.view_id = view_id
+        self.resolved_time = resolved_time  # URL 조회 시간 (epoch)
+
+        self.page = page
+        self.collection = collection
+        self.view = view
+        self.query_filters = {}
+
+    def is_expired(self, ttl):
+        return time.time() - self.resolved_time >= ttl
+
+    def to_dict(self):
+        return {
+            'url': self.url,
+            'page_id': self.page_id,
+            'collection_id': self.collection_id,
+            'view_id': self.view_id,
+            'resolved_time': self.resolved_time,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data['url'], data['page_id'], data['collection_id'],
+            data['view_id'], data['resolved_time']
+        )
 
 
 class NotionAPI(NotionClient):
+    """ 여러 타겟 (worker thread) 이 같은 token 의 client 를 공유 할 수 있도록,
+        transaction 을 사용하는 property 수정은 @write_lock 으로 직렬화 합니다.
+        (NotionClient 의 transaction 상태는 thread 별이 아닌 client 단위)
+
+        모든 요청은 전송 전 request_governor 에서 token 별 전송 토큰을 받으며,
+        429 응답은 session 에서 재시도 하지 않고 governor 에 알린 후 재시도 합니다.
+    """
+
     def __init__(self, token):
+        # NotionClient 생성 시 에도 요청 (사용자 정보 조회) 을 보내므로 먼저 설정
+        self.__rate_key = token
+
         super(NotionAPI, self).__init__(token_v2=token)
 
-    def __get_block(self, page, block_type, match_title=''):
-        # TODO block type valid check
+        self.__disable_session_rate_retry()
 
-        all_type_block = [
-            _child for _child in page.children
-                if isinstance(_child, block_type)
-        ]
+        self.write_lock = threading.RLock()
 
-        if match_title:
-            all_type_block = list(
-                filter(
-                    (lambda b: b.title == match_title), all_type_block
-                )
-            )
+        self.__handles = {}  # url: CollectionHandle
+        self.__handles_lock = threading.Lock()
+
+        self.__indexes = {}  # (page id, max_depth): BlockIndex
+        self.__indexes_lock = threading.Lock()
+
+    def __disable_session_rate_retry(self):
+        adapter = self.session.get_adapter('https://')
+        retry = adapter.max_retries
+
+        status_forcelist = tuple(
+            status for status in (retry.status_forcelist or ())
+                if status != 429
+        )
+        adapter.max_retries = retry.new(status_forcelist=status_forcelist)
+
+    def post(self, endpoint, data):
+        governor = get_governor()
+
+        retry = 0
+        while True:
+            governor.acquire(self.__rate_key)
 
-        return all_type_block
+            try:
+                response = super(NotionAPI, self).post(endpoint, data)
+
+            except HTTPError as e:
+                res = e.response
+                if res is None or res.status_code != 429 or \
+                        retry >= governor.max_retry:
+                    raise
+
+                try:
+                    retry_after = float(res.headers.get('Retry-After'))
+
+                except (TypeError, ValueError):
+                    retry_after = None
+
+                governor.on_rate_limited(self.__rate_key, retry_after)
+                retry += 1
+                continue
+
+            governor.on_success(self.__rate_key)
+            return response
+
+    def get_block_index(self, page, max_depth=1):
+        """ 페이지 (@page) 의 하위 블럭 index 를 반환 합니다.
+            (페이지 version 이 바뀐 경우 다시 생성)
+        """
+        key = (page.id, max_depth)
+        with self.__indexes_lock:
+            index = self.__indexes.get(key)
+
+        if index is None or index.is_stale():
+            index = BlockIndex(page, max_depth)
+
+            with self.__indexes_lock:
+                self.__indexes[key] = index
+
+        return index
+
+    def find_blocks(self, page, block_type, match_title='', max_depth=1):
+        """ 페이지 (@page) 하위 블럭 중 @block_type (및 제목 @match_title) 에
+            해당하는 블럭 리스트를 반환 합니다.
+        """
+        index = self.get_block_index(page, max_depth)
+
+        return index.find(block_type, match_title)
+
+    def __get_block(self, page, block_type, match_title=''):
+        return self.find_blocks(page, block_type, match_title)
 
     def get_text_block(self, page, match_text=''):
         return self.__get_block(page, TextBlock, match_text)
@@ -86,6 +305,132 @@ class NotionAPI(NotionClient):
 
         return collection.get_rows()
 
+    def get_collection_checkbox_filter(self, collection, prop_name,
+                                       value=True):
+        """ 체크박스 칼럼 (@prop_name) 값이 @value 인 Row 만 조회하기 위한
+            queryCollection filter 를 생성 합니다.
+        """
+        prop = collection.get_schema_property(prop_name)
+        if not prop:
+            raise Exception('Not found property ({})'.format(prop_name))
+
+        if prop['type'] != 'checkbox':
+            raise Exception(
+                'Property is not checkbox ({}: {})'.format(
+                    prop_name, prop['type']
+                )
+            )
+
+        return {
+            'operator': 'and',
+            'filters': [
+                {
+                    'property': prop['id'],
+                    'filter': {
+                        'operator': 'checkbox_is',
+                        'value': {'type': 'exact', 'value': value},
+                    },
+                },
+            ],
+        }
+
+    def resolve_collection_handle(self, url):
+        """ 페이지 URL (@url) 을 조회 하여 page / collection / view handle 을
+            생성 합니다. (캐시된 record 가 있어도 최신 정보로 다시 조회)
+        """
+        page = self.get_block(url, force_refresh=True)
+        collection = self.get_collection_block(page)
+
+        views = page.views
+        if not views:
+            raise Exception('Empty collection view ({})'.format(url))
+
+        view = views[0]
+
+        return CollectionHandle(
+            url, page.id, collection.id, view.id, time.time(),
+            page=page, collection=collection, view=view
+        )
+
+    def open_collection_handle(self, handle):
+        """ id 만 있는 @handle 의 collection / view 오브젝트를 페이지 조회 없이
+            id 로 직접 엽니다.
+        """
+        collection = self.get_collection(handle.collection_id)
+        if not collection:
+            raise Exception(
+                'Not found collection ({})'.format(handle.collection_id)
+            )
+
+        view = self.get_collection_view(handle.view_id, collection=collection)
+        if not view:
+            raise Exception(
+                'Not found collection view ({})'.format(handle.view_id)
+            )
+
+        handle.collection = collection
+        handle.view = view
+
+    def get_collection_handle(self, url, ttl=DEFAULT_HANDLE_TTL,
+                              warm_handle=None):
+        """ 페이지 URL (@url) 의 handle 을 반환 합니다.
+
+            - 조회 후 @ttl 초 동안은 캐시된 handle 을 그대로 사용 합니다.
+            - 캐시가 없는 경우 재시작 전에 저장한 @warm_handle 이 있으면,
+              URL 조회 없이 id 로 handle 을 엽니다. (실패 시 URL 조회)
+        """
+        with self.__handles_lock:
+            handle = self.__handles.get(url)
+
+        if handle is None and warm_handle is not None and warm_handle.url == url:
+            handle = warm_handle
+
+        if handle is not None and not handle.is_expired(ttl):
+            if handle.view is not None:
+                return handle
+
+            try:
+                self.open_collection_handle(handle)
+
+            except Exception:
+                handle = None
+
+        if handle is None or handle.view is None or handle.is_expired(ttl):
+            handle = self.resolve_collection_handle(url)
+
+        with self.__handles_lock:
+            self.__handles[url] = handle
+
+        return handle
+
+    def invalidate_collection_handle(self, url):
+        """ 조회 오류 등으로 더이상 유효하지 않은 handle 을 캐시 에서 제거 합니다. """
+        with self.__handles_lock:
+            self.__handles.pop(url, None)
+
+    def iter_collection_trigger_item(self, handle, prop_name):
+        """ 체크박스 칼럼 (@prop_name) 이 True 인 Row 항목만 Notion 서버 측
+            filter 로 조회 하여 generator 로 반환 합니다.
+
+            - 조건에 맞는 Row 의 record 만 전송 되므로, 전체 Row 를 가져오는
+              get_collection_item_list 보다 전송량 및 메모리 사용량이 적습니다.
+            - queryCollection 은 cursor 를 지원하지 않으므로, 첫 항목 반환 전에
+              조건에 맞는 Row 전체를 한번의 요청 으로 조회 합니다.
+              (Row 개수 제한은 notion-py 의 loader 설정을 따름)
+            - @handle 의 view 로 바로 조회 하며, filter 는 handle 에 캐시 합니다.
+        """
+        query_filter = handle.query_filters.get(prop_name)
+        if query_filter is None:
+            query_filter = self.get_collection_checkbox_filter(
+                handle.collection, prop_name
+            )
+            handle.query_filters[prop_name] = query_filter
+
+        result = handle.view.build_query(filter=query_filter).execute()
+
+        for item in result:
+            yield item
+
     def get_collection_item_property(self, item, prop_name):
         try:
             property_val = item.get_property(prop_name)
@@ -95,9 +440,142 @@ class NotionAPI(NotionClient):
 
         return property_val
 
+    def get_collection_item_edited_time(self, item):
+        """ Row 항목의 마지막 수정 시간 (ms timestamp) 을 반환 합니다. """
+        return item.get('last_edited_time')
+
+    def get_collection_schema_props(self, collection, prop_names):
+        """ 칼럼 이름 (@prop_names) 별 schema property 정보를 한번에 조회 합니다. """
+        schema_props = {}
+        for prop_name in prop_names:
+            prop = collection.get_schema_property(prop_name)
+            if not prop:
+                raise Exception('Not found property ({})'.format(prop_name))
+
+            schema_props[prop_name] = prop
+
+        return schema_props
+
+    def get_collection_item_projection(self, items, prop_names):
+        """ Row 항목 리스트 (@items) 에서 필요한 칼럼 (@prop_names) 값만 한번에
+            읽어, CollectionRowView 리스트로 반환 합니다.
+
+            - Row record 는 한번의 요청으로 갱신 하며, 칼럼 이름 -> schema 조회는
+              Row 마다 하지 않고 한번만 수행 합니다.
+        """
+        if not items:
+            return []
+
+        schema_props = self.get_collection_schema_props(
+            items[0].collection, prop_names
+        )
+
+        self.refresh_records(block=[item.id for item in items])
+
+        views = []
+        for item in items:
+            values = {}
+            for prop_name, prop in schema_props.items():
+                try:
+                    raw_value = item.get(['properties', prop['id']])
+                    values[prop_name] = item._convert_notion_to_python(
+                        raw_value, prop
+                    )
+
+                except Exception as e:
+                    raise Exception(
+                        'Failed get property [msg: {}]'.format(e)
+                    )
+
+            views.append(
+                CollectionRowView(
+                    item, self.get_collection_item_edited_time(item), values
+                )
+            )
+
+        return views
+
     def set_collection_item_property(self, item, prop_name, prop_value):
         try:
-            item.set_property(prop_name, prop_value)
+            with self.write_lock:
+                item.set_property(prop_name, prop_value)
 
         except Exception as e:
             raise Exception('Failed set property [msg: {}]'.format(e))
+
+    def set_collection_items_property(self, updates,
+                                      chunk_size=WRITE_CHUNK_SIZE):
+        """ 여러 Row 항목의 property 수정 (@updates: (item, prop_name, prop_value)
+            리스트) 을 @chunk_size 단위의 transaction 으로 묶어서 한번에 전송 합니다.
+
+            - transaction 이 실패한 chunk 는 Row 단위로 다시 전송하여,
+              실패한 항목만 골라 냅니다.
+            - 실패한 항목의 (item, prop_name, prop_value, error) 리스트를 반환 합니다.
+        """
+        failures = []
+
+        for idx in range(0, len(updates), chunk_size):
+            chunk = updates[idx:idx + chunk_size]
+
+            try:
+                with self.write_lock, self.as_atomic_transaction():
+                    for item, prop_name, prop_value in chunk:
+                        item.set_property(prop_name, prop_value)
+
+                continue
+
+            except Exception:
+                pass
+
+            for item, prop_name, prop_value in chunk:
+                try:
+                    self.set_collection_item_property(
+                        item, prop_name, prop_value
+                    )
+
+                except Exception as e:
+                    failures.append((item, prop_name, prop_value, e))
+
+        return failures
+
+
+_CLIENTS = {}  # token: [NotionAPI, 참조 개수]
+_CLIENTS_LOCK = threading.Lock()
+
+
+def get_notion_client(token):
+    """ token (workspace 계정) 별로 하나의 NotionAPI 를 공유 하도록 반환 합니다.
+        (record cache 및 connection pool 공유, 사용이 끝나면 release_notion_client 호출)
+    """
+    with _CLIENTS_LOCK:
+        client_ref = _CLIENTS.get(token)
+        if client_ref is None:
+            client_ref = [NotionAPI(token), 0]
+            _CLIENTS[token] = client_ref
+
+        client_ref[1] += 1
+
+    return client_ref[0]
+
+
+def release_notion_client(token):
+    """ 공유 중인 NotionAPI 의 참조 개수를 줄이고, 더이상 사용하지 않는 경우 정리 합니다. """
+    with _CLIENTS_LOCK:
+        client_ref = _CLIENTS.get(token)
+        if client_ref is None:
+            return
+
+        client_ref[1] -= 1
+        if client_ref[1] > 0:
+            return
+
+        del _CLIENTS[token]
+
+    session = getattr(client_ref[0], 'session', None)
+    if session is not None:
+        session.close()
+
+
+def get_notion_client_count():
+    with _CLIENTS_LOCK:
+        return len(_CLIENTS)
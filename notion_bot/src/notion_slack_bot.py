@@ -1,28 +1,52 @@
 import os
 import json
 
-from notion_api import NotionAPI, NotionDate, User
+from notion_api import (
+    DEFAULT_HANDLE_TTL, CollectionHandle, CollectionRowView, NotionDate, User,
+    get_notion_client, release_notion_client, get_notion_client_count
+)
+from request_governor import (
+    PRIORITY_TRIGGER_SCAN, PRIORITY_TRIGGER_RESET, request_priority
+)
+from block_template import get_block_template
+from row_snapshot import RowSnapshot
 from common.logger import get_logger
 from common.constants import NOTION_BOT_RESOURCE_PATH
+from common.metrics import REGISTRY, measure_stage
 from common.error import GetNotionBlockError
 from common.webhook_api import (
     SEND_SUCCESS, SEND_FAIL, NO_MSGS, InCommingWebHooks
 )
+from common.slack_queue import get_outbound_queue
 
 LOGGER = get_logger('notion.notion_bot')
 CONF_DIR = NOTION_BOT_RESOURCE_PATH + '/notion_confs'
 
+ROW_COUNT = REGISTRY.counter(
+    'slackbot_rows_total', 'Collection rows seen by trigger scan', ('kind',)
+)
+REGISTRY.gauge(
+    'slackbot_notion_clients', 'Shared notion clients (one per token)',
+    func=lambda: {(): get_notion_client_count()}
+)
+
 
 class NotionBot(object):
     def __init__(self, webhook_url):
-        self.webhook = InCommingWebHooks(webhook_url)
+        self.set_webhook_url(webhook_url)
 
         self.schema_table = {}
 
+    def set_webhook_url(self, webhook_url):
+        """ 메세지를 전송할 webhook URL (@webhook_url) 을 설정 합니다. """
+        self.webhook = InCommingWebHooks(webhook_url)
+        self.outbound = get_outbound_queue(webhook_url)
+
     def send_msg_to_slack(self, text=None, blocks=None):
         """
             간단한 문장 (@text) 또는 블럭형태 (@blocks) 메시지 를
-            webhook api를 통해 지정된 slack 채널로 전송합니다.
+            webhook URL 별 전송 queue 에 추가 합니다.
+            (실제 전송은 queue 의 sender thread 가 rate limit 에 맞춰 수행)
 
             참고:
             - https://api.slack.com/messaging/webhooks#posting_with_webhooks
@@ -31,15 +55,7 @@ class NotionBot(object):
         if not text and not blocks:
             raise Exception('Text or block objects must exist.')
 
-        data = {}
-
-        if text:
-            data['text'] = text
-
-        if blocks:
-            data['blocks'] = blocks
-
-        return self.webhook.send_msg(**data)
+        self.outbound.put(text=text, blocks=blocks)
 
     def set_schema_table(self, schema_conf_dict):
         """ 'slack/send_type' 설정이 ' block' 인 경우,
@@ -55,6 +71,14 @@ class NotionBot(object):
         """ need overriding """
         pass
 
+    def reset_target_block_item(self, trigger, items):
+        """ need overriding """
+        pass
+
+    def close(self):
+        """ 더이상 사용하지 않는 bot 의 자원을 정리 합니다. """
+        pass
+
     def make_text_msg(self, *args, **kwargs):
         """ need overriding """
         pass
@@ -74,56 +98,200 @@ class CollectionPageNotiBot(NotionBot):
             (체크박스 칼럼이며, 각각의 행에서 체크박스 체크 유무로 노티여부를 판단)
     """
 
-    def __init__(self, webhook_url, notion_token, notion_url):
+    def __init__(self, webhook_url, notion_token, notion_url,
+                 snapshot_path=None, handle_path=None,
+                 handle_ttl=DEFAULT_HANDLE_TTL):
         super(CollectionPageNotiBot, self).__init__(webhook_url)
 
-        self.notion = NotionAPI(notion_token)
+        # 같은 token 을 사용하는 타겟 끼리 client (record cache, session) 공유
+        self.notion_token = notion_token
+        self.notion = get_notion_client(notion_token)
         self.notion_url = notion_url
 
-        self.all_row_items = []
+        # 페이지 URL 조회 결과 (page / collection / view) 는 @handle_ttl 초 동안
+        # 재사용 하며, @handle_path 에 저장 하여 재시작 후 에도 사용
+        self.handle = None
+        self.handle_path = handle_path
+        self.handle_ttl = handle_ttl
+        self.warm_handle = self.load_handle()
+
+        self.snapshot = RowSnapshot(snapshot_path)
+
+    def close(self):
+        if self.notion is not None:
+            self.notion = None
+            release_notion_client(self.notion_token)
+
+    def load_handle(self):
+        """ 재시작 전에 저장한 handle (id) 을 읽습니다. (없거나 실패 시 None) """
+        if not self.handle_path or not os.path.isfile(self.handle_path):
+            return None
+
+        try:
+            with open(self.handle_path) as f:
+                return CollectionHandle.from_dict(json.load(f))
+
+        except Exception as e:
+            LOGGER.error('Load collection handle failed ({}) [msg: {}]'.format(
+                self.handle_path, e
+            ))
+            return None
+
+    def save_handle(self):
+        """ handle (id) 을 임시 파일에 쓴 후 교체 (atomic) 합니다. """
+        if not self.handle_path or self.handle is None:
+            return
+
+        tmp_path = '{}.tmp'.format(self.handle_path)
+        try:
+            os.makedirs(os.path.dirname(self.handle_path), exist_ok=True)
+
+            with open(tmp_path, 'w') as f:
+                json.dump(self.handle.to_dict(), f, separators=(',', ':'))
+
+            os.replace(tmp_path, self.handle_path)
+
+        except Exception as e:
+            LOGGER.error('Save collection handle failed ({}) [msg: {}]'.format(
+                self.handle_path, e
+            ))
 
     def set_block_item(self):
-        """ Notion URL (@self.notion_url) 에 해당하는 페이지의
-            Coll 블럭에 대한 각각의 Row 항목에 대한 오브젝트를 클래스  attribute
-            (@all_row_items) 에 저장합니다.
+        """ Notion URL (@self.notion_url) 에 해당하는 page / collection / view
+            handle 을 클래스 attribute (@handle) 에 저장합니다.
+            (Row 항목은 get_target_block_item 에서 trigger 조건으로 조회)
+
+            - TTL 이 지나지 않은 경우 캐시된 handle 을 사용 하므로, 매 주기 마다
+              페이지를 다시 조회 하지 않습니다.
         """
         try:
-            page = self.notion.get_page_block_from_url(self.notion_url)
-
-            self.all_row_items = (
-                self.notion.get_collection_item_list(page)
-            )
+            with measure_stage('page_resolve'), \
+                    request_priority(PRIORITY_TRIGGER_SCAN):
+                handle = self.notion.get_collection_handle(
+                    self.notion_url, self.handle_ttl, self.warm_handle
+                )
 
         except Exception as e:
             raise Exception(
                 'Set collection block failed ({})'.format(e)
             )
 
-    def get_target_block_item(self, trigger):
-        """ Coll 블럭에 대한 각각의 Row 항목이 저장된 리스트 (@items) 에서
-            Trigger가 되는 체크박스가 True (체크됨) 인 항목을 iteration 하여
-            리스트에 저장 및 반환 합니다.
+        # 새로 조회한 handle 인 경우 에만 저장
+        is_resolved = self.handle is None or \
+            self.handle.resolved_time != handle.resolved_time
+
+        self.handle = handle
+        self.warm_handle = None
+        if is_resolved:
+            self.save_handle()
+
+    def get_projection_props(self, trigger):
+        """ 한 주기 동안 필요한 칼럼 이름 (trigger + variable_block) 리스트를 반환 합니다. """
+        prop_names = [trigger]
+
+        variable_block = self.schema_table.get('variable_block', {})
+        for col_name in variable_block.values():
+            if col_name not in prop_names:
+                prop_names.append(col_name)
 
-            TODO. 개선 필요 (꼭 필요한가?..)
+        return prop_names
+
+    def get_target_block_item(self, trigger):
+        """ Coll 블럭에서 Trigger가 되는 체크박스가 True (체크됨) 인 항목을
+            Notion 서버 측 filter 로 조회 (stream) 하여, 필요한 칼럼 값을 미리 읽은
+            CollectionRowView 리스트로 저장 및 반환 합니다.
+            (Trigger 는 해제 하지 않으므로, 메세지를 전송 queue 에 추가한 후
+             reset_target_block_item 으로 해제)
+
+            - 스냅샷 (@self.snapshot) 기준으로 마지막 확인 이후 수정된 Row 만
+              Trigger 값을 다시 확인 합니다. (서버 측 filter 결과가 늦게 반영되어
+              이미 해제한 Row 가 다시 조회 되더라도 중복 노티 되지 않도록)
         """
-        def iter_target_item(items):
+        seen_ids = []
+
+        def iter_changed_item(items):
             for item in items:
-                is_need_notice = (
-                    self.notion.get_collection_item_property(item, trigger)
-                )
+                seen_ids.append(item.id)
 
-                if is_need_notice is True:
+                edited_time = self.notion.get_collection_item_edited_time(item)
+                if self.snapshot.is_changed(item.id, edited_time):
                     yield item
 
+        trigger_items = self.notion.iter_collection_trigger_item(
+            self.handle, trigger
+        )
+
         target_items = []
-        for item in iter_target_item(self.all_row_items):
-            target_items.append(item)
+        try:
+            with measure_stage('row_fetch'), \
+                    request_priority(PRIORITY_TRIGGER_SCAN):
+                try:
+                    changed_items = list(iter_changed_item(trigger_items))
+
+                except Exception:
+                    # 페이지 이동, view 삭제 등 handle 이 유효하지 않을 수 있으므로
+                    # 다음 주기 에는 URL 을 다시 조회
+                    self.notion.invalidate_collection_handle(self.notion_url)
+                    raise
+
+            with measure_stage('trigger_scan'), \
+                    request_priority(PRIORITY_TRIGGER_SCAN):
+                # trigger 및 메세지 생성에 필요한 칼럼 값을 한번에 조회
+                row_views = self.notion.get_collection_item_projection(
+                    changed_items, self.get_projection_props(trigger)
+                )
+
+                for view in row_views:
+                    is_need_notice = view.get(trigger)
+                    self.snapshot.update(
+                        view.id, view.edited_time, is_need_notice
+                    )
+
+                    if is_need_notice is True:
+                        target_items.append(view)
+
+            ROW_COUNT.inc(len(seen_ids), kind='scanned')
+            ROW_COUNT.inc(len(changed_items), kind='changed')
+            ROW_COUNT.inc(len(target_items), kind='triggered')
+
+            # 스냅샷 에는 현재 Trigger 가 체크된 Row 만 유지
+            self.snapshot.prune(seen_ids)
 
-            # Trigger 체크박스 해제
-            self.notion.set_collection_item_property(item, trigger, False)
+        finally:
+            self.snapshot.save()
 
         return target_items
 
+    def reset_target_block_item(self, trigger, items):
+        """ 메세지를 전송 queue 에 추가한 항목 (@items) 의 Trigger 체크박스를
+            한번의 transaction 으로 해제 하고, 해제한 항목 리스트를 반환 합니다.
+
+            - 해제에 실패한 Row 는 Trigger 가 남아 있으므로 다음 주기에 다시 노티
+              됩니다. (같은 메세지는 PayloadDedup 기간 내 에서는 다시 전송 되지 않음)
+        """
+        try:
+            with measure_stage('trigger_reset'), \
+                    request_priority(PRIORITY_TRIGGER_RESET):
+                failures = self.notion.set_collection_items_property(
+                    [(view.item, trigger, False) for view in items]
+                )
+
+            failed_ids = set()
+            for item, _, _, e in failures:
+                failed_ids.add(item.id)
+                LOGGER.error(
+                    'Reset trigger failed ({}) [msg: {}]'.format(item.id, e)
+                )
+
+            reset_items = [view for view in items if view.id not in failed_ids]
+            for view in reset_items:
+                self.snapshot.update(view.id, view.edited_time, False)
+
+        finally:
+            self.snapshot.save()
+
+        return reset_items
+
     def make_block_msg(self, item):
         """ Slack block 메세지 포맷에 맞게 전송하고자 하는 메세지 포맷을 생성합니다.
 
@@ -134,8 +302,11 @@ class CollectionPageNotiBot(NotionBot):
         def get_collection_obj(col_name):
             """ Coll 블럭의 각각의 행 정보를 가진 object(@item) 에서,
                 칼럼 이름 (@col_name)에 해당하는 값에 대한 notion object를 가져와 반환
-                합니다.
+                합니다. (CollectionRowView 인 경우 미리 읽어 둔 값을 사용)
             """
+            if isinstance(item, CollectionRowView):
+                return item.get(col_name)
+
             return self.notion.get_collection_item_property(item, col_name)
 
         def get_collection_obj_value(obj):
@@ -172,34 +343,22 @@ class CollectionPageNotiBot(NotionBot):
         json_var_table = {}
         for s_var, s_name in schmea_fmt_var_dict.items():
             cobj = get_collection_obj(s_name)
-
-            key = '${{{var}}}'.format(var=s_var)
-            value = get_collection_obj_value(cobj)
-
-            json_var_table[key] = value
+            json_var_table[s_var] = get_collection_obj_value(cobj)
 
         # table 정보에 페이지 link 추가
         page_id = str(item.id).replace('-', '')
         json_var_table.update(
-            {'${link}': 'https://www.notion.so/{}'.format(page_id)}
+            {'link': 'https://www.notion.so/{}'.format(page_id)}
         )
 
         # table 정보에 comment 추가 (TODO. notion page의 comment 값 가져올 수 있도록)
         json_var_table.update({
-            '${comment}': '해당되는 사업부는 위 공지를 참고하여 업무 숙지 해주시기 바랍니다.'
+            'comment': '해당되는 사업부는 위 공지를 참고하여 업무 숙지 해주시기 바랍니다.'
         })
 
-        # json 포맷 파일을 가져오고, 정의된 variable에 table 정보 추가
-        block_dict = json.load(
-            open(os.path.join(CONF_DIR, schmea_fmt_f_name))
+        # 캐시된 json 포맷 템플릿에 정의된 variable 위치에 table 정보 추가
+        block_template = get_block_template(
+            os.path.join(CONF_DIR, schmea_fmt_f_name)
         )
 
-        block_fmt_str = json.dumps(block_dict)
-        for json_var, value in json_var_table.items():
-            block_fmt_str = block_fmt_str.replace(
-                json_var, str(value)
-            )
-
-        new_block_dict = json.loads(block_fmt_str)
-
-        return new_block_dict
+        return block_template.render(json_var_table)
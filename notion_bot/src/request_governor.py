@@ -0,0 +1,230 @@
+import time
+import heapq
+import itertools
+import threading
+
+from contextlib import contextmanager
+
+from common.logger import get_logger
+from common.metrics import REGISTRY
+
+LOGGER = get_logger('notion.governor')
+
+# 요청 우선 순위 (작을 수록 먼저 전송)
+PRIORITY_TRIGGER_SCAN = 0
+PRIORITY_TRIGGER_RESET = 1
+PRIORITY_RENDER = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_TRIGGER_SCAN: 'trigger_scan',
+    PRIORITY_TRIGGER_RESET: 'trigger_reset',
+    PRIORITY_RENDER: 'render',
+}
+
+DEFAULT_RATE = 3.0  # 초당 요청 수 (token 당)
+DEFAULT_BURST = 3
+DEFAULT_MIN_RATE = 0.5
+DEFAULT_MAX_RETRY = 3
+DEFAULT_RETRY_AFTER = 1.0
+RATE_INCREASE_STEP = 0.1  # 성공 응답 당 회복 하는 초당 요청 수
+
+WAIT_TIME = REGISTRY.histogram(
+    'slackbot_notion_wait_seconds', 'Time notion requests waited for a rate token',
+    ('priority',)
+)
+RATE_LIMITED = REGISTRY.counter(
+    'slackbot_notion_rate_limited_total', 'Notion responses with status 429'
+)
+REGISTRY.gauge(
+    'slackbot_notion_waiting', 'Notion requests waiting for a rate token',
+    ('priority',),
+    func=lambda: get_governor().get_waiting_count()
+)
+
+_LOCAL = threading.local()
+
+
+@contextmanager
+def request_priority(priority):
+    """ with 블럭 안에서 현재 thread 가 보내는 Notion 요청의 우선 순위를 지정 합니다. """
+    prev = getattr(_LOCAL, 'priority', None)
+    _LOCAL.priority = priority
+    try:
+        yield
+
+    finally:
+        _LOCAL.priority = prev
+
+
+def get_request_priority():
+    """ 현재 thread 의 요청 우선 순위를 반환 합니다. (지정 하지 않은 경우 render) """
+    priority = getattr(_LOCAL, 'priority', None)
+    return PRIORITY_RENDER if priority is None else priority
+
+
+class RateBucket(object):
+    """ 하나의 token (workspace) 에 대한 token bucket 입니다.
+
+        - 대기 중인 요청은 (우선 순위, 요청 순서) 순서로 토큰을 받습니다.
+        - 429 응답 시 Retry-After 동안 요청을 멈추고 @rate 를 절반 으로 줄인 후,
+          성공 응답 마다 @max_rate 까지 조금씩 회복 합니다.
+    """
+
+    def __init__(self, rate, burst, min_rate):
+        self.max_rate = float(rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.rate = self.max_rate
+        self.capacity = float(burst)
+
+        self.__tokens = self.capacity
+        self.__last = time.monotonic()
+        self.__blocked_until = 0
+        self.__waiters = []  # (priority, seq)
+        self.__seq = itertools.count()
+        self.__cond = threading.Condition()
+
+    def __refill(self, now):
+        self.__tokens = min(
+            self.capacity, self.__tokens + (now - self.__last) * self.rate
+        )
+        self.__last = now
+
+    def __get_wait_time(self):
+        now = time.monotonic()
+        if now < self.__blocked_until:
+            return self.__blocked_until - now
+
+        self.__refill(now)
+        if self.__tokens >= 1:
+            return 0
+
+        return (1 - self.__tokens) / self.rate
+
+    def acquire(self, priority):
+        """ 토큰을 받을 때 까지 대기 합니다. """
+        with self.__cond:
+            waiter = (priority, next(self.__seq))
+            heapq.heappush(self.__waiters, waiter)
+
+            while True:
+                timeout = None
+                if self.__waiters[0] is waiter:
+                    timeout = self.__get_wait_time()
+                    if not timeout:
+                        break
+
+                self.__cond.wait(timeout)
+
+            self.__tokens -= 1
+            heapq.heappop(self.__waiters)
+            self.__cond.notify_all()
+
+    def on_success(self):
+        with self.__cond:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + RATE_INCREASE_STEP)
+
+    def on_rate_limited(self, retry_after):
+        with self.__cond:
+            now = time.monotonic()
+            self.__refill(now)
+
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.__tokens = 0
+            self.__blocked_until = max(self.__blocked_until, now + retry_after)
+
+            self.__cond.notify_all()
+
+    def get_waiting_count(self):
+        """ 우선 순위 별 대기 중인 요청 수를 반환 합니다. """
+        counts = {}
+        with self.__cond:
+            for priority, _ in self.__waiters:
+                counts[priority] = counts.get(priority, 0) + 1
+
+        return counts
+
+
+class RequestGovernor(object):
+    """ 프로세스 내 모든 NotionAPI 요청의 전송 속도를 token 별 RateBucket 으로
+        제한 합니다.
+
+        - 같은 token 을 사용하는 타겟 끼리 하나의 bucket 을 공유 하므로, 여러
+          타겟이 동시에 바쁜 경우 에도 workspace rate limit 을 넘지 않습니다.
+        - 토큰이 부족한 경우 trigger scan > trigger reset > render 순서로
+          먼저 전송 합니다.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST,
+                 min_rate=DEFAULT_MIN_RATE, max_retry=DEFAULT_MAX_RETRY):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_retry = max_retry
+
+        self.__buckets = {}  # token: RateBucket
+        self.__lock = threading.Lock()
+
+    def __get_bucket(self, key):
+        with self.__lock:
+            bucket = self.__buckets.get(key)
+            if bucket is None:
+                bucket = RateBucket(self.rate, self.burst, self.min_rate)
+                self.__buckets[key] = bucket
+
+        return bucket
+
+    def acquire(self, key, priority=None):
+        """ @key (token) 의 요청 토큰을 받을 때 까지 대기 합니다. """
+        if priority is None:
+            priority = get_request_priority()
+
+        start_time = time.monotonic()
+        self.__get_bucket(key).acquire(priority)
+
+        WAIT_TIME.observe(
+            time.monotonic() - start_time,
+            priority=PRIORITY_NAMES.get(priority, str(priority))
+        )
+
+    def on_success(self, key):
+        self.__get_bucket(key).on_success()
+
+    def on_rate_limited(self, key, retry_after=None):
+        if retry_after is None:
+            retry_after = DEFAULT_RETRY_AFTER
+
+        RATE_LIMITED.inc()
+        LOGGER.warning(
+            'Rate limited by notion [retry after: {}s]'.format(retry_after)
+        )
+
+        self.__get_bucket(key).on_rate_limited(retry_after)
+
+    def get_waiting_count(self):
+        with self.__lock:
+            buckets = list(self.__buckets.values())
+
+        counts = {}
+        for bucket in buckets:
+            for priority, count in bucket.get_waiting_count().items():
+                labels = (PRIORITY_NAMES.get(priority, str(priority)),)
+                counts[labels] = counts.get(labels, 0) + count
+
+        return counts
+
+
+GOVERNOR = RequestGovernor()
+
+
+def get_governor():
+    return GOVERNOR
+
+
+def configure_governor(**kwargs):
+    """ 공용 요청 governor (@GOVERNOR) 를 새로운 설정으로 교체 합니다. """
+    global GOVERNOR
+
+    GOVERNOR = RequestGovernor(**kwargs)
+
+    return GOVERNOR
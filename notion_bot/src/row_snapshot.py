@@ -0,0 +1,110 @@
+import os
+import json
+import threading
+
+from common.logger import get_logger
+
+LOGGER = get_logger('notion.snapshot')
+
+EDITED_TIME_IDX = 0
+TRIGGER_IDX = 1
+
+
+class RowSnapshot(object):
+    """ 타겟 Coll 블럭의 Row 별 (last_edited_time, trigger 상태) 를 저장하는 스냅샷 입니다.
+
+        - 마지막으로 확인한 이후 수정 시간이 바뀐 Row 또는 trigger 가 아직 True 로
+          남아있는 Row 만 다시 확인 하도록 판단 합니다.
+        - @path 가 주어진 경우 json 파일로 저장 하여, 재시작 후에도 이어서 사용 합니다.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+
+        self.__rows = {}  # row id: [last_edited_time, trigger]
+        self.__dirty = False
+        self.__lock = threading.Lock()
+
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.isfile(self.path):
+            return
+
+        try:
+            with open(self.path) as f:
+                rows = json.load(f)['rows']
+
+        except Exception as e:
+            LOGGER.error(
+                'Load row snapshot failed ({}) [msg: {}]'.format(self.path, e)
+            )
+            return
+
+        with self.__lock:
+            self.__rows = rows
+            self.__dirty = False
+
+    def save(self):
+        """ 변경 사항이 있는 경우에만 임시 파일에 쓴 후 교체 (atomic) 합니다. """
+        if not self.path:
+            return
+
+        with self.__lock:
+            if not self.__dirty:
+                return
+
+            data = json.dumps({'rows': self.__rows}, separators=(',', ':'))
+            self.__dirty = False
+
+        tmp_path = '{}.tmp'.format(self.path)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+            with open(tmp_path, 'w') as f:
+                f.write(data)
+
+            os.replace(tmp_path, self.path)
+
+        except Exception as e:
+            LOGGER.error(
+                'Save row snapshot failed ({}) [msg: {}]'.format(self.path, e)
+            )
+
+            with self.__lock:
+                self.__dirty = True
+
+    def is_changed(self, row_id, edited_time):
+        """ 확인이 필요한 Row 인지 여부를 반환 합니다.
+            (처음 보는 Row, 수정 시간이 바뀐 Row, trigger 가 True 로 남아있는 Row)
+        """
+        with self.__lock:
+            row = self.__rows.get(row_id)
+
+        if row is None or edited_time is None:
+            return True
+
+        return row[EDITED_TIME_IDX] != edited_time or row[TRIGGER_IDX] is True
+
+    def update(self, row_id, edited_time, trigger):
+        with self.__lock:
+            row = [edited_time, trigger]
+            if self.__rows.get(row_id) != row:
+                self.__rows[row_id] = row
+                self.__dirty = True
+
+    def prune(self, row_ids):
+        """ @row_ids 에 없는 (삭제 된) Row 를 스냅샷 에서 제거 합니다. """
+        row_ids = set(row_ids)
+
+        with self.__lock:
+            removed = [_id for _id in self.__rows if _id not in row_ids]
+            for _id in removed:
+                del self.__rows[_id]
+
+            if removed:
+                self.__dirty = True
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__rows)
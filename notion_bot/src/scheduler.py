@@ -0,0 +1,175 @@
+import time
+import heapq
+import random
+import itertools
+import threading
+
+DEFAULT_MIN_INTERVAL = 5
+DEFAULT_MAX_INTERVAL = 60
+DEFAULT_BACKOFF = 2.0
+DEFAULT_JITTER = 0.1
+
+
+class TargetSchedule(object):
+    """ 하나의 타겟에 대한 polling 주기 상태 입니다.
+
+        - 노티할 항목이 있었던 경우 (active) 최소 주기 (@min_interval) 로 복귀
+        - 노티할 항목이 없는 경우 (quiet) 최대 주기 (@max_interval) 까지
+          @backoff 배 씩 주기를 늘립니다.
+        - @max_interval 이 없는 경우 @DEFAULT_MAX_INTERVAL 과 @min_interval 중
+          큰 값을 사용 합니다. (conf 검증 에서도 같은 기본값을 사용)
+    """
+
+    def __init__(self, min_interval=DEFAULT_MIN_INTERVAL, max_interval=None,
+                 backoff=DEFAULT_BACKOFF, jitter=DEFAULT_JITTER):
+
+        if max_interval is None:
+            max_interval = max(DEFAULT_MAX_INTERVAL, min_interval)
+
+        if min_interval <= 0 or max_interval < min_interval:
+            raise Exception(
+                'Invalid schedule interval (min: {}, max: {})'.format(
+                    min_interval, max_interval
+                )
+            )
+
+        if backoff < 1:
+            raise Exception('Invalid schedule backoff ({})'.format(backoff))
+
+        if not 0 <= jitter < 1:
+            raise Exception('Invalid schedule jitter ({})'.format(jitter))
+
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+
+        self.interval = min_interval
+        self.seq = None  # heap 에 등록된 최신 entry 의 sequence
+
+    def next_interval(self, is_active):
+        if is_active:
+            self.interval = self.min_interval
+
+        else:
+            self.interval = min(
+                self.interval * self.backoff, self.max_interval
+            )
+
+        # 여러 타겟이 같은 시점에 몰리지 않도록 jitter 적용
+        jitter = self.interval * self.jitter
+        return max(0, self.interval + random.uniform(-jitter, jitter))
+
+
+class TargetScheduler(object):
+    """ 타겟 별 다음 체크 시간 (next due) 을 min-heap 으로 관리 하는 scheduler 입니다.
+
+        - heap 에는 (due, seq, key) 가 저장되며, 재등록 된 타겟의 이전 entry 는
+          seq 가 달라 pop 시점에 무시 됩니다. (lazy deletion)
+        - 새로운 due 가 등록 되면 @wait 중인 thread 를 깨웁니다.
+    """
+
+    def __init__(self):
+        self.__heap = []
+        self.__schedules = {}  # key: TargetSchedule
+        self.__counter = itertools.count()
+        self.__cond = threading.Condition()
+
+    def __push(self, key, due):
+        schedule = self.__schedules[key]
+        schedule.seq = next(self.__counter)
+
+        heapq.heappush(self.__heap, (due, schedule.seq, key))
+        self.__cond.notify_all()
+
+    def add(self, key, **schedule_conf):
+        """ 타겟 (@key) 을 등록 하고, 바로 체크 되도록 합니다. """
+        with self.__cond:
+            self.__schedules[key] = TargetSchedule(**schedule_conf)
+            self.__push(key, time.monotonic())
+
+    def remove(self, key):
+        with self.__cond:
+            self.__schedules.pop(key, None)
+
+    def __contains__(self, key):
+        with self.__cond:
+            return key in self.__schedules
+
+    def reschedule(self, key, is_active):
+        """ 체크가 끝난 타겟 (@key) 의 다음 체크 시간을 등록 하고,
+            적용된 주기 (초) 를 반환 합니다.
+        """
+        with self.__cond:
+            schedule = self.__schedules.get(key)
+            if schedule is None:
+                return None
+
+            interval = schedule.next_interval(is_active)
+            self.__push(key, time.monotonic() + interval)
+
+        return interval
+
+    def wake(self, key):
+        """ 타겟 (@key) 을 최소 주기로 되돌리고 바로 체크 되도록 합니다. """
+        with self.__cond:
+            schedule = self.__schedules.get(key)
+            if schedule is None:
+                return False
+
+            schedule.interval = schedule.min_interval
+            self.__push(key, time.monotonic())
+
+        return True
+
+    def pop_due(self):
+        """ 체크 시간이 지난 타겟 key 리스트를 반환 합니다.
+            (반환된 타겟은 reschedule 전 까지 heap 에서 제외 됩니다.)
+        """
+        now = time.monotonic()
+        due_keys = []
+
+        with self.__cond:
+            while self.__heap and self.__heap[0][0] <= now:
+                _, seq, key = heapq.heappop(self.__heap)
+
+                schedule = self.__schedules.get(key)
+                if schedule is None or schedule.seq != seq:
+                    continue
+
+                schedule.seq = None
+                due_keys.append(key)
+
+        return due_keys
+
+    def __get_wait_time(self):
+        while self.__heap:
+            due, seq, key = self.__heap[0]
+
+            schedule = self.__schedules.get(key)
+            if schedule is None or schedule.seq != seq:
+                heapq.heappop(self.__heap)
+                continue
+
+            return max(0, due - time.monotonic())
+
+        return None
+
+    def wait(self, max_wait=None):
+        """ 다음 체크 시간 까지 (최대 @max_wait 초) 대기 합니다.
+            대기 중 더 빠른 due 가 등록 되면 바로 다시 계산 합니다.
+        """
+        deadline = None if max_wait is None else time.monotonic() + max_wait
+
+        with self.__cond:
+            while True:
+                wait_time = self.__get_wait_time()
+                if deadline is not None:
+                    remain = deadline - time.monotonic()
+                    if wait_time is None or wait_time > remain:
+                        wait_time = remain
+
+                if wait_time is not None and wait_time <= 0:
+                    return
+
+                self.__cond.wait(wait_time)
@@ -0,0 +1,233 @@
+import os
+import time
+import bisect
+import signal
+import hashlib
+
+from common.logger import LOGGER2, get_logger
+
+LOGGER = get_logger('notion.supervisor')
+
+DEFAULT_VNODES = 64
+DEFAULT_RESTART_DELAY = 1
+MIN_WORKER_UPTIME = 5
+
+
+def hash_key(key):
+    return int(hashlib.md5(str(key).encode('utf-8')).hexdigest()[:16], 16)
+
+
+class HashRing(object):
+    """ 타겟 key 를 worker 에 할당하기 위한 consistent hash ring 입니다.
+        (worker 개수가 바뀌어도 대부분의 타겟은 기존 worker 에 그대로 남습니다.)
+    """
+
+    def __init__(self, nodes, vnodes=DEFAULT_VNODES):
+        self.__ring = sorted(
+            (hash_key('{}#{}'.format(node, idx)), node)
+            for node in nodes for idx in range(vnodes)
+        )
+        self.__hashes = [_hash for _hash, _ in self.__ring]
+
+    def get_node(self, key):
+        if not self.__ring:
+            return None
+
+        idx = bisect.bisect(self.__hashes, hash_key(key)) % len(self.__ring)
+        return self.__ring[idx][1]
+
+
+class Supervisor(object):
+    """ 타겟을 @n_workers 개의 worker 프로세스에 나눠서 실행 하는 supervisor 입니다.
+
+        - 각각의 타겟 (@target_keys) 은 consistent hashing 으로 worker 에 할당 되며,
+          worker 프로세스 에서는 @run_worker(worker_id, assigned_keys) 를 실행 합니다.
+        - 비정상 종료 된 worker 는 다시 실행 합니다.
+        - resize 시 할당이 바뀐 worker 만 다시 실행 합니다.
+        - SIGHUP 또는 @is_config_changed() 시 @get_target_keys() 로 타겟 목록을
+          다시 읽고, 할당이 바뀐 worker 는 다시 실행, 나머지 worker 에는 SIGHUP 을
+          전달 하여 변경된 설정만 반영 하도록 합니다.
+    """
+
+    def __init__(self, target_keys, n_workers, run_worker,
+                 get_n_workers=None, get_target_keys=None,
+                 is_config_changed=None):
+
+        self.target_keys = list(target_keys)
+        self.run_worker = run_worker
+        self.get_n_workers = get_n_workers
+        self.get_target_keys = get_target_keys
+        self.is_config_changed = is_config_changed
+
+        self.__n_workers = 0
+        self.__assignment = {}  # worker id: set(target key)
+        self.__workers = {}  # worker id: (pid, start time)
+        self.__resize_requested = False
+        self.__reload_requested = False
+
+        self.resize(n_workers)
+
+    def __assign(self, n_workers):
+        ring = HashRing(range(n_workers))
+
+        assignment = {worker_id: set() for worker_id in range(n_workers)}
+        for key in self.target_keys:
+            assignment[ring.get_node(key)].add(key)
+
+        return assignment
+
+    def __spawn(self, worker_id):
+        assigned_keys = self.__assignment[worker_id]
+
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                # 부모 및 다른 worker 와 같은 로그 파일을 교체 (rotate) 하지 않도록 분리
+                LOGGER2.set_process_name('worker-{}'.format(worker_id))
+
+                signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+                signal.signal(signal.SIGHUP, signal.SIG_DFL)
+                self.run_worker(worker_id, assigned_keys)
+
+            except BaseException as e:
+                LOGGER.error(
+                    'Worker {} failed [msg: {}]'.format(worker_id, e)
+                )
+                exit_code = 1
+
+            finally:
+                # os._exit 는 atexit 를 실행 하지 않으므로, 남은 로그를 직접 기록
+                LOGGER2.stop()
+                os._exit(exit_code)
+
+        self.__workers[worker_id] = (pid, time.monotonic())
+
+        LOGGER.info(
+            'Spawn worker {} (pid:{}, targets: {})'.format(
+                worker_id, pid, len(assigned_keys)
+            )
+        )
+
+    def __kill(self, worker_id):
+        pid, _ = self.__workers.pop(worker_id)
+
+        try:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+
+        except (ProcessLookupError, ChildProcessError):
+            pass
+
+    def __reassign(self, n_workers):
+        """ 타겟을 @n_workers 개의 worker 에 다시 할당 하고, 할당이 바뀐 worker 는
+            종료 합니다. (할당이 그대로인 worker id 리스트 반환)
+        """
+        old_assignment = self.__assignment
+        self.__assignment = self.__assign(n_workers)
+        self.__n_workers = n_workers
+
+        kept = []
+        for worker_id in list(self.__workers):
+            new_keys = self.__assignment.get(worker_id)
+            if new_keys is not None and new_keys == old_assignment[worker_id]:
+                kept.append(worker_id)
+                continue
+
+            self.__kill(worker_id)
+
+        return kept
+
+    def resize(self, n_workers):
+        """ worker 개수를 @n_workers 로 변경하고, 할당이 바뀐 worker 만 다시 실행 합니다. """
+        if n_workers < 1:
+            raise Exception('Invalid worker count ({})'.format(n_workers))
+
+        self.__reassign(n_workers)
+
+        LOGGER.info('Resize workers: {}'.format(n_workers))
+
+    def reload(self, target_keys):
+        """ 타겟 목록을 @target_keys 로 변경 합니다. """
+        self.target_keys = list(target_keys)
+
+        for worker_id in self.__reassign(self.__n_workers):
+            try:
+                os.kill(self.__workers[worker_id][0], signal.SIGHUP)
+
+            except ProcessLookupError:
+                pass
+
+        LOGGER.info('Reload targets: {}'.format(len(self.target_keys)))
+
+    def request_resize(self, *args):
+        self.__resize_requested = True
+
+    def request_reload(self, *args):
+        self.__reload_requested = True
+
+    def __reap(self):
+        """ 종료 된 worker 를 확인하여, 해당 worker id 리스트를 반환 합니다. """
+        exited = []
+
+        while self.__workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+
+            except ChildProcessError:
+                break
+
+            if pid == 0:
+                break
+
+            for worker_id, (_pid, start_time) in list(self.__workers.items()):
+                if _pid != pid:
+                    continue
+
+                del self.__workers[worker_id]
+                exited.append((worker_id, start_time))
+
+                LOGGER.error(
+                    'Worker {} exited (pid:{}, status: {})'.format(
+                        worker_id, pid, status
+                    )
+                )
+
+        return exited
+
+    def run(self):
+        signal.signal(signal.SIGUSR1, self.request_resize)
+        signal.signal(signal.SIGHUP, self.request_reload)
+
+        while True:
+            if self.__resize_requested and self.get_n_workers:
+                self.__resize_requested = False
+
+                try:
+                    self.resize(self.get_n_workers())
+
+                except Exception as e:
+                    LOGGER.error('Resize workers failed ({})'.format(e))
+
+            if self.is_config_changed and self.is_config_changed():
+                self.__reload_requested = True
+
+            if self.__reload_requested and self.get_target_keys:
+                self.__reload_requested = False
+
+                try:
+                    self.reload(self.get_target_keys())
+
+                except Exception as e:
+                    LOGGER.error('Reload targets failed ({})'.format(e))
+
+            for worker_id, start_time in self.__reap():
+                # 시작 직후 바로 종료 되는 worker 는 잠시 후 다시 실행
+                if time.monotonic() - start_time < MIN_WORKER_UPTIME:
+                    time.sleep(DEFAULT_RESTART_DELAY)
+
+            for worker_id in range(self.__n_workers):
+                if worker_id not in self.__workers:
+                    self.__spawn(worker_id)
+
+            time.sleep(DEFAULT_RESTART_DELAY)
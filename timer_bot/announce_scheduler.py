@@ -0,0 +1,118 @@
+import time
+import heapq
+import itertools
+import threading
+
+from datetime import datetime, timedelta
+
+MAX_WAIT = 60  # 시스템 시간 변경에 대비한 최대 대기 시간 (초)
+
+
+def get_next_time(sec_of_day, now=None):
+    """ 하루 중 @sec_of_day 초 에 해당하는 시간 중, @now 이후 가장 가까운
+        시간 (epoch) 을 반환 합니다.
+    """
+    now = now or datetime.now()
+
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    due = midnight + timedelta(seconds=sec_of_day)
+    while due <= now:
+        due += timedelta(days=1)
+
+    return due.timestamp()
+
+
+class AnnounceScheduler(object):
+    """ 알림 대상 (@key: 채널, 사용자 등) 별 다음 알림 시간 (epoch) 을 min-heap
+        으로 관리 합니다.
+
+        - 대상 당 하나의 알림 시간만 유지 하며, 다시 등록 (push) 하거나 삭제 한
+          경우 이전 항목은 heap 에 남아 있다가 pop 시점에 무시 됩니다.
+        - wait() 는 가장 빠른 알림 시간 까지 대기 하며, 새로운 알림이 등록 되면
+          바로 깨어납니다.
+    """
+
+    def __init__(self):
+        self.__heap = []  # (due, seq, key)
+        self.__entries = {}  # key: 유효한 항목의 seq
+        self.__seq = itertools.count()
+        self.__cond = threading.Condition()
+        self.__stopped = False
+
+    def push(self, key, due):
+        with self.__cond:
+            seq = next(self.__seq)
+            self.__entries[key] = seq
+            heapq.heappush(self.__heap, (due, seq, key))
+
+            self.__cond.notify()
+
+    def remove(self, key):
+        with self.__cond:
+            self.__entries.pop(key, None)
+
+    def __contains__(self, key):
+        with self.__cond:
+            return key in self.__entries
+
+    def __len__(self):
+        with self.__cond:
+            return len(self.__entries)
+
+    def __peek(self):
+        """ 무시 대상 항목을 정리 후, 가장 빠른 유효 항목을 반환 합니다. """
+        while self.__heap:
+            due, seq, key = self.__heap[0]
+            if self.__entries.get(key) == seq:
+                return self.__heap[0]
+
+            heapq.heappop(self.__heap)
+
+        return None
+
+    def next_due(self):
+        with self.__cond:
+            entry = self.__peek()
+
+        return entry[0] if entry else None
+
+    def pop_due(self, now=None):
+        """ 알림 시간이 된 대상 key 리스트를 (시간 순서) 반환 합니다. """
+        now = now or time.time()
+
+        due_keys = []
+        with self.__cond:
+            while True:
+                entry = self.__peek()
+                if entry is None or entry[0] > now:
+                    break
+
+                heapq.heappop(self.__heap)
+                del self.__entries[entry[2]]
+                due_keys.append(entry[2])
+
+        return due_keys
+
+    def wait(self, max_wait=MAX_WAIT):
+        """ 가장 빠른 알림 시간 (최대 @max_wait 초) 까지 대기 합니다. """
+        with self.__cond:
+            if self.__stopped:
+                return
+
+            entry = self.__peek()
+            timeout = max_wait
+            if entry is not None:
+                timeout = min(max(0, entry[0] - time.time()), max_wait)
+
+            if timeout > 0:
+                self.__cond.wait(timeout)
+
+    def stop(self):
+        with self.__cond:
+            self.__stopped = True
+            self.__cond.notify_all()
+
+    @property
+    def stopped(self):
+        with self.__cond:
+            return self.__stopped
@@ -1,13 +1,33 @@
+import signal
+import argparse
+
 from datetime import datetime
+from common.logger import get_logger
 from common.webhook_api import InCommingWebHooks
 
+from roster import RosterStore
+from announce_scheduler import AnnounceScheduler, get_next_time
+
+LOGGER = get_logger('timer.timer_bot')
 
 INCOMING_URL = ""
+USR_DATA_PATH = './usr_data'
+ROSTER_CHECK_INTERVAL = 10  # resident 모드 에서 사용자 목록 파일 변경 확인 주기 (초)
+
+# resident 모드 에서 관리 하는 채널 목록
+#   - summary_times: 전체 사용자 메세지를 전송 할 시간 리스트 ('HH:MM:SS')
+#   - remind_minutes: 사용자 별 퇴근 n 분 전 (0: 퇴근 시간) 알림 리스트
+CHANNEL_LIST = [
+    {
+        'incoming_url': INCOMING_URL,
+        'usr_data': USR_DATA_PATH,
+        'summary_times': [],
+        'remind_minutes': [60, 10, 0],
+    },
+]
 
 
 class TimerBot(object):
-    MAX_SEC = 99999999
-
     HOUR_TO_SEC = 3600
     MINUTE_TO_SEC = 60
 
@@ -15,116 +35,213 @@ class TimerBot(object):
     H_M_FMT = "{U}님 퇴근까지 {H}시간 {M}분 남으셨습니다 ㅎ"
     M_FMT = "{U}님 퇴근까지 {M}분 남으셨습니다 ㅎ"
 
-    def __init__(self):
-        self.__usr_table = {}
+    def __init__(self, usr_data_path=USR_DATA_PATH):
+        self.usr_data_path = usr_data_path
+
+        self.__roster = RosterStore(usr_data_path)
         self.__send_msg = ''
 
-    def __get_usr_table(self):
-        usr_table = {}
-        with open('./usr_data') as f:
-            usr_list = f.readlines()
+    @classmethod
+    def cal_total_second(cls, t):
+        return (t.hour * cls.HOUR_TO_SEC) + (t.minute * cls.MINUTE_TO_SEC)
+
+    def set_usr_table(self):
+        """ 사용자 목록 파일이 바뀐 경우 다시 읽고, 변경된 사용자 이름 set 을
+            반환 합니다. (바뀌지 않은 경우 None)
+        """
+        return self.__roster.reload()
+
+    def get_usr_table(self):
+        return self.__roster
 
-            for usr in usr_list:
-                usr_elem = usr.split()
-                if len(usr_elem) != 2:
-                    continue
+    def make_special_msg(self, entry):
+        if entry.status == 'undefined':
+            return '{}님의 퇴근 시간은 알 수 없습니다.'.format(entry.name)
 
-                name = usr_elem[0]
-                time = usr_elem[1]
+        return '{}님 신입은 퇴근 할 수 없습니다.'.format(entry.name)
 
-                try:
-                    usr_table[name] = datetime.strptime(time,"%H:%M:%S")
+    def make_leave_msg(self, user, leave_sec, cur_time_to_sec):
+        """ 퇴근 시간 (@leave_sec) 이 있는 사용자 한명의 메세지를 반환 합니다. """
+        sec_interval = (leave_sec - cur_time_to_sec)
 
-                except ValueError as e:
-                    usr_table[name] = usr_elem[1]
+        if sec_interval <= 0:
+            return self.FINISH_FMT.format(U=user)
 
-        return usr_table
+        elif sec_interval <= self.HOUR_TO_SEC:
+            return self.M_FMT.format(
+                U=user, M=str(int(sec_interval / self.MINUTE_TO_SEC))
+            )
 
-    def set_usr_table(self):
-        self.__usr_table = self.__get_usr_table()
+        remain_hour = int(sec_interval / self.HOUR_TO_SEC)
+        remain_minute = int(
+            (sec_interval % self.HOUR_TO_SEC) / self.MINUTE_TO_SEC
+        )
 
-    def get_usr_table(self):
-        return self.__usr_table
+        return self.H_M_FMT.format(U=user, H=remain_hour, M=remain_minute)
 
     def __make_send_msg(self):
-        def cal_total_second(t):
-            return (
-                (t.hour * self.HOUR_TO_SEC) + (t.minute * self.MINUTE_TO_SEC)
+        """ 퇴근 시간 순으로 정렬된 사용자 목록 에서, 현재 시간 위치 (bisect)
+            이전 사용자는 퇴근 메세지를, 이후 사용자는 남은 시간 메세지를
+            만들고, 특수 상태 사용자 메세지를 마지막에 추가 합니다.
+        """
+        cur_time_to_sec = self.cal_total_second(datetime.now())
+        finish_idx = self.__roster.bisect_leave(cur_time_to_sec)
+
+        msg_list = [
+            self.FINISH_FMT.format(U=user)
+            for user, _ in self.__roster.iter_timed(0, finish_idx)
+        ]
+        msg_list.extend(
+            self.make_leave_msg(user, leave_sec, cur_time_to_sec)
+            for user, leave_sec in self.__roster.iter_timed(finish_idx)
+        )
+        msg_list.extend(
+            self.make_special_msg(entry)
+            for entry in self.__roster.iter_special()
+        )
+
+        return '\n'.join(msg_list)
+
+    def set_send_msg(self):
+        self.__send_msg = self.__make_send_msg()
+
+    def get_send_msg(self):
+        return self.__send_msg
+
+
+class TimerService(object):
+    """ 여러 채널 (@channel_list) 의 알림을 하나의 프로세스 에서 전송 하는
+        resident 모드 입니다.
+
+        - (채널, 'summary', 시간) : 채널의 전체 사용자 메세지 전송 시간
+        - (채널, 'user', 사용자)   : 사용자 별 다음 퇴근 알림 시간
+        위 key 별 다음 알림 시간을 AnnounceScheduler (min-heap) 로 관리 하여,
+        알림 시간이 된 경우 에만 깨어나서 전송 합니다.
+        - 채널 별 webhook 은 공유 HTTP transport 의 keep-alive 연결을 사용 합니다.
+        - 최대 @ROSTER_CHECK_INTERVAL 초 마다 깨어나서 사용자 목록 파일이 바뀐
+          경우 (mtime) 다시 읽고, 변경된 사용자의 알림만 갱신 합니다.
+    """
+
+    def __init__(self, channel_list=CHANNEL_LIST):
+        self.channel_list = channel_list
+
+        self.__channels = []  # channel 별 {conf, bot, hook}
+        self.__scheduler = AnnounceScheduler()
+
+    @staticmethod
+    def __parse_sec_of_day(time_str):
+        t = datetime.strptime(time_str, '%H:%M:%S')
+        return TimerBot.cal_total_second(t) + t.second
+
+    def __get_usr_next_time(self, channel, leave_sec):
+        return min(
+            get_next_time(leave_sec - (minute * TimerBot.MINUTE_TO_SEC))
+            for minute in channel['conf'].get('remind_minutes', [])
+        )
+
+    def __schedule_users(self, ch_idx):
+        """ 채널 (@ch_idx) 의 사용자 목록 파일이 바뀐 경우 다시 읽고,
+            변경된 사용자의 알림만 갱신 합니다.
+        """
+        channel = self.__channels[ch_idx]
+        bot = channel['bot']
+
+        try:
+            changed = bot.set_usr_table()
+
+        except Exception as e:
+            LOGGER.error('Load user table failed ({}) [msg: {}]'.format(
+                bot.usr_data_path, e
+            ))
+            return
+
+        if not changed or not channel['conf'].get('remind_minutes'):
+            return
+
+        roster = bot.get_usr_table()
+        for user in changed:
+            key = (ch_idx, 'user', user)
+
+            entry = roster.get(user)
+            if entry is None or entry.leave_sec is None:
+                self.__scheduler.remove(key)
+                continue
+
+            self.__scheduler.push(
+                key, self.__get_usr_next_time(channel, entry.leave_sec)
             )
 
-        msg_list = []
-        cur_time = datetime.now()
-        cur_time_to_sec = cal_total_second(cur_time)
-
-        for user, user_time in self.__usr_table.items():
-            if user_time == 'undefined':
-                msg_list.append(
-                    (
-                        self.MAX_SEC,
-                        '{}님의 퇴근 시간은 알 수 없습니다.'.format(user)
-                    )
+    def init(self):
+        for ch_idx, conf in enumerate(self.channel_list):
+            channel = {
+                'conf': conf,
+                'bot': TimerBot(conf.get('usr_data', USR_DATA_PATH)),
+                'hook': InCommingWebHooks(conf['incoming_url']),
+            }
+            self.__channels.append(channel)
+
+            for time_str in conf.get('summary_times', []):
+                sec_of_day = self.__parse_sec_of_day(time_str)
+                self.__scheduler.push(
+                    (ch_idx, 'summary', sec_of_day), get_next_time(sec_of_day)
                 )
 
-            elif user_time == 'newcomer':
-                msg_list.append(
-                    (
-                        self.MAX_SEC,
-                        '{}님 신입은 퇴근 할 수 없습니다.'.format(user)
-                    )
-                )
+            self.__schedule_users(ch_idx)
+
+        LOGGER.info('Init timer service (channels: {}, schedules: {})'.format(
+            len(self.__channels), len(self.__scheduler)
+        ))
+
+    def __announce(self, key):
+        ch_idx, kind, target = key
+        channel = self.__channels[ch_idx]
+        bot = channel['bot']
+
+        if kind == 'summary':
+            self.__schedule_users(ch_idx)
+            bot.set_send_msg()
+            msg = bot.get_send_msg()
 
-            else:
-                user_time_to_sec = cal_total_second(user_time)
-                sec_interval = (user_time_to_sec - cur_time_to_sec)
-
-                if cur_time_to_sec >= user_time_to_sec:
-                    msg_list.append(
-                        (sec_interval, self.FINISH_FMT.format(U=user))
-                    )
-
-                elif sec_interval <= self.HOUR_TO_SEC:
-                    msg_list.append(
-                        (
-                            sec_interval,
-                            self.M_FMT.format(
-                                U=user,
-                                M=str(int(sec_interval / self.MINUTE_TO_SEC))
-                            )
-                        )
-                    )
-                    continue
-
-                else:
-                    remain_hour = int(sec_interval / self.HOUR_TO_SEC)
-                    remain_minute = int(
-                        (sec_interval % self.HOUR_TO_SEC) / self.MINUTE_TO_SEC
-                    )
-
-                    msg_list.append(
-                        (
-                            sec_interval,
-                            self.H_M_FMT.format(
-                                U=user,
-                                H=remain_hour,
-                                M=remain_minute
-                            )
-                        )
-                    )
-                    continue
-
-        if msg_list:
-            sorted_msg_list = sorted(msg_list, key=lambda x: x[0])
-            return '\n'.join(
-                [x[1] for x in sorted_msg_list]
+            self.__scheduler.push(key, get_next_time(target))
+
+        else:
+            self.__schedule_users(ch_idx)
+
+            entry = bot.get_usr_table().get(target)
+            if entry is None or entry.leave_sec is None:
+                return
+
+            msg = bot.make_leave_msg(
+                target, entry.leave_sec,
+                TimerBot.cal_total_second(datetime.now())
             )
 
-        return ''
+            self.__scheduler.push(
+                key, self.__get_usr_next_time(channel, entry.leave_sec)
+            )
 
-    def set_send_msg(self):
-        self.__send_msg = self.__make_send_msg()
+        if msg:
+            channel['hook'].send_msg(text=msg)
 
-    def get_send_msg(self):
-        return self.__send_msg
+    def run(self):
+        while not self.__scheduler.stopped:
+            for key in self.__scheduler.pop_due():
+                try:
+                    self.__announce(key)
+
+                except Exception as e:
+                    LOGGER.error('Announce failed ({}) [msg: {}]'.format(
+                        key, e
+                    ))
+
+            # 알림이 없는 동안 추가/변경된 사용자 도 등록 되도록 확인
+            for ch_idx in range(len(self.__channels)):
+                self.__schedule_users(ch_idx)
+
+            self.__scheduler.wait(ROSTER_CHECK_INTERVAL)
+
+    def stop(self, *args):
+        self.__scheduler.stop()
 
 
 def run():
@@ -138,8 +255,33 @@ def run():
     hook.send_msg(**{'text': tb.get_send_msg()})
 
 
+def run_resident():
+    print('running timer bot service ({})'.format(datetime.now()))
+
+    service = TimerService()
+    service.init()
+
+    signal.signal(signal.SIGTERM, service.stop)
+    signal.signal(signal.SIGINT, service.stop)
+
+    service.run()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--resident', action='store_true')
+
+    return parser.parse_args()
+
+
 def main():
-    run()
+    args = parse_args()
+
+    if args.resident:
+        run_resident()
+
+    else:
+        run()
 
 
 if __name__ == "__main__":
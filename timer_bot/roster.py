@@ -0,0 +1,212 @@
+import os
+import bisect
+
+from array import array
+
+from common.logger import get_logger
+
+LOGGER = get_logger('timer.roster')
+
+HOUR_TO_SEC = 3600
+MINUTE_TO_SEC = 60
+
+SPECIAL_STATUS = ('undefined', 'newcomer')
+
+
+class RosterEntry(object):
+    """ 사용자 한명의 퇴근 시간 정보 입니다.
+
+        - @leave_sec : 퇴근 시간 (하루 중 초, 분 단위) / 특수 상태인 경우 None
+        - @status    : 'undefined', 'newcomer' 등 특수 상태 / 시간인 경우 None
+        - @line      : 항목을 만든 usr_data 의 줄 (diff 적용 시 사용)
+    """
+    __slots__ = ('name', 'leave_sec', 'status', 'line')
+
+    def __init__(self, name, leave_sec, status, line):
+        self.name = name
+        self.leave_sec = leave_sec
+        self.status = status
+        self.line = line
+
+
+def parse_roster_line(line):
+    """ usr_data 의 한 줄 ('이름 HH:MM:SS' 또는 '이름 상태') 을 파싱 합니다.
+        (형식이 맞지 않는 경우 None)
+    """
+    usr_elem = line.split()
+    if len(usr_elem) != 2:
+        return None
+
+    name, value = usr_elem
+    if value in SPECIAL_STATUS:
+        return RosterEntry(name, None, value, line)
+
+    try:
+        hour, minute, second = (int(v) for v in value.split(':'))
+        if not (0 <= hour < 24 and 0 <= minute < 60 and 0 <= second < 60):
+            raise ValueError(value)
+
+    except ValueError:
+        LOGGER.warning('Invalid roster line ({})'.format(line))
+        return None
+
+    return RosterEntry(
+        name, (hour * HOUR_TO_SEC) + (minute * MINUTE_TO_SEC), None, line
+    )
+
+
+class RosterStore(object):
+    """ usr_data 파일 (@path) 의 사용자 목록을 퇴근 시간 순으로 정렬된 상태로
+        유지 합니다.
+
+        - 파일의 mtime (및 크기) 이 바뀐 경우 에만 다시 읽으며, 이전 내용과
+          비교하여 추가/삭제된 줄만 반영 합니다.
+        - 퇴근 시간은 array (@__leave_secs) 로, 이름은 같은 순서의 리스트 로
+          유지 하므로, 현재 시간 기준 위치는 bisect 로 찾을 수 있습니다.
+        - 같은 이름이 여러 줄에 있는 경우 파일 에서 마지막 줄을 사용 하며, 그 줄이
+          삭제 되거나 줄 순서가 바뀌면 남아있는 줄 중 마지막 줄을 다시 적용
+          합니다. (처음 부터 다시 읽은 결과와 같음)
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        self.__entries = {}  # name: RosterEntry (특수 상태는 추가 순서 유지)
+        self.__leave_secs = array('l')
+        self.__names = []
+        self.__lines = {}  # line: 이름 (이전에 읽은 줄, 형식 오류인 경우 None)
+        self.__name_lines = {}  # name: {line: RosterEntry} (이름 별 남아있는 줄)
+        self.__line_order = []  # 이전에 읽은 줄 (파일 순서)
+        self.__stat = None
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __contains__(self, name):
+        return name in self.__entries
+
+    def get(self, name):
+        return self.__entries.get(name)
+
+    def __remove_sorted(self, entry):
+        lo = bisect.bisect_left(self.__leave_secs, entry.leave_sec)
+        hi = bisect.bisect_right(self.__leave_secs, entry.leave_sec)
+
+        idx = self.__names.index(entry.name, lo, hi)
+        del self.__leave_secs[idx]
+        del self.__names[idx]
+
+    def __remove(self, name):
+        entry = self.__entries.pop(name)
+        if entry.leave_sec is not None:
+            self.__remove_sorted(entry)
+
+    def __add(self, entry):
+        if entry.name in self.__entries:
+            self.__remove(entry.name)
+
+        self.__entries[entry.name] = entry
+        if entry.leave_sec is not None:
+            idx = bisect.bisect_right(self.__leave_secs, entry.leave_sec)
+            self.__leave_secs.insert(idx, entry.leave_sec)
+            self.__names.insert(idx, entry.name)
+
+    def __read_stat(self):
+        stat = os.stat(self.path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def reload(self):
+        """ 파일이 바뀐 경우 다시 읽고, 변경된 사용자 이름 set 을 반환 합니다.
+            (파일이 바뀌지 않은 경우 None)
+        """
+        stat = self.__read_stat()
+        if stat == self.__stat:
+            return None
+
+        with open(self.path) as f:
+            lines = dict.fromkeys(line.strip() for line in f)
+
+        removed = [line for line in self.__lines if line not in lines]
+        added = [line for line in lines if line not in self.__lines]
+
+        # 추가/삭제된 줄이 있는 이름
+        affected = set()
+        for line in removed:
+            name = self.__lines.pop(line)
+            if name is None:
+                continue
+
+            name_lines = self.__name_lines[name]
+            del name_lines[line]
+            if not name_lines:
+                del self.__name_lines[name]
+
+            affected.add(name)
+
+        for line in added:
+            entry = parse_roster_line(line)
+            self.__lines[line] = entry.name if entry else None
+            if entry is None:
+                continue
+
+            self.__name_lines.setdefault(entry.name, {})[line] = entry
+            affected.add(entry.name)
+
+        # 줄 순서가 바뀐 경우 여러 줄이 남아있는 이름은 마지막 줄이 바뀌었을 수 있음
+        line_order = list(lines)
+        if line_order != self.__line_order:
+            affected.update(
+                name for name, name_lines in self.__name_lines.items()
+                    if len(name_lines) > 1
+            )
+
+        positions = None  # line: 파일 에서의 위치 (같은 이름이 여러 줄인 경우 에만 사용)
+        changed = set()
+        for name in affected:
+            name_lines = self.__name_lines.get(name)
+            if not name_lines:
+                if name in self.__entries:
+                    self.__remove(name)
+                    changed.add(name)
+
+                continue
+
+            if len(name_lines) == 1:
+                entry = next(iter(name_lines.values()))
+
+            else:
+                if positions is None:
+                    positions = {line: idx for idx, line in enumerate(lines)}
+
+                entry = name_lines[max(name_lines, key=positions.get)]
+
+            current = self.__entries.get(name)
+            if current is None or current.line != entry.line:
+                self.__add(entry)
+                changed.add(name)
+
+        self.__stat = stat
+        self.__line_order = line_order
+
+        LOGGER.info('Reload roster ({}) [users: {}, changed: {}]'.format(
+            self.path, len(self.__entries), len(changed)
+        ))
+
+        return changed
+
+    def bisect_leave(self, sec):
+        """ 퇴근 시간이 @sec 이하인 사용자 수 (정렬 위치) 를 반환 합니다. """
+        return bisect.bisect_right(self.__leave_secs, sec)
+
+    def iter_timed(self, start=0, end=None):
+        """ 퇴근 시간 순서로 [@start, @end) 위치의 (이름, 퇴근 시간) 을 반환 합니다. """
+        end = len(self.__names) if end is None else end
+
+        for idx in range(start, end):
+            yield self.__names[idx], self.__leave_secs[idx]
+
+    def iter_special(self):
+        """ 특수 상태 사용자 항목을 추가 순서로 반환 합니다. """
+        for entry in self.__entries.values():
+            if entry.status is not None:
+                yield entry
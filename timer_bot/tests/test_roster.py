@@ -0,0 +1,98 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+TIMER_BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TIMER_BOT_DIR)
+sys.path.insert(0, os.path.dirname(TIMER_BOT_DIR))
+
+from common.logger import LOGGER2  # noqa: E402
+
+LOGGER2.log_path = os.path.join(tempfile.gettempdir(), 'test_roster.log')
+
+from roster import RosterStore  # noqa: E402
+
+
+class RosterStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'usr_data')
+        self.n_writes = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, lines):
+        with open(self.path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+        # 같은 시간에 다시 쓴 경우 에도 변경 으로 판단 되도록 mtime 을 증가
+        self.n_writes += 1
+        os.utime(self.path, ns=(self.n_writes, self.n_writes))
+
+    def assert_same_as_fresh(self, store):
+        fresh = RosterStore(self.path)
+        fresh.reload()
+
+        self.assertEqual(list(store.iter_timed()), list(fresh.iter_timed()))
+        self.assertEqual(
+            [(e.name, e.status) for e in store.iter_special()],
+            [(e.name, e.status) for e in fresh.iter_special()]
+        )
+
+    def test_reload_diff(self):
+        store = RosterStore(self.path)
+
+        self.write(['A 18:00:00', 'B 17:00:00', 'C undefined'])
+        self.assertEqual(store.reload(), {'A', 'B', 'C'})
+        self.assertIsNone(store.reload())
+
+        self.write(['A 18:00:00', 'B 19:00:00', 'D newcomer'])
+        self.assertEqual(store.reload(), {'B', 'C', 'D'})
+        self.assertEqual(
+            list(store.iter_timed()), [('A', 64800), ('B', 68400)]
+        )
+        self.assert_same_as_fresh(store)
+
+    def test_remove_last_duplicated_line(self):
+        store = RosterStore(self.path)
+
+        self.write(['A 18:00:00', 'B 17:00:00', 'A 19:00:00'])
+        store.reload()
+        self.assertEqual(store.get('A').leave_sec, 68400)
+
+        # 마지막 줄이 삭제 되면 남아있는 앞 줄을 다시 적용
+        self.write(['A 18:00:00', 'B 17:00:00'])
+        self.assertEqual(store.reload(), {'A'})
+        self.assertEqual(store.get('A').leave_sec, 64800)
+        self.assert_same_as_fresh(store)
+
+        # 앞 줄이 추가 되어도 파일 에서 마지막 줄을 사용
+        self.write(['A undefined', 'A 18:00:00', 'B 17:00:00'])
+        self.assertEqual(store.reload(), set())
+        self.assertEqual(store.get('A').leave_sec, 64800)
+        self.assert_same_as_fresh(store)
+
+        self.write(['B 17:00:00'])
+        self.assertEqual(store.reload(), {'A'})
+        self.assertNotIn('A', store)
+        self.assert_same_as_fresh(store)
+
+    def test_reorder_duplicated_lines(self):
+        store = RosterStore(self.path)
+
+        self.write(['A 18:00:00', 'B 17:00:00', 'A 19:00:00'])
+        store.reload()
+        self.assertEqual(store.get('A').leave_sec, 68400)
+
+        # 추가/삭제된 줄이 없어도 순서가 바뀌면 마지막 줄을 다시 적용
+        self.write(['A 19:00:00', 'B 17:00:00', 'A 18:00:00'])
+        self.assertEqual(store.reload(), {'A'})
+        self.assertEqual(store.get('A').leave_sec, 64800)
+        self.assert_same_as_fresh(store)
+
+
+if __name__ == '__main__':
+    unittest.main()